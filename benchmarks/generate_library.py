@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+合成素材库生成器 - 生成指定数量的 MD5 文件夹（dress.json / action*.json / meta.json / PNG）
+"""
+
+import argparse
+import hashlib
+import json
+import random
+import struct
+import zlib
+from pathlib import Path
+
+CLOTHING_TYPES = ['BaseBody', 'Hair', 'HeadDress', 'Tops', 'TopSuit', 'Pants', 'Shoes', 'Belt']
+
+ROLE_BONES = [
+    ('root', None), ('pelvis', 'root'), ('spine', 'pelvis'), ('belt', 'pelvis'),
+    ('head', 'spine'), ('hairdresser', 'head'), ('eye', 'head'), ('eyebrow', 'head'),
+    ('mouth', 'head'), ('nose', 'head'),
+    ('upperarm_left', 'spine'), ('forearm_left', 'upperarm_left'), ('hand_left', 'forearm_left'),
+    ('upperarm_right', 'spine'), ('forearm_right', 'upperarm_right'), ('hand_right', 'forearm_right'),
+    ('thigh_left', 'pelvis'), ('calf_left', 'thigh_left'), ('foot_left', 'calf_left'),
+    ('thigh_right', 'pelvis'), ('calf_right', 'thigh_right'), ('foot_right', 'calf_right'),
+]
+
+SLOT_PARTS = {
+    'BaseBody': ['Head', 'Upperarm_Left', 'Upperarm_Right', 'Forearm_Left', 'Forearm_Right',
+                 'Hand_Left', 'Hand_Right', 'Hand_Left4', 'Hand_Right_Front4', 'Thigh_Left', 'Thigh_Right'],
+    'Hair': ['Hair_Front', 'Hair_Back', 'Fringe'],
+    'HeadDress': ['HeadDress_Front', 'HeadDress_Back'],
+    'Tops': ['Tops_Front', 'Tops_Back', 'Upperarm_Left', 'Upperarm_Right'],
+    'TopSuit': ['Tops_Front', 'Tops_Back', 'Thigh_Left', 'Thigh_Right'],
+    'Pants': ['Pants_Front', 'Thigh_Left', 'Thigh_Right', 'Calf_Left', 'Calf_Right'],
+    'Shoes': ['Shoes_Left', 'Shoes_Right'],
+    'Belt': ['Belt_Front'],
+}
+
+
+def make_png(width, height, seed=0):
+    """用标准库生成 RGBA PNG（带透明边框，便于测试裁剪）"""
+    rows = []
+    for y in range(height):
+        row = bytearray(b'\x00')
+        for x in range(width):
+            inside = width // 8 <= x < width - width // 8 and height // 8 <= y < height - height // 8
+            if inside:
+                row += bytes(((x * 7 + seed) % 256, (y * 5 + seed) % 256, seed % 256, 255))
+            else:
+                row += b'\x00\x00\x00\x00'
+        rows.append(bytes(row))
+
+    def chunk(tag, data):
+        return struct.pack('>I', len(data)) + tag + data + struct.pack('>I', zlib.crc32(tag + data) & 0xffffffff)
+
+    header = struct.pack('>IIBBBBB', width, height, 8, 6, 0, 0, 0)
+    return (b'\x89PNG\r\n\x1a\n' + chunk(b'IHDR', header)
+            + chunk(b'IDAT', zlib.compress(b''.join(rows), 6)) + chunk(b'IEND', b''))
+
+
+def make_mesh(rng, vertex_count, weighted):
+    uvs = [round(rng.random(), 6) for _ in range(vertex_count * 2)]
+    triangles = []
+    for i in range(1, vertex_count - 1):
+        triangles += [0, i, i + 1]
+    if weighted:
+        vertices = []
+        for _ in range(vertex_count):
+            vertices += [2,
+                         rng.randrange(len(ROLE_BONES)), rng.uniform(-50, 50), rng.uniform(-50, 50), 0.6,
+                         rng.randrange(len(ROLE_BONES)), rng.uniform(-50, 50), rng.uniform(-50, 50), 0.4]
+    else:
+        vertices = [rng.uniform(20, 120) for _ in range(vertex_count * 2)]
+    return {
+        'type': 'skinnedmesh', 'uvs': uvs, 'triangles': triangles, 'vertices': vertices,
+        'hull': min(vertex_count, 4), 'width': 64, 'height': 64,
+    }
+
+
+def make_role(output_path):
+    """生成 role.json 和角色自带附件的图片"""
+    bones = []
+    for name, parent in ROLE_BONES:
+        bone = {'name': name}
+        if parent:
+            bone.update({'parent': parent, 'x': 10.0, 'length': 20.0})
+        bones.append(bone)
+    role = {
+        'skeleton': {'spine': '3.8.99', 'width': 300, 'height': 600},
+        'bones': bones,
+        'slots': [{'name': 'Eyeball_Left', 'bone': 'eye', 'attachment': 'Eyeball_Left'}],
+        'skins': {'default': {'Eyeball_Left': {'Eyeball_Left': {'x': 1.5, 'y': 2.5, 'width': 8, 'height': 8}}}},
+    }
+    output_path = Path(output_path)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(output_path, 'w', encoding='utf-8') as f:
+        json.dump(role, f, indent=2)
+    with open(output_path.parent / 'Eyeball_Left.png', 'wb') as f:
+        f.write(make_png(8, 8))
+    return output_path
+
+
+def make_action(rng, frames, anim_names=('idle', 'walk')):
+    animations = {}
+    for anim_name in anim_names:
+        bones = {}
+        for name, _ in ROLE_BONES[1:8]:
+            bones[name] = {
+                'rotate': [{'time': round(i / frames, 4), 'angle': rng.uniform(-30, 30)} for i in range(frames + 1)],
+                'translate': [{'time': round(i / frames, 4), 'x': rng.uniform(-5, 5), 'y': 0} for i in range(frames + 1)],
+            }
+        animations[anim_name] = {'bones': bones}
+    return {
+        'bones': [{'name': 'weapon', 'parent': 'hand_right'}],
+        'slots': [{'name': 'Weapon', 'bone': 'weapon', 'attachment': 'Weapon'}],
+        'skins': {'Weapon': {'Weapon': {'x': 3.0, 'y': 1.0, 'width': 32, 'height': 8}}},
+        'animations': animations,
+    }
+
+
+def generate_library(output_dir, count, mesh_vertices=24, image_size=32, action_ratio=0.1,
+                     meta_ratio=0.5, frames=10, seed=42):
+    """生成 count 个素材文件夹，返回 {'items': [...], 'actions': [...]}"""
+    rng = random.Random(seed)
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    png_cache = {}
+
+    items, actions = [], []
+    for index in range(count):
+        md5_hash = hashlib.md5(f"{seed}-{index}".encode()).hexdigest()
+        folder = output_dir / md5_hash
+        folder.mkdir(exist_ok=True)
+
+        if rng.random() < action_ratio:
+            with open(folder / 'action.json', 'w', encoding='utf-8') as f:
+                json.dump(make_action(rng, frames), f)
+            # 部分动画素材带额外的 action*.json（合成时与 action.json 按时间轴合并）
+            if rng.random() < 0.5:
+                with open(folder / 'action_attack.json', 'w', encoding='utf-8') as f:
+                    json.dump(make_action(rng, frames, ('attack', 'idle')), f)
+            image_names = ['Weapon']
+            actions.append(md5_hash)
+        else:
+            clothing_type = CLOTHING_TYPES[index % len(CLOTHING_TYPES)]
+            attachments = {}
+            for part in SLOT_PARTS[clothing_type]:
+                attachments[part] = {
+                    part: make_mesh(rng, mesh_vertices, weighted=rng.random() < 0.5),
+                    f"{part}_region": {'x': rng.uniform(-10, 10), 'y': rng.uniform(-10, 10),
+                                       'width': image_size, 'height': image_size},
+                }
+            dress = {
+                'type': clothing_type,
+                'bones': [{'name': f"{clothing_type.lower()}_extra", 'parent': 'spine', 'x': 2.0}],
+                'attachments': attachments,
+            }
+            with open(folder / 'dress.json', 'w', encoding='utf-8') as f:
+                json.dump(dress, f)
+            image_names = [name for part in SLOT_PARTS[clothing_type] for name in (part, f"{part}_region")]
+            items.append((md5_hash, clothing_type))
+
+        if rng.random() < meta_ratio:
+            with open(folder / 'meta.json', 'w', encoding='utf-8') as f:
+                json.dump({'name': f"item_{index}", 'description': 'synthetic', 'md5': md5_hash}, f, ensure_ascii=False)
+
+        for i, image_name in enumerate(image_names):
+            key = i % 4
+            if key not in png_cache:
+                png_cache[key] = make_png(image_size, image_size, seed=key * 40)
+            with open(folder / f"{image_name}.png", 'wb') as f:
+                f.write(png_cache[key])
+
+    return {'items': items, 'actions': actions}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="生成合成素材库")
+    parser.add_argument('output_dir')
+    parser.add_argument('--count', type=int, default=1000)
+    parser.add_argument('--mesh-vertices', type=int, default=24)
+    parser.add_argument('--image-size', type=int, default=32)
+    parser.add_argument('--action-ratio', type=float, default=0.1)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    result = generate_library(args.output_dir, args.count, args.mesh_vertices, args.image_size,
+                              args.action_ratio, seed=args.seed)
+    make_role(Path(args.output_dir) / 'role.json')
+    print(f"已生成 {len(result['items'])} 个服装, {len(result['actions'])} 个动画: {args.output_dir}")
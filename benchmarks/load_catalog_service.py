@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+目录服务压测 - 多个客户端进程以相同的查询组合分别直接读 SQLite 和请求目录服务，比较每秒请求数
+
+查询组合：70% 按 MD5 查素材、20% 按类型列出素材（前 50 个）、10% 统计
+
+用法:
+    python benchmarks/load_catalog_service.py --items 10000 --clients 8 --duration 5
+"""
+
+import argparse
+import hashlib
+import http.client
+import json
+import random
+import re
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT_DIR / "modules"))
+
+from database import ClothingDatabase
+
+TYPES = ['BaseBody', 'Hair', 'HeadDress', 'Tops', 'TopSuit', 'Pants', 'Shoes', 'Belt']
+
+
+def make_catalog(db_path, count):
+    """生成 count 个素材的数据库（直接批量插入），返回 MD5 列表"""
+    db = ClothingDatabase(db_path)
+    rows = []
+    for i in range(count):
+        md5_hash = hashlib.md5(f"item-{i}".encode()).hexdigest()
+        rows.append((md5_hash, md5_hash, TYPES[i % len(TYPES)], f"item_{i}" if i % 3 == 0 else None,
+                     f"lib/{md5_hash}"))
+    conn = db.get_connection()
+    conn.executemany('''
+        INSERT INTO clothing_items (md5_hash, folder_name, clothing_type, custom_name, source_path)
+        VALUES (?, ?, ?, ?, ?)
+    ''', rows)
+    conn.commit()
+    conn.close()
+    return [row[0] for row in rows]
+
+
+def pick_operation(rng):
+    roll = rng.random()
+    if roll < 0.7:
+        return 'item'
+    return 'type' if roll < 0.9 else 'stats'
+
+
+def direct_client(db_path, md5_list, duration, seed):
+    """每次查询都经 ClothingDatabase 打开 SQLite（流水线工具目前的做法）"""
+    rng = random.Random(seed)
+    db = ClothingDatabase(db_path)
+    latencies = []
+    deadline = time.perf_counter() + duration
+    while time.perf_counter() < deadline:
+        operation = pick_operation(rng)
+        start = time.perf_counter()
+        if operation == 'item':
+            db.get_item_by_md5(rng.choice(md5_list))
+        elif operation == 'type':
+            db.get_all_items(rng.choice(TYPES))[:50]
+        else:
+            db.get_statistics()
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def service_client(port, md5_list, duration, seed):
+    """通过 HTTP 长连接请求目录服务"""
+    rng = random.Random(seed)
+    conn = http.client.HTTPConnection('127.0.0.1', port)
+    latencies = []
+    deadline = time.perf_counter() + duration
+    while time.perf_counter() < deadline:
+        operation = pick_operation(rng)
+        if operation == 'item':
+            path = f"/items/{rng.choice(md5_list)}"
+        elif operation == 'type':
+            path = f"/items?type={rng.choice(TYPES)}&limit=50"
+        else:
+            path = "/stats"
+        start = time.perf_counter()
+        conn.request('GET', path)
+        response = conn.getresponse()
+        json.loads(response.read())
+        if response.status != 200:
+            raise RuntimeError(f"{path}: HTTP {response.status}")
+        latencies.append(time.perf_counter() - start)
+    conn.close()
+    return latencies
+
+
+def run_clients(target, args_list, clients):
+    with ProcessPoolExecutor(max_workers=clients) as pool:
+        results = list(pool.map(target, *zip(*args_list)))
+    latencies = sorted(latency for result in results for latency in result)
+    return latencies
+
+
+def report(name, latencies, duration):
+    total = len(latencies)
+    p50 = latencies[total // 2] * 1000
+    p99 = latencies[min(total - 1, int(total * 0.99))] * 1000
+    rate = total / duration
+    print(f"{name:<10} {rate:>10.0f} 请求/秒   p50 {p50:.2f} ms   p99 {p99:.2f} ms")
+    return rate
+
+
+def start_service(db_path):
+    """启动服务子进程（随机端口），返回 (进程, 端口)"""
+    process = subprocess.Popen(
+        [sys.executable, str(ROOT_DIR / "modules" / "catalog_service.py"), '--db', db_path, '--port', '0',
+         '--no-build'],
+        stdout=subprocess.PIPE, text=True, encoding='utf-8'
+    )
+    for line in process.stdout:
+        match = re.search(r'http://[\d.]+:(\d+)', line)
+        if match:
+            return process, int(match.group(1))
+    raise RuntimeError("目录服务启动失败")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="目录服务压测")
+    parser.add_argument('--items', type=int, default=10000)
+    parser.add_argument('--clients', type=int, default=8)
+    parser.add_argument('--duration', type=float, default=5.0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        db_path = str(Path(temp_dir) / "catalog.db")
+        md5_list = make_catalog(db_path, args.items)
+        print(f"{args.items} 个素材, {args.clients} 个客户端进程, 每种方式 {args.duration} 秒\n")
+
+        direct = run_clients(direct_client, [(db_path, md5_list, args.duration, i)
+                                             for i in range(args.clients)], args.clients)
+        direct_rate = report("SQLite", direct, args.duration)
+
+        process, port = start_service(db_path)
+        try:
+            served = run_clients(service_client, [(port, md5_list, args.duration, i)
+                                                  for i in range(args.clients)], args.clients)
+        finally:
+            process.terminate()
+            process.wait()
+        service_rate = report("目录服务", served, args.duration)
+
+        print(f"\n目录服务 / SQLite: {service_rate / direct_rate:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
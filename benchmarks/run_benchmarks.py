@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+性能基准测试 - 在合成素材库上测量导入、查询、合成、分离动画和缩略图生成
+
+用法:
+    python benchmarks/run_benchmarks.py --scales 1000 10000 --output bench.json
+    python benchmarks/run_benchmarks.py --compare old.json new.json
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT_DIR / "modules"))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from generate_library import generate_library, make_role
+
+
+@contextlib.contextmanager
+def quiet():
+    """屏蔽模块中的 print 输出（避免刷屏，输出本身的开销仍计入）"""
+    with contextlib.redirect_stdout(io.StringIO()):
+        yield
+
+
+def timed(func, *args, **kwargs):
+    start = time.perf_counter()
+    with quiet():
+        result = func(*args, **kwargs)
+    return time.perf_counter() - start, result
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_scale(scale, workdir, builds=10, thumbnails=100, mesh_vertices=24):
+    """在 scale 个文件夹的素材库上运行全部基准，返回 {名称: 秒数}"""
+    from database import ClothingDatabase
+    from asset_processor import AssetProcessor
+    from spine_builder import SpineBuilder
+    from outfit_cache import CompiledOutfitCache
+    from build_cache import BuildResultCache
+    from role_template import RoleTemplateCache
+
+    scale_dir = Path(workdir) / f"scale_{scale}"
+    library_dir = scale_dir / "library"
+    results = {}
+
+    elapsed, library = timed(generate_library, library_dir, scale, mesh_vertices=mesh_vertices)
+    results['generate_library'] = elapsed
+    role_path = make_role(scale_dir / "role.json")
+
+    with quiet():
+        db = ClothingDatabase(str(scale_dir / "clothing.db"))
+    processor = AssetProcessor(library_dir, db)
+
+    results['scan_and_import'], import_result = timed(processor.scan_and_import)
+    results['scan_and_import_rescan'], _ = timed(processor.scan_and_import)
+    results['get_items_by_type'], items_by_type = timed(db.get_items_by_type)
+    results['get_statistics'], _ = timed(db.get_statistics)
+
+    # 合成：每种类型取一件，轮换选择；动画素材的全部 action*.json 一起合并
+    output_root = scale_dir / "output"
+    actions = [sorted((library_dir / md5).glob("action*.json")) for md5 in library['actions']]
+    selections = []
+    for i in range(builds):
+        selected = {}
+        for clothing_type, items in items_by_type.items():
+            if clothing_type == 'Action' or not items:
+                continue
+            item = items[i % len(items)]
+            selected[item['md5_hash']] = {'type': clothing_type, 'path': item['source_path']}
+        action_files = [str(path) for path in actions[i % len(actions)]] if actions else []
+        selections.append((selected, action_files))
+
+    def build_all(builder, name, **options):
+        total = 0.0
+        for i, (selected, action_files) in enumerate(selections):
+            elapsed, _ = timed(builder.build_character, str(role_path), selected,
+                               output_root / name / f"character_{i:03d}", bool(action_files),
+                               animation_paths=action_files, **options)
+            total += elapsed
+        return total / builds if builds else 0.0
+
+    # 不使用磁盘缓存，每次都重新解析角色模板
+    results['build_character'] = build_all(SpineBuilder(db, role_templates=RoleTemplateCache(max_entries=0)),
+                                           'uncached')
+
+    # 启用预编译服装缓存、角色模板缓存和合成结果缓存：
+    #   首次（写入缓存）/ 强制重新合成（只命中服装和模板缓存）/ 再次合成（命中合成结果缓存）
+    cache_dir = scale_dir / "cache"
+    cached_builder = SpineBuilder(db, CompiledOutfitCache(cache_dir / "outfits"),
+                                  BuildResultCache(cache_dir / "builds"), RoleTemplateCache())
+    results['build_cache_cold'] = build_all(cached_builder, 'cached')
+    results['build_cache_rebuild'] = build_all(cached_builder, 'cached', force=True)
+    results['build_cache_hit'] = build_all(cached_builder, 'cached')
+
+    # 缩略图（需要 Pillow）
+    try:
+        import PIL  # noqa: F401
+        thumb_dir = scale_dir / "thumbnails"
+        folders = [Path(item['source_path']) for items in items_by_type.values() for item in items][:thumbnails]
+        start = time.perf_counter()
+        with quiet():
+            for folder in folders:
+                processor.generate_thumbnail(folder, thumb_dir / f"{folder.name}.png")
+        results['generate_thumbnail'] = (time.perf_counter() - start) / max(len(folders), 1)
+    except ImportError:
+        results['generate_thumbnail'] = None
+
+    # 分离动画会移动文件夹，放在最后
+    results['separate_animations'], _ = timed(processor.separate_animations, scale_dir / "actions")
+
+    results['counts'] = {
+        'total': import_result.get('total'),
+        'success': import_result.get('success'),
+        'actions': len(library['actions']),
+    }
+    return results
+
+
+def compare(old_path, new_path):
+    """对比两次结果，打印各项耗时变化"""
+    with open(old_path, 'r', encoding='utf-8') as f:
+        old = json.load(f)
+    with open(new_path, 'r', encoding='utf-8') as f:
+        new = json.load(f)
+
+    print(f"{old.get('revision')} -> {new.get('revision')}")
+    for scale, new_results in new['results'].items():
+        old_results = old['results'].get(scale, {})
+        print(f"\n规模 {scale}:")
+        for name, value in new_results.items():
+            if not isinstance(value, (int, float)):
+                continue
+            before = old_results.get(name)
+            if isinstance(before, (int, float)) and before > 0:
+                change = (value - before) / before * 100
+                print(f"  {name:<26} {before * 1000:>10.1f} ms -> {value * 1000:>10.1f} ms  ({change:+.1f}%)")
+            else:
+                print(f"  {name:<26} {'-':>13} -> {value * 1000:>10.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Spine Dress Manager 性能基准")
+    parser.add_argument('--scales', type=int, nargs='+', default=[1000])
+    parser.add_argument('--builds', type=int, default=10)
+    parser.add_argument('--thumbnails', type=int, default=100)
+    parser.add_argument('--mesh-vertices', type=int, default=24)
+    parser.add_argument('--workdir', help="素材库生成目录（默认临时目录，结束后删除）")
+    parser.add_argument('--output', help="结果 JSON 文件")
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'), help="对比两个结果文件")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    workdir = Path(args.workdir) if args.workdir else Path(tempfile.mkdtemp(prefix="sdm_bench_"))
+    report = {
+        'revision': git_revision(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'parameters': {'builds': args.builds, 'thumbnails': args.thumbnails, 'mesh_vertices': args.mesh_vertices},
+        'results': {},
+    }
+    try:
+        for scale in args.scales:
+            print(f"运行规模 {scale} ...")
+            results = run_scale(scale, workdir, args.builds, args.thumbnails, args.mesh_vertices)
+            report['results'][str(scale)] = results
+            for name, value in results.items():
+                if isinstance(value, float):
+                    print(f"  {name:<26} {value * 1000:>10.1f} ms")
+    finally:
+        if not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text)
+        print(f"结果已保存: {args.output}")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+数据库并发压力测试 - 多个进程同时导入和打标同一个 clothing.db，检查没有写入丢失
+
+每个进程：
+  - 导入自己的素材和一批所有进程共用的素材（共用素材只能被添加一次）
+  - 添加动画
+  - 对共用素材做"读取 → 追加描述 → 按版本号写回"，冲突时重新读取再写
+结束后检查：素材和动画数量、每条追加都保留在描述中、版本号等于写入次数、统计汇总一致。
+
+用法:
+    python benchmarks/stress_catalog.py --processes 8 --items 200 --labels 50
+    python benchmarks/stress_catalog.py --no-versioning   # 对照：不使用版本号时会丢失写入
+"""
+
+import argparse
+import hashlib
+import random
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT_DIR / "modules"))
+
+from database import ClothingDatabase, VersionConflictError
+
+TYPES = ['Hair', 'Tops', 'Pants', 'Shoes']
+
+
+def md5_of(text):
+    return hashlib.md5(text.encode()).hexdigest()
+
+
+def shared_items(count):
+    return [md5_of(f"shared-{i}") for i in range(count)]
+
+
+def worker(db_path, worker_id, items, shared, animations, labels, versioning, seed):
+    """单个进程的负载，返回 {'added', 'label_writes', 'conflicts', 'retries'}"""
+    rng = random.Random(seed)
+    db = ClothingDatabase(db_path)
+    stats = {'added': 0, 'label_writes': {}, 'conflicts': 0, 'retries': 0}
+
+    own = [md5_of(f"{worker_id}-{i}") for i in range(items)]
+    queue = own + list(shared)
+    rng.shuffle(queue)
+    for index, md5_hash in enumerate(queue):
+        if db.add_clothing_item(md5_hash, md5_hash, TYPES[index % len(TYPES)], source_path=f"lib/{md5_hash}"):
+            stats['added'] += 1
+        if index < animations:
+            db.add_animation(md5_of(f"anim-{worker_id}-{index}"), f"anim{index}", source_path=f"lib/anim{index}")
+
+    for round_index in range(labels):
+        md5_hash = rng.choice(shared)
+        token = f"{worker_id}.{round_index};"
+        while True:
+            item = db.get_item_by_md5(md5_hash)
+            description = (item['description'] or '') + token
+            try:
+                db.update_clothing_label(md5_hash, f"w{worker_id}", description,
+                                         expected_version=item['version'] if versioning else None)
+                break
+            except VersionConflictError:
+                stats['conflicts'] += 1
+        stats['label_writes'][md5_hash] = stats['label_writes'].get(md5_hash, 0) + 1
+
+    stats['retries'] = db.write_retries
+    return stats
+
+
+def run(processes, items, shared_count, animations, labels, versioning, workdir):
+    db_path = str(Path(workdir) / "stress.db")
+    ClothingDatabase(db_path)
+    shared = shared_items(shared_count)
+
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=processes) as pool:
+        futures = [pool.submit(worker, db_path, i, items, shared, animations, labels, versioning, i)
+                   for i in range(processes)]
+        results = [future.result() for future in futures]
+    elapsed = time.perf_counter() - start
+
+    db = ClothingDatabase(db_path)
+    problems = []
+
+    expected_items = processes * items + shared_count
+    added = sum(r['added'] for r in results)
+    stored_items = len(db.get_all_items())
+    if added != expected_items or stored_items != expected_items:
+        problems.append(f"素材数量: 添加成功 {added} / 数据库 {stored_items} / 预期 {expected_items}")
+
+    stored_animations = len(db.get_all_animations())
+    if stored_animations != processes * animations:
+        problems.append(f"动画数量: 数据库 {stored_animations} / 预期 {processes * animations}")
+
+    writes = {}
+    for r in results:
+        for md5_hash, n in r['label_writes'].items():
+            writes[md5_hash] = writes.get(md5_hash, 0) + n
+    lost = 0
+    for md5_hash, n in writes.items():
+        item = db.get_item_by_md5(md5_hash)
+        kept = (item['description'] or '').count(';')
+        if kept != n or item['version'] != n:
+            lost += n - kept
+    if lost:
+        problems.append(f"标签: 丢失 {lost} / {sum(writes.values())} 次写入")
+
+    mismatches = db.check_statistics(repair=False)
+    if mismatches:
+        problems.append(f"统计汇总不一致: {mismatches}")
+
+    print(f"{processes} 个进程, 用时 {elapsed:.1f} 秒")
+    print(f"  素材 {stored_items}, 动画 {stored_animations}, 标签写入 {sum(writes.values())}")
+    print(f"  版本冲突 {sum(r['conflicts'] for r in results)} 次, 锁重试 {sum(r['retries'] for r in results)} 次")
+    for problem in problems:
+        print(f"[FAIL] {problem}")
+    if not problems:
+        print("[OK] 没有写入丢失")
+    return not problems
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="数据库并发压力测试")
+    parser.add_argument('--processes', type=int, default=8)
+    parser.add_argument('--items', type=int, default=200, help="每个进程独有的素材数")
+    parser.add_argument('--shared', type=int, default=20, help="所有进程都会导入和打标的素材数")
+    parser.add_argument('--animations', type=int, default=20, help="每个进程添加的动画数")
+    parser.add_argument('--labels', type=int, default=50, help="每个进程的打标次数")
+    parser.add_argument('--no-versioning', action='store_true', help="打标时不检查版本号（对照）")
+    parser.add_argument('--workdir', help="数据库目录（默认临时目录）")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        ok = run(args.processes, args.items, args.shared, args.animations, args.labels,
+                 not args.no_versioning, args.workdir or temp_dir)
+    sys.exit(0 if ok else 1)
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+命令行合成脚本（用于批量或 CI 重复合成，默认启用合成结果缓存）
+
+用法:
+    python build_cli.py --role role.json --item <md5> --item <md5> --output output/角色名
+    python build_cli.py --batch characters.json [--force]
+    python build_cli.py --batch characters.json --validation-report reports.jsonl --strict
+
+批量文件为列表，每项: {"role": ..., "items": [md5, ...], "output": ..., "animations": [action.json, ...]}
+"""
+
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent / "modules"))
+
+from database import ClothingDatabase
+from spine_builder import SpineBuilder
+from outfit_cache import CompiledOutfitCache
+from build_cache import BuildResultCache
+from skeleton_validator import validate_output
+
+
+def resolve_items(db, md5_hashes):
+    """按 MD5 从数据库取得服装，保持传入顺序（同类型服装的合并顺序）"""
+    selected_items = {}
+    for md5_hash in md5_hashes:
+        item = db.get_item_by_md5(md5_hash)
+        if item is None:
+            raise ValueError(f"数据库中没有该素材: {md5_hash}")
+        selected_items[md5_hash] = {'type': item['clothing_type'], 'path': item['source_path']}
+    return selected_items
+
+
+def build_one(builder, db, spec, args):
+    start = time.perf_counter()
+    animations = spec.get('animations') or []
+    result = builder.build_character(
+        spec['role'],
+        resolve_items(db, spec['items']),
+        spec['output'],
+        bool(animations),
+        animation_paths=animations,
+        prune_unused=args.prune_unused,
+        quantize=args.quantize,
+        optimize_images={'trim': args.trim_images, 'scale': args.image_scale} if args.optimize_images else None,
+        force=args.force,
+        incremental=args.incremental
+    )
+    elapsed = (time.perf_counter() - start) * 1000
+    source = "缓存" if result.get('cached') else "合成"
+    print(f"[{source}] {result['json_path']} 图片 {result['total_images']} 张, "
+          f"骨骼 {result['bones_count']}, 插槽 {result['slots_count']} ({elapsed:.0f} ms)")
+    # 旧版本缓存的结果没有校验报告，直接校验输出目录
+    validation = result.get('validation') or validate_output(spec['output'])
+    if validation['errors'] or validation['warnings']:
+        print(f"  校验: {validation['errors']} 个错误, {validation['warnings']} 个警告")
+    return validation
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Spine 角色命令行合成")
+    parser.add_argument('--role', help="role.json 路径")
+    parser.add_argument('--item', action='append', default=[], help="服装 MD5（可重复，按类型合并，同类型按顺序）")
+    parser.add_argument('--animation', action='append', default=[], help="action.json 路径（可重复）")
+    parser.add_argument('--output', help="输出目录")
+    parser.add_argument('--batch', help="批量合成描述文件（JSON 列表）")
+    parser.add_argument('--db', default="database/clothing.db", help="数据库路径")
+    parser.add_argument('--prune-unused', action='store_true', help="清理未引用数据")
+    parser.add_argument('--quantize', action='store_true', help="精简输出 JSON")
+    parser.add_argument('--optimize-images', action='store_true', help="无损压缩输出图片")
+    parser.add_argument('--trim-images', action='store_true', help="同时裁剪图片透明边（调整附件偏移）")
+    parser.add_argument('--image-scale', type=float, default=1.0, help="同时按比例缩小图片（如 0.5）")
+    parser.add_argument('--force', action='store_true', help="忽略缓存强制重新合成")
+    parser.add_argument('--incremental', action='store_true', help="同一输出目录重复合成时只重做变化的服装")
+    parser.add_argument('--no-cache', action='store_true', help="不使用合成结果缓存")
+    parser.add_argument('--cache-dir', default="cache/builds", help="合成结果缓存目录")
+    parser.add_argument('--cache-size', type=int, default=2048, help="合成结果缓存上限 (MB)")
+    parser.add_argument('--validation-report', help="把每个输出的校验报告作为一行 JSON 写入该文件")
+    parser.add_argument('--strict', action='store_true', help="校验有错误的输出也算合成失败")
+    parser.add_argument('--clear-cache', action='store_true', help="清空合成结果缓存后退出")
+    args = parser.parse_args()
+
+    build_cache = None
+    if not args.no_cache:
+        build_cache = BuildResultCache(args.cache_dir, args.cache_size * 1024 * 1024)
+        if args.clear_cache:
+            build_cache.clear()
+            print(f"已清空合成缓存: {build_cache.cache_dir}")
+            return 0
+
+    if args.batch:
+        with open(args.batch, 'r', encoding='utf-8') as f:
+            specs = json.load(f)
+    elif args.role and args.item and args.output:
+        specs = [{'role': args.role, 'items': args.item, 'output': args.output, 'animations': args.animation}]
+    else:
+        parser.error("需要 --batch，或同时指定 --role、--item 和 --output")
+
+    db = ClothingDatabase(args.db)
+    builder = SpineBuilder(db, CompiledOutfitCache(), build_cache)
+
+    report_file = open(args.validation_report, 'w', encoding='utf-8') if args.validation_report else None
+    failed = 0
+    invalid = 0
+    for spec in specs:
+        try:
+            validation = build_one(builder, db, spec, args)
+        except Exception as e:
+            print(f"[ERROR] 合成 {spec.get('output')} 失败: {e}")
+            failed += 1
+            continue
+        if not validation['valid']:
+            invalid += 1
+            if args.strict:
+                print(f"[ERROR] {spec['output']} 校验未通过")
+                failed += 1
+        if report_file is not None:
+            report_file.write(json.dumps(dict(validation, output=spec['output']), ensure_ascii=False) + "\n")
+    if report_file is not None:
+        report_file.close()
+    if invalid:
+        print(f"\n{invalid} 个输出校验有错误")
+
+    if build_cache is not None:
+        stats = build_cache.stats()
+        print(f"\n缓存命中 {stats['hits']} / 未命中 {stats['misses']}，"
+              f"共 {stats['entries']} 项 {stats['bytes'] / 1024 / 1024:.1f} MB")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
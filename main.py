@@ -12,6 +12,7 @@ from pathlib import Path
 import sys
 import os
 import json
+import multiprocessing
 from datetime import datetime
 
 # 获取资源路径（支持打包后的exe）
@@ -29,9 +30,18 @@ def get_resource_path(relative_path):
 modules_path = get_resource_path("modules")
 sys.path.insert(0, str(modules_path))
 
-from database import ClothingDatabase
+from database import ClothingDatabase, VersionConflictError
 from asset_processor import AssetProcessor
 from spine_builder import SpineBuilder
+from outfit_cache import CompiledOutfitCache
+from build_cache import BuildResultCache
+from image_optimizer import ImageOptimizer
+from preview_decoder import PreviewDecoder, image_size, thumbnail_size
+from outfit_renderer import OutfitRenderer
+from outfit_index import OutfitIndex
+from instrumentation import debug
+from asset_storage import storage_for, PACK_SUFFIX
+from catalog_snapshot import SNAPSHOT_SUFFIX
 
 class ClothingManagerApp:
     def __init__(self, root):
@@ -49,7 +59,13 @@ class ClothingManagerApp:
         db_dir.mkdir(exist_ok=True)
         self.db = ClothingDatabase(str(db_dir / "clothing.db"))
         self.processor = AssetProcessor("", self.db)
-        self.builder = SpineBuilder(self.db)
+        self.builder = SpineBuilder(self.db, CompiledOutfitCache(str(db_dir.parent / "cache" / "outfits")),
+                                    BuildResultCache(str(db_dir.parent / "cache" / "builds")),
+                                    image_optimizer=ImageOptimizer(str(db_dir.parent / "cache" / "images")))
+        self.thumbnail_dir = db_dir.parent / "cache" / "thumbnails"
+        self.outfit_index = OutfitIndex(self.db, self.builder)
+        # 合成页的初始姿势预览（按服装组合缓存）
+        self.outfit_renderer = OutfitRenderer(self.builder)
         
         # 当前选中的素材
         self.current_selection = {}
@@ -66,8 +82,12 @@ class ClothingManagerApp:
         file_menu = tk.Menu(menubar, tearoff=0)
         menubar.add_cascade(label="文件", menu=file_menu)
         file_menu.add_command(label="导入素材", command=self.show_import_dialog)
+        file_menu.add_command(label="导入素材包", command=self.show_import_pack_dialog)
         file_menu.add_command(label="分离动画", command=self.separate_animations)
         file_menu.add_separator()
+        file_menu.add_command(label="导出目录快照", command=self.export_snapshot)
+        file_menu.add_command(label="导入目录快照", command=self.import_snapshot)
+        file_menu.add_separator()
         file_menu.add_command(label="退出", command=self.root.quit)
         
         # 主标签页
@@ -245,6 +265,12 @@ class ClothingManagerApp:
         self.preview_canvas.bind('<Configure>', on_preview_canvas_configure)
         
         self.preview_images = []  # 保持图片引用
+        # 预览缩略图在线程池中解码，界面线程分批取回
+        self.preview_decoder = PreviewDecoder()
+        # 每张图片的 (框架, 图片标签)，按文件名顺序
+        self.preview_cells = []
+        # 解码完成前的空白占位图 {(宽, 高): PhotoImage}
+        self.preview_placeholders = {}
         
         # 当前选中项
         self.current_label_item = None
@@ -278,6 +304,39 @@ class ClothingManagerApp:
         ttk.Entry(config_frame, textvariable=self.anim_path_var, width=50).grid(row=2, column=1, padx=(100, 5), pady=5)
         ttk.Button(config_frame, text="浏览...", command=self.browse_animation).grid(row=2, column=2, padx=5, pady=5)
         
+        # 优化选项
+        self.prune_unused_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(config_frame, text="清理未引用数据", variable=self.prune_unused_var).grid(row=3, column=0, sticky=tk.W, padx=5, pady=5)
+        self.quantize_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(config_frame, text="精简输出JSON", variable=self.quantize_var).grid(row=3, column=1, sticky=tk.W, padx=5, pady=5)
+        self.force_rebuild_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(config_frame, text="强制重新合成", variable=self.force_rebuild_var).grid(row=3, column=2, sticky=tk.W, padx=5, pady=5)
+        # 增量合成：只重做更换的服装（复制变化的图片、序列化变化的插槽）
+        self.incremental_var = tk.BooleanVar(value=True)
+        ttk.Checkbutton(config_frame, text="增量合成", variable=self.incremental_var).grid(row=3, column=3, sticky=tk.W, padx=5, pady=5)
+        # 图片优化：无损压缩，可选裁剪透明边
+        self.optimize_images_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(config_frame, text="优化图片", variable=self.optimize_images_var).grid(row=5, column=0, sticky=tk.W, padx=5, pady=5)
+        self.trim_images_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(config_frame, text="裁剪图片透明边", variable=self.trim_images_var).grid(row=5, column=1, sticky=tk.W, padx=5, pady=5)
+        
+        # 兼容性过滤（根据服装索引和 role.json 骨骼）
+        self.compat_only_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(config_frame, text="只显示兼容服装", variable=self.compat_only_var,
+                        command=self.load_build_selections).grid(row=4, column=0, sticky=tk.W, padx=5, pady=5)
+        self.collision_label = ttk.Label(config_frame, text="", foreground='orange')
+        self.collision_label.grid(row=4, column=1, columnspan=2, sticky=tk.W, padx=5, pady=5)
+        
+        # 合成预览（切换服装时渲染初始姿势）
+        outfit_preview_frame = ttk.LabelFrame(self.frame_build, text="合成预览")
+        outfit_preview_frame.pack(side=tk.RIGHT, fill=tk.Y, padx=10, pady=10)
+        self.outfit_preview_label = ttk.Label(outfit_preview_frame, text="选择 role.json 和服装后显示预览",
+                                              anchor=tk.CENTER, width=40)
+        self.outfit_preview_label.pack(fill=tk.BOTH, expand=True)
+        self.outfit_preview_photo = None  # 保持图片引用
+        self.outfit_preview_size = 360
+        self._outfit_preview_job = None
+        
         # 服装选择区
         select_frame = ttk.LabelFrame(self.frame_build, text="服装选择")
         select_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
@@ -321,6 +380,21 @@ class ClothingManagerApp:
         folder = filedialog.askdirectory(title="选择素材文件夹（v1.0）")
         if not folder:
             return
+        self.run_import(folder)
+        
+    def show_import_pack_dialog(self):
+        """导入 .sdmpack 素材包"""
+        pack = filedialog.askopenfilename(
+            title="选择素材包",
+            filetypes=[("Spine Dress Pack", f"*{PACK_SUFFIX}")]
+        )
+        if not pack:
+            return
+        self.run_import(pack)
+        
+    def run_import(self, folder):
+        """导入素材文件夹目录或素材包"""
+        analyze_images = messagebox.askyesno("图片分析", "是否同时分析图片并生成缩略图？\n（多进程并行，素材较多时需要一些时间）")
         
         self.status_label.config(text=f"正在导入: {folder}...")
         self.root.update()
@@ -328,13 +402,23 @@ class ClothingManagerApp:
         # 创建处理器
         processor = AssetProcessor(folder, self.db, self.update_import_progress)
         
-        # 执行导入
-        results = processor.scan_and_import()
+        # 执行导入（每个文件夹的结果写入 JSONL 日志，不保留在内存中）
+        log_path = self.db.db_path.parent / "logs" / f"import_{datetime.now():%Y%m%d_%H%M%S}.jsonl"
+        results = processor.scan_and_import(log_path=log_path, analyze_images=analyze_images,
+                                            thumbnail_dir=self.thumbnail_dir)
         
         # 显示结果
-        message = f"导入完成！\n总计: {results['total']}\n成功: {results['success']}\n跳过: {results['skipped']}\n失败: {results['failed']}"
+        message = f"导入完成！\n总计: {results['total']}\n成功: {results['success']}\n跳过: {results['skipped']}\n失败: {results['failed']}\n日志: {log_path}"
+        if analyze_images:
+            images = results['images']
+            message += f"\n\n图片: {images['images']} 张\n缩略图: {images['thumbnails']} 个"
         messagebox.showinfo("导入完成", message)
         
+        # 为新导入的服装建立兼容性索引
+        self.status_label.config(text="正在建立服装索引...")
+        self.root.update()
+        self.outfit_index.refresh()
+        
         self.status_label.config(text="导入完成")
         self.refresh_statistics()
         self.refresh_type_list()
@@ -364,6 +448,48 @@ class ClothingManagerApp:
         messagebox.showinfo("完成", f"已分离 {count} 个动画到 {target}")
         self.refresh_statistics()
         
+    def export_snapshot(self):
+        """导出目录快照（拷贝到其他机器后用"导入目录快照"加载）"""
+        path = filedialog.asksaveasfilename(
+            title="导出目录快照",
+            defaultextension=SNAPSHOT_SUFFIX,
+            filetypes=[("目录快照", f"*{SNAPSHOT_SUFFIX}")]
+        )
+        if not path:
+            return
+        counts = self.db.export_snapshot(path)
+        messagebox.showinfo("完成", f"已导出 {counts['clothing_items']} 个服装、{counts['animations']} 个动画\n{path}")
+        
+    def import_snapshot(self):
+        """导入目录快照（替换或合并到当前数据库）"""
+        path = filedialog.askopenfilename(
+            title="选择目录快照",
+            filetypes=[("目录快照", f"*{SNAPSHOT_SUFFIX}")]
+        )
+        if not path:
+            return
+        merge = messagebox.askyesnocancel("导入方式", "是否与当前数据合并？\n是：保留现有素材，只添加新的\n否：替换当前全部数据")
+        if merge is None:
+            return
+        
+        self.status_label.config(text="正在导入快照...")
+        self.root.update()
+        try:
+            counts = self.db.import_snapshot(path, merge, progress_callback=self.update_snapshot_progress)
+        except Exception as e:
+            messagebox.showerror("错误", f"导入快照失败: {e}")
+            return
+        messagebox.showinfo("完成", f"已导入 {counts.get('clothing_items', 0)} 个服装、{counts.get('animations', 0)} 个动画")
+        
+        self.outfit_index.refresh()
+        self.status_label.config(text="快照导入完成")
+        self.refresh_statistics()
+        self.refresh_type_list()
+        
+    def update_snapshot_progress(self, rows):
+        self.status_label.config(text=f"正在导入快照... {rows} 行")
+        self.root.update()
+        
     def refresh_type_list(self):
         """刷新类型列表"""
         self.type_listbox.delete(0, tk.END)
@@ -467,15 +593,9 @@ class ClothingManagerApp:
                 found_path = None
                 meta_data = {}
                 for test_path in possible_paths:
-                    if test_path and test_path.exists():
-                        # 检查是否有 meta.json
-                        meta_path = test_path / 'meta.json'
-                        if meta_path.exists():
-                            try:
-                                with open(meta_path, 'r', encoding='utf-8') as f:
-                                    meta_data = json.load(f)
-                            except:
-                                pass
+                    found_meta = self.load_item_meta(test_path)
+                    if found_meta is not None:
+                        meta_data = found_meta
                         found_path = test_path
                         break
                 
@@ -504,9 +624,9 @@ class ClothingManagerApp:
                     item['description'] = meta_data.get('description')
         else:
             # 动画模式
-            print(f"[DEBUG] 加载动画模式...")
+            debug("加载动画模式...")
             animations = self.db.get_all_animations()
-            print(f"[DEBUG] 获取到 {len(animations)} 个动画")
+            debug("获取到 %s 个动画", len(animations))
             
             for idx, anim in enumerate(animations):
                 md5_hash = anim['md5_hash']
@@ -526,15 +646,9 @@ class ClothingManagerApp:
                 found_path = None
                 meta_data = {}
                 for test_path in possible_paths:
-                    if test_path.exists():
-                        # 检查是否有 meta.json
-                        meta_path = test_path / 'meta.json'
-                        if meta_path.exists():
-                            try:
-                                with open(meta_path, 'r', encoding='utf-8') as f:
-                                    meta_data = json.load(f)
-                            except:
-                                pass
+                    found_meta = self.load_item_meta(test_path)
+                    if found_meta is not None:
+                        meta_data = found_meta
                         found_path = test_path
                         break
                 
@@ -559,20 +673,35 @@ class ClothingManagerApp:
                     anim['meta_data'] = meta_data
                     anim['action_name'] = meta_data.get('name') or anim.get('action_name')
                     anim['description'] = meta_data.get('description') or anim.get('description')
-                    print(f"[DEBUG] 已添加到列表: {display}")
+                    debug("已添加到列表: %s", display)
                 else:
-                    print(f"[DEBUG] 所有路径都不存在，跳过")
+                    debug("所有路径都不存在，跳过")
+    
+    def load_item_meta(self, item_path):
+        """读取素材位置（目录或素材包）中的 meta.json，素材不存在时返回 None"""
+        try:
+            storage, md5_hash = storage_for(item_path)
+        except (OSError, ValueError):
+            return None
+        if not storage.exists(md5_hash):
+            return None
+        if not storage.exists(md5_hash, 'meta.json'):
+            return {}
+        try:
+            return storage.load_json(md5_hash, 'meta.json')
+        except Exception:
+            return {}
     
     def on_label_folder_select(self, event):
         """文件夹选择事件"""
-        print(f"\n[DEBUG] ========== 文件夹选择事件 ==========")
+        debug("========== 文件夹选择事件 ==========")
         selection = self.label_folder_tree.curselection()
         if not selection:
-            print("[DEBUG] 未选择任何文件夹")
+            debug("未选择任何文件夹")
             return
         
         idx = selection[0]
-        print(f"[DEBUG] 选择的索引: {idx}")
+        debug("选择的索引: %s", idx)
         
         # 使用MD5映射查找
         if not hasattr(self, 'folder_md5_map') or idx not in self.folder_md5_map:
@@ -580,18 +709,18 @@ class ClothingManagerApp:
             return
         
         md5_hash = self.folder_md5_map[idx]
-        print(f"[DEBUG] 对应的MD5: {md5_hash}")
+        debug("对应的MD5: %s", md5_hash)
         
         mode = self.label_mode_var.get()
-        print(f"[DEBUG] 当前模式: {mode}")
+        debug("当前模式: %s", mode)
         
         # 查找对应的数据库记录
         if mode == "clothing":
-            print("[DEBUG] 开始查找服装...")
+            debug("开始查找服装...")
             item = self.db.get_item_by_md5(md5_hash)
             
             if item:
-                print(f"[DEBUG] ✓ 找到匹配!")
+                debug("✓ 找到匹配!")
                 folder_path = Path(item['source_path'])
                 self.current_label_item = item
                 self.label_md5_db.config(text=item['md5_hash'])
@@ -605,18 +734,18 @@ class ClothingManagerApp:
                 self.entry_label_desc.insert(0, description)
                 
                 # 显示文件夹内所有图片
-                print(f"[DEBUG] 调用 show_folder_preview: {folder_path}")
+                debug("调用 show_folder_preview: %s", folder_path)
                 self.show_folder_preview(folder_path)
             else:
                 print(f"[ERROR] 未找到匹配的服装: {md5_hash}")
         else:
             # 动画模式
-            print("[DEBUG] 开始查找动画...")
+            debug("开始查找动画...")
             animations = self.db.get_all_animations()
             
             for anim in animations:
                 if anim['md5_hash'] == md5_hash:
-                    print(f"[DEBUG] ✓ 找到匹配的动画!")
+                    debug("✓ 找到匹配的动画!")
                     folder_path = Path(anim['source_path'])
                     self.current_label_item = anim
                     self.label_md5_db.config(text=anim['md5_hash'])
@@ -634,21 +763,27 @@ class ClothingManagerApp:
     
     def show_folder_preview(self, folder_path):
         """显示文件夹内所有图片预览 - 响应式布局"""
-        print(f"[DEBUG] 开始显示文件夹预览: {folder_path}")
+        debug("开始显示文件夹预览: %s", folder_path)
         
-        # 清除旧图片
+        # 清除旧图片，放弃上一个文件夹未完成的解码
+        self.preview_decoder.cancel()
         for widget in self.preview_inner_frame.winfo_children():
             widget.destroy()
         self.preview_images.clear()
+        self.preview_cells = []
         
-        # 检查文件夹是否存在
-        if not folder_path.exists():
+        # 检查文件夹是否存在（目录或素材包）
+        try:
+            storage, md5_hash = storage_for(folder_path)
+        except (OSError, ValueError):
+            storage, md5_hash = None, None
+        if storage is None or not storage.exists(md5_hash):
             ttk.Label(self.preview_inner_frame, text=f"文件夹不存在:\n{folder_path}").pack(pady=20)
             return
         
         # 查找所有图片
-        png_files = sorted(folder_path.glob("*.png"))
-        print(f"[DEBUG] 找到 {len(png_files)} 个PNG文件")
+        png_files = storage.list_files(md5_hash, "*.png")
+        debug("找到 %s 个PNG文件", len(png_files))
         
         if not png_files:
             ttk.Label(self.preview_inner_frame, text=f"文件夹内没有图片\n{folder_path}").pack(pady=20)
@@ -665,56 +800,52 @@ class ClothingManagerApp:
         # 保存图片路径和加载状态
         self.preview_png_files = png_files
         self.preview_folder_path = folder_path
+        self.preview_storage = storage
+        self.preview_md5 = md5_hash
         self.preview_thumb_size = 100
         
-        # 加载图片
-        self.load_preview_images()
+        # 先按图片尺寸放好占位框，再在后台解码
+        self.create_preview_cells()
+        self.layout_preview(getattr(self, '_last_cols', 4))
+        self.preview_generation = self.preview_decoder.request(storage, md5_hash, png_files, self.preview_thumb_size)
+        self.preview_loaded = 0
+        self.root.after(10, self.pump_preview, self.preview_generation)
         
         # 绑定窗口大小变化事件
         self.preview_canvas.bind('<Configure>', self.on_preview_resize)
     
-    def load_preview_images(self, cols=4):
-        """加载预览图片到网格"""
-        # 清除现有图片（保留框架结构）
-        for widget in self.preview_inner_frame.winfo_children():
-            widget.destroy()
-        self.preview_images.clear()
-        
-        png_files = self.preview_png_files
+    def create_preview_cells(self):
+        """为每张图片创建框架和占位图（尺寸取自图片元数据或 PNG 文件头，不解码）"""
         thumb_size = self.preview_thumb_size
-        loaded_count = 0
-        
-        for idx, img_path in enumerate(png_files):
-            try:
-                from PIL import Image, ImageTk
-                
-                # 创建图片框架
-                frame = ttk.Frame(self.preview_inner_frame, relief=tk.GROOVE, padding=2)
-                row = idx // cols
-                col = idx % cols
-                frame.grid(row=row, column=col, padx=5, pady=5, sticky="nsew")
-                
-                # 加载并缩放图片
-                img = Image.open(img_path)
-                img.thumbnail((thumb_size, thumb_size), Image.Resampling.LANCZOS)
-                photo = ImageTk.PhotoImage(img)
-                self.preview_images.append(photo)
-                
-                # 图片标签
-                label = ttk.Label(frame, image=photo)
-                label.pack()
-                
-                # 文件名标签
-                name_label = ttk.Label(frame, text=img_path.name[:12], 
-                                      wraplength=thumb_size, font=('Arial', 7))
-                name_label.pack()
-                
-                loaded_count += 1
-                
-            except Exception as e:
-                print(f"[ERROR] 无法加载图片 {img_path}: {e}")
-        
-        print(f"[DEBUG] 成功加载 {loaded_count}/{len(png_files)} 张图片，列数: {cols}")
+        known_sizes = {row['file_name']: (row['width'], row['height'])
+                       for row in self.db.get_image_metadata(self.preview_md5)}
+        
+        for img_name in self.preview_png_files:
+            size = known_sizes.get(img_name)
+            if size is None:
+                try:
+                    size = image_size(self.preview_storage, self.preview_md5, img_name)
+                except Exception:
+                    size = (thumb_size, thumb_size)
+            size = thumbnail_size(size, thumb_size)
+            placeholder = self.preview_placeholders.get(size)
+            if placeholder is None:
+                placeholder = self.preview_placeholders[size] = tk.PhotoImage(width=size[0], height=size[1])
+            
+            frame = ttk.Frame(self.preview_inner_frame, relief=tk.GROOVE, padding=2)
+            # 图片标签
+            label = ttk.Label(frame, image=placeholder)
+            label.pack()
+            # 文件名标签
+            name_label = ttk.Label(frame, text=img_name[:12], 
+                                  wraplength=thumb_size, font=('Arial', 7))
+            name_label.pack()
+            self.preview_cells.append((frame, label))
+    
+    def layout_preview(self, cols=4):
+        """把预览框架排列到网格（只重新排列，不重新解码）"""
+        for idx, (frame, _) in enumerate(self.preview_cells):
+            frame.grid(row=idx // cols, column=idx % cols, padx=5, pady=5, sticky="nsew")
         
         # 更新滚动区域
         self.preview_inner_frame.update_idletasks()
@@ -722,6 +853,27 @@ class ClothingManagerApp:
         if bbox:
             self.preview_canvas.configure(scrollregion=bbox)
     
+    def pump_preview(self, generation):
+        """分批取回后台解码完成的缩略图并显示（界面线程）"""
+        if generation != self.preview_decoder.generation:
+            return
+        from PIL import ImageTk
+        
+        for idx, img_name, img, error in self.preview_decoder.poll():
+            self.preview_loaded += 1
+            frame, label = self.preview_cells[idx]
+            if img is None:
+                print(f"[ERROR] 无法加载图片 {img_name}: {error}")
+                continue
+            photo = ImageTk.PhotoImage(img)
+            self.preview_images.append(photo)
+            label.configure(image=photo)
+        
+        if self.preview_loaded < len(self.preview_cells):
+            self.root.after(15, self.pump_preview, generation)
+        else:
+            debug("成功加载 %s 张图片", len(self.preview_cells))
+    
     def on_preview_resize(self, event):
         """预览区域大小变化时重新计算列数"""
         # 获取Canvas宽度
@@ -732,12 +884,12 @@ class ClothingManagerApp:
         cols = max(2, canvas_width // item_width)  # 至少2列
         cols = min(6, cols)  # 最多6列
         
-        # 如果列数变化，重新加载
+        # 如果列数变化，重新排列
         if not hasattr(self, '_last_cols') or self._last_cols != cols:
             self._last_cols = cols
-            if hasattr(self, 'preview_png_files') and self.preview_png_files:
-                self.load_preview_images(cols)
-                print(f"[DEBUG] 响应式重排: 宽度={canvas_width}, 列数={cols}")
+            if self.preview_cells:
+                self.layout_preview(cols)
+                debug("响应式重排: 宽度=%s, 列数=%s", canvas_width, cols)
     
     def save_label(self):
         """保存标签 - 只生成 meta.json，不重命名文件夹"""
@@ -757,36 +909,32 @@ class ClothingManagerApp:
             
             mode = self.label_mode_var.get()
             
+            # 先更新数据库中的标签（乐观锁：其他人已修改时询问是否覆盖）
+            md5_hash = self.current_label_item['md5_hash']
+            try:
+                self.save_label_to_db(mode, md5_hash, new_name, desc, self.current_label_item.get('version'))
+            except VersionConflictError as e:
+                current_name = e.current.get('custom_name' if mode == 'clothing' else 'action_name') or ''
+                if not messagebox.askyesno("标签冲突", f"该素材已被其他人修改为「{current_name}」，是否覆盖？"):
+                    self.refresh_label_view()
+                    return
+                self.save_label_to_db(mode, md5_hash, new_name, desc, e.current['version'])
+            
             # 创建 meta.json 文件
             meta_data = {
                 'name': new_name,
                 'description': desc,
-                'md5': self.current_label_item['md5_hash'],
+                'md5': md5_hash,
                 'type': self.current_label_item.get('clothing_type') if mode == 'clothing' else 'Action',
                 'labeled_at': str(datetime.now())
             }
             
-            # 保存 meta.json 到文件夹
-            meta_path = folder_path / 'meta.json'
-            with open(meta_path, 'w', encoding='utf-8') as f:
-                json.dump(meta_data, f, indent=2, ensure_ascii=False)
-            
-            # 更新数据库中的标签信息
-            if mode == "clothing":
-                self.db.update_clothing_label(
-                    self.current_label_item['md5_hash'],
-                    new_name,
-                    desc,
-                    None
-                )
-            else:
-                self.db.add_animation(
-                    self.current_label_item['md5_hash'],
-                    folder_path.name,  # 保持原文件夹名(MD5)
-                    new_name,  # 使用打标的名字
-                    desc,
-                    str(folder_path)  # 保持原路径
-                )
+            # 保存 meta.json 到文件夹（素材包只读，只更新数据库）
+            storage, _ = storage_for(folder_path)
+            if storage.writable:
+                meta_path = folder_path / 'meta.json'
+                with open(meta_path, 'w', encoding='utf-8') as f:
+                    json.dump(meta_data, f, indent=2, ensure_ascii=False)
             
             messagebox.showinfo("成功", f"已保存标签: {new_name}\n真实文件夹名保持: {folder_path.name}")
             self.refresh_label_view()
@@ -796,6 +944,13 @@ class ClothingManagerApp:
             import traceback
             traceback.print_exc()
     
+    def save_label_to_db(self, mode, md5_hash, name, desc, version):
+        """按模式更新服装或动画标签，version 为读取记录时的版本号"""
+        if mode == "clothing":
+            self.db.update_clothing_label(md5_hash, name, desc, None, expected_version=version)
+        else:
+            self.db.update_animation_label(md5_hash, name, desc, expected_version=version)
+    
     # 保留旧方法以兼容
     def refresh_unlabeled(self):
         """兼容旧方法"""
@@ -822,9 +977,12 @@ class ClothingManagerApp:
             widget.destroy()
             
         self.build_combos = {}
+        # {类型: {选项文本: 服装}}
+        self.build_options = {}
         
         # 获取所有类型
         items_by_type = self.db.get_items_by_type()
+        compatibility = self.load_role_compatibility()
         
         # 如果没有素材，显示提示
         if not items_by_type or all(len(items) == 0 for items in items_by_type.values()):
@@ -855,15 +1013,23 @@ class ClothingManagerApp:
             combo = ttk.Combobox(frame, width=25, state="readonly")
             combo.pack(side=tk.LEFT, padx=5)
             
-            # 准备选项
+            # 准备选项（不兼容的服装标记 ⚠，勾选"只显示兼容服装"时隐藏）
             items = items_by_type[clothing_type]
             options = ["不选择"]
+            self.build_options[clothing_type] = {}
             for item in items:
+                report = compatibility.get(item['md5_hash'])
+                incompatible = report is not None and not report['compatible']
+                if incompatible and self.compat_only_var.get():
+                    continue
                 name = item['custom_name'] or item['md5_hash'][:16]
-                options.append(f"{name} ({item['md5_hash'][:8]})")
+                option = f"{'⚠ ' if incompatible else ''}{name} ({item['md5_hash'][:8]})"
+                options.append(option)
+                self.build_options[clothing_type][option] = item
                 
             combo['values'] = options
             combo.set("不选择")
+            combo.bind('<<ComboboxSelected>>', self.on_build_selection_changed)
             
             # 如果是 HandOrnament 类型，禁用下拉菜单
             if clothing_type == "HandOrnament":
@@ -879,6 +1045,88 @@ class ClothingManagerApp:
         # 如果最后一行不满3个，也换行
         if len(clothing_types) % items_per_row != 0:
             row += 1
+        
+        self.on_build_selection_changed()
+    
+    def load_role_compatibility(self):
+        """根据服装索引计算所有服装对当前 role.json 的兼容性 {md5: 报告}，未选择角色时为空"""
+        role_path = self.role_path_var.get() if hasattr(self, 'role_path_var') else ''
+        if not role_path or not Path(role_path).exists():
+            return {}
+        try:
+            with open(role_path, 'r', encoding='utf-8') as f:
+                role_bones = json.load(f).get('bones', [])
+        except (OSError, ValueError) as e:
+            print(f"[WARN] 无法读取 role.json: {e}")
+            return {}
+        # 只为缺少索引的服装建立索引（导入时已建立）
+        self.outfit_index.refresh()
+        return self.outfit_index.compatibility(role_bones)
+    
+    def selected_build_items(self):
+        """当前下拉框选中的服装 {md5: 服装}"""
+        selected = {}
+        for clothing_type, combo in self.build_combos.items():
+            item = self.build_options.get(clothing_type, {}).get(combo.get())
+            if item is not None:
+                selected[item['md5_hash']] = item
+        return selected
+    
+    def build_inputs(self):
+        """当前选中的服装转为合成参数 {md5: {'type': 类型, 'path': 素材路径}}"""
+        return {md5_hash: {'type': item['clothing_type'], 'path': item['source_path']}
+                for md5_hash, item in self.selected_build_items().items()}
+    
+    def on_build_selection_changed(self, event=None):
+        """切换服装：更新插槽冲突提示和合成预览"""
+        self.check_slot_collisions()
+        # 合并短时间内的多次切换，只渲染最后一次
+        if self._outfit_preview_job is not None:
+            self.root.after_cancel(self._outfit_preview_job)
+        self._outfit_preview_job = self.root.after(50, self.update_outfit_preview)
+    
+    def update_outfit_preview(self):
+        """渲染当前服装组合的初始姿势（相同组合直接使用缓存）"""
+        self._outfit_preview_job = None
+        role_path = self.role_path_var.get()
+        selected_items = self.build_inputs()
+        if not role_path or not Path(role_path).exists() or not selected_items:
+            self.outfit_preview_photo = None
+            self.outfit_preview_label.config(image='', text="选择 role.json 和服装后显示预览")
+            return
+        
+        try:
+            from PIL import ImageTk
+            image = self.outfit_renderer.render(role_path, selected_items, self.outfit_preview_size)
+        except Exception as e:
+            print(f"[WARN] 无法渲染合成预览: {e}")
+            self.outfit_preview_photo = None
+            self.outfit_preview_label.config(image='', text=f"无法渲染预览:\n{e}")
+            return
+        
+        self.outfit_preview_photo = ImageTk.PhotoImage(image)
+        self.outfit_preview_label.config(image=self.outfit_preview_photo, text='')
+        stats = self.outfit_renderer.last_stats
+        debug("合成预览: 附件 %s 个, 缺失图片 %s, 缓存 %s",
+              stats.get('attachments'), stats.get('missing_images'), stats.get('cached'))
+    
+    def check_slot_collisions(self, event=None):
+        """提示已选服装之间的插槽冲突"""
+        if not hasattr(self, 'collision_label'):
+            return
+        selected = self.selected_build_items()
+        collisions = self.outfit_index.slot_collisions(selected)
+        if not collisions:
+            self.collision_label.config(text="")
+            return
+        parts = []
+        for slot_name, owners in sorted(collisions.items()):
+            types = "/".join(selected[md5_hash]['clothing_type'] for md5_hash in owners)
+            parts.append(f"{slot_name} ({types})")
+        text = "插槽冲突（后选的覆盖先选的）: " + ", ".join(parts[:6])
+        if len(parts) > 6:
+            text += f" 等 {len(parts)} 个"
+        self.collision_label.config(text=text)
             
     def browse_role(self):
         """浏览 role.json"""
@@ -888,15 +1136,17 @@ class ClothingManagerApp:
         )
         if file:
             self.role_path_var.set(file)
+            # 按新角色骨架重新标记兼容性
+            self.load_build_selections()
             
     def browse_animation(self):
-        """浏览动画文件"""
-        file = filedialog.askopenfilename(
+        """浏览动画文件（可多选，路径以 ; 分隔）"""
+        files = filedialog.askopenfilenames(
             title="选择 action.json",
             filetypes=[("JSON files", "*.json")]
         )
-        if file:
-            self.anim_path_var.set(file)
+        if files:
+            self.anim_path_var.set(";".join(files))
             
     def build_character(self):
         """构建角色"""
@@ -912,22 +1162,7 @@ class ClothingManagerApp:
             return
             
         # 收集选中的素材
-        selected_items = {}
-        for clothing_type, combo in self.build_combos.items():
-            value = combo.get()
-            if value != "不选择":
-                # 提取MD5
-                md5_short = value.split('(')[-1].rstrip(')')
-                
-                # 查找完整MD5
-                items_by_type = self.db.get_items_by_type()
-                for item in items_by_type.get(clothing_type, []):
-                    if item['md5_hash'].startswith(md5_short):
-                        selected_items[item['md5_hash']] = {
-                            'type': clothing_type,
-                            'path': item['source_path']
-                        }
-                        break
+        selected_items = self.build_inputs()
                         
         if not selected_items:
             messagebox.showwarning("警告", "请至少选择一种服装")
@@ -941,16 +1176,29 @@ class ClothingManagerApp:
         self.status_label.config(text="正在合成...")
         self.root.update()
         
+        # 动画文件（多个以 ; 分隔）
+        anim_paths = [p.strip() for p in self.anim_path_var.get().split(';') if p.strip()]
+        
         try:
             result = self.builder.build_character(
                 role_path,
                 selected_items,
                 output_dir,
                 self.include_anim_var.get(),
-                self.anim_path_var.get() if self.include_anim_var.get() else None
+                animation_paths=anim_paths if self.include_anim_var.get() else None,
+                prune_unused=self.prune_unused_var.get(),
+                quantize=self.quantize_var.get(),
+                optimize_images={'trim': self.trim_images_var.get()} if self.optimize_images_var.get() else None,
+                force=self.force_rebuild_var.get(),
+                incremental=self.incremental_var.get()
             )
             
-            message = f"合成完成！\n\nJSON: {result['json_path']}\n图片: {result['total_images']} 张\n骨骼: {result['bones_count']}\n插槽: {result['slots_count']}\n附件: {result['attachments_count']}"
+            message = f"合成完成{'（使用缓存）' if result.get('cached') else ''}！\n\nJSON: {result['json_path']}\n图片: {result['total_images']} 张\n骨骼: {result['bones_count']}\n插槽: {result['slots_count']}\n附件: {result['attachments_count']}"
+            if result.get('image_optimization'):
+                message += f"\n图片优化节省: {result['image_optimization']['saved'] / 1024:.1f} KB"
+            validation = result.get('validation')
+            if validation and (validation['errors'] or validation['warnings']):
+                message += f"\n\n校验: {validation['errors']} 个错误, {validation['warnings']} 个警告（详见日志）"
             messagebox.showinfo("成功", message)
             
             # 打开输出目录
@@ -981,7 +1229,17 @@ class ClothingManagerApp:
         for stat in stats['type_stats']:
             labeled = stat['labeled_count'] or 0
             total = stat['count'] or 0
-            text += f"{stat['clothing_type']}: {total} 个 (已打标: {labeled})\n"
+            text += f"{stat['clothing_type']}: {total} 个 (已打标: {labeled}, 未打标: {total - labeled})\n"
+        
+        # 图片元数据（导入时分析过的素材）
+        images = self.db.get_image_summary()
+        if images['images']:
+            text += "\n图片统计:\n"
+            text += "-" * 50 + "\n"
+            text += f"图片数: {images['images']}\n"
+            text += f"总像素: {images['pixels']:,}\n"
+            text += f"裁剪透明边后像素: {images['trimmed_pixels']:,}\n"
+            text += f"文件大小: {images['bytes'] / 1024 / 1024:.1f} MB\n"
             
         self.stats_text.delete(1.0, tk.END)
         self.stats_text.insert(tk.END, text)
@@ -990,6 +1248,9 @@ def main():
     root = tk.Tk()
     app = ClothingManagerApp(root)
     root.mainloop()
+    app.preview_decoder.shutdown()
 
 if __name__ == "__main__":
+    # 打包为 exe 后进程池需要
+    multiprocessing.freeze_support()
     main()
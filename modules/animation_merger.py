@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+动画合并模块 - 多个 action.json 按时间轴合并，支持冲突策略和无效时间轴清理
+"""
+
+from collections import OrderedDict
+from pathlib import Path
+
+from instrumentation import span
+from asset_storage import storage_for
+
+# 各动画分组到达"单条时间轴"所需的嵌套层数
+#   bones:       {骨骼: {rotate/translate/...: [关键帧]}}
+#   deform:      {皮肤: {插槽: {附件: [关键帧]}}}         (Spine 3.x)
+#   attachments: {皮肤: {插槽: {附件: {deform: [关键帧]}}}} (Spine 4.x)
+# 未列出的分组（drawOrder、events 等）按整体处理
+TIMELINE_DEPTH = {
+    'bones': 2,
+    'slots': 2,
+    'ik': 1,
+    'transform': 1,
+    'path': 2,
+    'physics': 2,
+    'deform': 3,
+    'attachments': 4,
+}
+
+# 冲突策略
+#   replace  - 同名时间轴后合并的覆盖先合并的
+#   keep     - 同名时间轴保留先合并的
+#   error    - 同名时间轴且内容不同时报错
+#   override - 同名动画整体覆盖（旧版 merge_action_to_role 行为）
+CONFLICT_POLICIES = ('replace', 'keep', 'error', 'override')
+
+
+def copy_containers(value, depth):
+    """复制前 depth 层字典，关键帧列表本身共享"""
+    if depth <= 0 or not isinstance(value, dict):
+        return value
+    return {k: copy_containers(v, depth - 1) for k, v in value.items()}
+
+
+class AnimationConflictError(ValueError):
+    """conflict_policy='error' 时遇到冲突的时间轴"""
+
+
+class AnimationMerger:
+    def __init__(self, max_cached_files=32):
+        # 已解析的动作文件缓存 {路径: (mtime, size, 数据)}
+        self._parsed = OrderedDict()
+        self.max_cached_files = max_cached_files
+
+    def load_action(self, action_path):
+        """读取动作文件（可位于素材包内），文件未变化时直接返回缓存（返回的数据只读）"""
+        action_path = Path(action_path).resolve()
+        storage, md5_hash = storage_for(action_path.parent)
+        st = storage.stat(md5_hash, action_path.name)
+        if st is None:
+            raise FileNotFoundError(str(action_path))
+        size, mtime_ns = st
+        key = str(action_path)
+
+        cached = self._parsed.get(key)
+        if cached and cached[0] == mtime_ns and cached[1] == size:
+            self._parsed.move_to_end(key)
+            return cached[2]
+
+        with span('json.parse', file=action_path.name):
+            action_data = storage.load_json(md5_hash, action_path.name)
+
+        self._parsed[key] = (mtime_ns, size, action_data)
+        self._parsed.move_to_end(key)
+        while len(self._parsed) > self.max_cached_files:
+            self._parsed.popitem(last=False)
+        return action_data
+
+    def clear_cache(self):
+        self._parsed.clear()
+
+    # ==================== 合并 ====================
+
+    def _merge_level(self, target, incoming, depth, policy, path, conflicts):
+        for key, value in incoming.items():
+            key_path = path + (key,)
+            if key not in target:
+                target[key] = copy_containers(value, depth - 1)
+            elif depth > 1 and isinstance(value, dict) and isinstance(target[key], dict):
+                self._merge_level(target[key], value, depth - 1, policy, key_path, conflicts)
+            elif target[key] != value:
+                conflicts.append('/'.join(key_path))
+                if policy == 'error':
+                    raise AnimationConflictError(f"动画时间轴冲突: {'/'.join(key_path)}")
+                if policy == 'replace':
+                    target[key] = copy_containers(value, depth - 1)
+
+    def merge_animations(self, role_data, action_data, conflict_policy='replace'):
+        """将 action_data 中的动画按时间轴合并到 role_data，返回冲突的时间轴路径列表"""
+        if conflict_policy not in CONFLICT_POLICIES:
+            raise ValueError(f"未知的冲突策略: {conflict_policy}")
+
+        animations = role_data.setdefault('animations', {})
+        conflicts = []
+
+        for anim_name, anim_data in action_data.get('animations', {}).items():
+            if conflict_policy == 'override' or anim_name not in animations:
+                animations[anim_name] = {
+                    group: copy_containers(data, TIMELINE_DEPTH.get(group, 0))
+                    for group, data in anim_data.items()
+                }
+                continue
+
+            target = animations[anim_name]
+            for group, data in anim_data.items():
+                depth = TIMELINE_DEPTH.get(group, 0)
+                if group not in target:
+                    target[group] = copy_containers(data, depth)
+                elif depth > 0 and isinstance(data, dict) and isinstance(target[group], dict):
+                    self._merge_level(target[group], data, depth, conflict_policy,
+                                      (anim_name, group), conflicts)
+                elif target[group] != data:
+                    conflicts.append(f"{anim_name}/{group}")
+                    if conflict_policy == 'error':
+                        raise AnimationConflictError(f"动画时间轴冲突: {anim_name}/{group}")
+                    if conflict_policy == 'replace':
+                        target[group] = copy_containers(data, depth)
+
+        return conflicts
+
+    # ==================== 清理 ====================
+
+    def prune_animations(self, role_data):
+        """删除引用了不存在的骨骼/插槽/约束/附件的时间轴，返回各分组删除数量"""
+        animations = role_data.get('animations', {})
+        bone_names = {b['name'] for b in role_data.get('bones', [])}
+        slot_names = {s['name'] for s in role_data.get('slots', [])}
+        constraint_names = {
+            group: {c['name'] for c in role_data.get(group, []) if isinstance(c, dict) and 'name' in c}
+            for group in ('ik', 'transform', 'path', 'physics')
+        }
+        skins = role_data.get('skins', {})
+        # 仅支持 3.x 的字典格式皮肤 {皮肤: {插槽: {附件: ...}}}
+        skin_map = skins if isinstance(skins, dict) else None
+
+        pruned = {}
+
+        def drop(group, container, key):
+            del container[key]
+            pruned[group] = pruned.get(group, 0) + 1
+
+        for anim_data in animations.values():
+            for name in list(anim_data.get('bones', {})):
+                if name not in bone_names:
+                    drop('bones', anim_data['bones'], name)
+
+            for name in list(anim_data.get('slots', {})):
+                if name not in slot_names:
+                    drop('slots', anim_data['slots'], name)
+
+            for group, names in constraint_names.items():
+                timelines = anim_data.get(group)
+                if not isinstance(timelines, dict):
+                    continue
+                for name in list(timelines):
+                    # 路径约束名为空字符串表示默认约束，保留
+                    if name and name not in names:
+                        drop(group, timelines, name)
+
+            for group in ('deform', 'attachments'):
+                by_skin = anim_data.get(group)
+                if not isinstance(by_skin, dict):
+                    continue
+                for skin_name in list(by_skin):
+                    by_slot = by_skin[skin_name]
+                    skin = skin_map.get(skin_name) if skin_map is not None else None
+                    for slot_name in list(by_slot):
+                        if slot_name not in slot_names:
+                            drop(group, by_slot, slot_name)
+                            continue
+                        if skin is None:
+                            continue
+                        slot_attachments = skin.get(slot_name, {})
+                        for attach_name in list(by_slot[slot_name]):
+                            if attach_name not in slot_attachments:
+                                drop(group, by_slot[slot_name], attach_name)
+                        if not by_slot[slot_name]:
+                            del by_slot[slot_name]
+                    if not by_slot:
+                        del by_skin[skin_name]
+
+            # 清理空分组
+            for group in list(anim_data):
+                if group in TIMELINE_DEPTH and not anim_data[group]:
+                    del anim_data[group]
+
+        return pruned
+
+
+if __name__ == "__main__":
+    merger = AnimationMerger()
+    role = {'bones': [{'name': 'root'}], 'slots': [], 'animations': {}}
+    merger.merge_animations(role, {'animations': {'idle': {'bones': {'root': {'rotate': []}, 'ghost': {'rotate': []}}}}})
+    print(f"清理结果: {merger.prune_animations(role)}")
+    print(f"动画: {role['animations']}")
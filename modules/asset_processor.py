@@ -5,21 +5,31 @@
 """
 
 import json
-import shutil
 from pathlib import Path
-from PIL import Image, ImageTk
+from PIL import ImageTk
 import tkinter as tk
 
+from instrumentation import span, traced, debug
+from relocation import AssetRelocator
+from asset_storage import open_storage, storage_for, PACK_SUFFIX
+from image_analyzer import ImageAnalyzer, make_thumbnail
+
 class AssetProcessor:
     def __init__(self, source_dir, db, progress_callback=None):
         self.source_dir = Path(source_dir)
+        # 源目录可以是素材文件夹目录或 .sdmpack 素材包
+        self.storage = open_storage(self.source_dir) if source_dir else None
         self.db = db
         self.progress_callback = progress_callback
+        self.import_counts = {'total': 0, 'success': 0, 'skipped': 0, 'failed': 0}
+        self.last_relocation_report = None
+        self.last_image_summary = None
         
+    @traced('import.process_folder')
     def process_folder(self, folder_path):
         """处理单个文件夹 - 读取 meta.json"""
         folder_path = Path(folder_path)
-        md5_hash = folder_path.name
+        storage, md5_hash = storage_for(folder_path)
         
         # 检查是否已存在（服装表或动画表）
         if self.db.check_md5_exists(md5_hash) or self.db.check_animation_exists(md5_hash):
@@ -27,33 +37,32 @@ class AssetProcessor:
         
         # 读取 meta.json（如果存在）
         meta_data = {}
-        meta_path = folder_path / 'meta.json'
-        if meta_path.exists():
+        if storage.exists(md5_hash, 'meta.json'):
             try:
-                with open(meta_path, 'r', encoding='utf-8') as f:
-                    meta_data = json.load(f)
-                print(f"[DEBUG] 读取到 meta.json: {meta_data.get('name', '未命名')}")
+                with span('json.parse', file='meta.json'):
+                    meta_data = storage.load_json(md5_hash, 'meta.json')
+                debug("读取到 meta.json: %s", meta_data.get('name', '未命名'))
             except Exception as e:
                 print(f"[WARN] 无法读取 meta.json: {e}")
         
         # 检查是否有动画文件（优先处理动画）
-        action_files = list(folder_path.glob("action*.json"))
+        action_files = storage.list_files(md5_hash, "action*.json")
         if action_files:
             # 这是动画文件夹
             try:
                 # 优先使用 meta.json 中的名称
                 action_name = meta_data.get('name')
                 
-                # 如果没有 meta，尝试读取 action.json
+                # 如果没有 meta，尝试读取 action.json（只索引 animations 的键，不解析时间轴）
                 if not action_name:
                     for action_file in action_files:
                         try:
-                            with open(action_file, 'r', encoding='utf-8') as f:
-                                action_data = json.load(f)
-                                anims = action_data.get('animations', {})
+                            with span('json.parse', file=action_file), \
+                                    storage.open_document(md5_hash, action_file) as action_doc:
+                                anims = action_doc.child('animations') or {}
                                 if anims:
-                                    action_name = list(anims.keys())[0]
-                                break
+                                    action_name = next(iter(anims))
+                            break
                         except:
                             pass
                 
@@ -81,19 +90,16 @@ class AssetProcessor:
                 return {'status': 'error', 'reason': str(e), 'md5': md5_hash}
         
         # 检查是否有 dress.json（服装）
-        dress_path = folder_path / "dress.json"
-        if not dress_path.exists():
+        if not storage.exists(md5_hash, "dress.json"):
             return {'status': 'skipped', 'reason': '无dress.json或action.json', 'md5': md5_hash}
         
         try:
-            # 读取 dress.json
-            with open(dress_path, 'r', encoding='utf-8') as f:
-                dress_data = json.load(f)
-            
-            clothing_type = dress_data.get('type', 'Unknown')
+            # 读取 dress.json（惰性文档，只解析 type，跳过附件数据）
+            with span('json.parse', file='dress.json'), storage.open_document(md5_hash, "dress.json") as dress_doc:
+                clothing_type = dress_doc.get('type', 'Unknown')
             
             # 检查是否有动画（同时有dress和action的情况）
-            has_animation = any(folder_path.glob("action*"))
+            has_animation = bool(storage.list_files(md5_hash, "action*"))
             
             # 添加到数据库（使用 meta.json 中的打标信息）
             result = self.db.add_clothing_item(
@@ -119,92 +125,122 @@ class AssetProcessor:
         except Exception as e:
             return {'status': 'error', 'reason': str(e), 'md5': md5_hash}
     
-    def scan_and_import(self):
-        """扫描并导入所有素材"""
+    def iter_folders(self):
+        """遍历源目录（或素材包）中的 MD5 文件夹（惰性，不预先列出全部）"""
+        for md5_hash in self.storage.iter_items():
+            yield self.storage.item_path(md5_hash)
+
+    def iter_import(self, log_path=None):
+        """流式导入：逐个文件夹处理并立即产出结果
+
+        计数保存在 self.import_counts（固定大小），log_path 不为空时每条结果追加写入 JSONL 日志，
+        内存占用与素材库大小无关。
+        """
+        self.import_counts = {'total': 0, 'success': 0, 'skipped': 0, 'failed': 0}
+        counts = self.import_counts
+        
+        log_file = None
+        if log_path:
+            Path(log_path).parent.mkdir(parents=True, exist_ok=True)
+            log_file = open(log_path, 'a', encoding='utf-8')
+        
+        try:
+            for folder in self.iter_folders():
+                counts['total'] += 1
+                
+                # 处理文件夹
+                result = self.process_folder(folder)
+                
+                if result['status'] == 'success':
+                    counts['success'] += 1
+                elif result['status'] == 'skipped':
+                    counts['skipped'] += 1
+                else:
+                    counts['failed'] += 1
+                
+                if log_file:
+                    log_file.write(json.dumps(result, ensure_ascii=False) + "\n")
+                
+                # 更新进度
+                if self.progress_callback:
+                    self.progress_callback(counts['total'], counts)
+                
+                yield result
+        finally:
+            if log_file:
+                log_file.close()
+
+    @traced('import.scan_and_import')
+    def scan_and_import(self, log_path=None, keep_details=False, analyze_images=False,
+                        thumbnail_dir=None, workers=None):
+        """扫描并导入所有素材
+
+        默认只返回计数；keep_details 为 True 时在内存中保留每个文件夹的结果（旧行为），
+        大素材库建议改用 log_path 写入 JSONL 日志。
+        analyze_images 为 True 时，新导入的文件夹同时交给进程池分析图片（见 image_analyzer），
+        thumbnail_dir 不为空时为服装生成缩略图，结果中的 'images' 为分析汇总。
+        """
         if not self.source_dir.exists():
             return {'error': f'源目录不存在: {self.source_dir}'}
         
-        results = {
-            'total': 0,
-            'success': 0,
-            'skipped': 0,
-            'failed': 0,
-            'details': []
-        }
-        
-        # 遍历所有文件夹
-        for folder in self.source_dir.iterdir():
-            if not folder.is_dir():
-                continue
-            if len(folder.name) != 32:  # MD5长度
-                continue
-            
-            results['total'] += 1
-            
-            # 处理文件夹
-            result = self.process_folder(folder)
-            results['details'].append(result)
-            
-            if result['status'] == 'success':
-                results['success'] += 1
-            elif result['status'] == 'skipped':
-                results['skipped'] += 1
-            else:
-                results['failed'] += 1
-            
-            # 更新进度
-            if self.progress_callback:
-                self.progress_callback(results['total'], results)
+        details = [] if keep_details else None
         
+        def imported():
+            for result in self.iter_import(log_path):
+                if details is not None:
+                    details.append(result)
+                if result['status'] == 'success':
+                    yield (result['md5'], self.storage.item_path(result['md5']),
+                           result.get('type') != 'Action')
+        
+        if analyze_images:
+            analyzer = ImageAnalyzer(self.db, thumbnail_dir, workers)
+            self.last_image_summary = analyzer.run(imported())
+        else:
+            for _ in imported():
+                pass
+        
+        results = dict(self.import_counts)
+        if details is not None:
+            results['details'] = details
+        if log_path:
+            results['log_path'] = str(log_path)
+        if analyze_images:
+            results['images'] = self.last_image_summary
         return results
     
-    def separate_animations(self, target_dir):
-        """分离动画到指定目录"""
-        target_dir = Path(target_dir)
-        target_dir.mkdir(parents=True, exist_ok=True)
-        
+    def separate_animations(self, target_dir, strategy='move', workers=4):
+        """分离动画到指定目录
+
+        同盘直接 rename，跨盘并行复制+校验；中断后再次执行会根据日志续传，
+        完成后在一个事务中更新数据库中的 source_path。返回搬迁数量。
+        """
         animations = self.db.get_all_animations()
-        moved_count = 0
+        # 素材包只读，其中的动画不搬迁
+        items = [(anim['md5_hash'], anim['source_path']) for anim in animations
+                 if anim['source_path'] and Path(anim['source_path']).parent.suffix.lower() != PACK_SUFFIX]
         
-        for anim in animations:
-            md5_hash = anim['md5_hash']
-            source_folder = Path(anim['source_path'])
-            
-            if not source_folder.exists():
-                continue
-            
-            target_folder = target_dir / md5_hash
-            
-            # 如果目标已存在，先删除
-            if target_folder.exists():
-                shutil.rmtree(target_folder)
-            
-            # 移动文件夹
-            shutil.move(str(source_folder), str(target_folder))
-            moved_count += 1
+        relocator = AssetRelocator(self.db, workers=workers)
+        report = relocator.relocate(items, target_dir, strategy=strategy, table='animations')
+        self.last_relocation_report = report
         
-        return moved_count
+        for md5_hash, error in report['failed']:
+            print(f"[WARN] 分离动画失败 {md5_hash}: {error}")
+        
+        return report['done']
     
     def generate_thumbnail(self, folder_path, output_path, size=(128, 128)):
         """生成缩略图"""
-        folder_path = Path(folder_path)
+        storage, md5_hash = storage_for(folder_path)
         output_path = Path(output_path)
         
         # 查找第一个 PNG 图片
-        png_files = list(folder_path.glob("*.png"))
+        png_files = storage.list_files(md5_hash, "*.png")
         if not png_files:
             return None
         
         try:
-            # 打开并缩放图片
-            img = Image.open(png_files[0])
-            img.thumbnail(size, Image.Resampling.LANCZOS)
-            
-            # 保存
-            output_path.parent.mkdir(parents=True, exist_ok=True)
-            img.save(output_path)
-            
-            return str(output_path)
+            return make_thumbnail(storage, md5_hash, png_files[0], output_path, size)
         except Exception as e:
             print(f"生成缩略图失败: {e}")
             return None
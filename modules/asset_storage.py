@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+素材存储模块 - 统一访问散文件目录和打包素材库（.sdmpack，mmap 随机读取）
+
+素材位置统一表示为 <存储路径>/<md5>：
+    D:/WEB5/数据v1.0版本/<md5>           目录存储
+    D:/WEB5/数据v1.0版本.sdmpack/<md5>   打包存储
+数据库中的 source_path 保持这种格式，导入、合成、预览通过 storage_for() 取得对应的存储。
+
+打包文件格式（小端）：
+    b'SDMPACK1' | 文件数据... | 索引 JSON | 索引偏移 u64 | 索引长度 u64 | b'SDMPACK1'
+    索引: {"version": 1, "items": {md5: {文件名: [偏移, 大小, mtime_ns]}}}
+"""
+
+import fnmatch
+import io
+import json
+import mmap
+import os
+import shutil
+import struct
+import threading
+from pathlib import Path
+
+from lazy_json import LazyJsonDocument
+
+PACK_SUFFIX = ".sdmpack"
+PACK_MAGIC = b"SDMPACK1"
+PACK_VERSION = 1
+_FOOTER = struct.Struct('<QQ')
+
+
+def is_md5_name(name):
+    return len(name) == 32
+
+
+class DirectoryStorage:
+    """散文件目录：<root>/<md5>/<文件名>"""
+
+    writable = True
+
+    def __init__(self, root):
+        self.root = Path(root)
+
+    def item_path(self, md5_hash):
+        return self.root / md5_hash
+
+    def iter_items(self):
+        """遍历 MD5 文件夹名（惰性）"""
+        with os.scandir(self.root) as entries:
+            for entry in entries:
+                if is_md5_name(entry.name) and entry.is_dir():
+                    yield entry.name
+
+    def exists(self, md5_hash, name=None):
+        path = self.root / md5_hash
+        return (path / name).is_file() if name else path.is_dir()
+
+    def list_files(self, md5_hash, pattern='*'):
+        """按文件名排序返回匹配 pattern 的文件名"""
+        folder = self.root / md5_hash
+        if not folder.is_dir():
+            return []
+        return sorted(p.name for p in folder.glob(pattern) if p.is_file())
+
+    def stat(self, md5_hash, name):
+        """(大小, mtime_ns)，文件不存在返回 None"""
+        try:
+            st = (self.root / md5_hash / name).stat()
+        except OSError:
+            return None
+        return st.st_size, st.st_mtime_ns
+
+    def open(self, md5_hash, name):
+        return open(self.root / md5_hash / name, 'rb')
+
+    def read_bytes(self, md5_hash, name):
+        return (self.root / md5_hash / name).read_bytes()
+
+    def load_json(self, md5_hash, name):
+        with open(self.root / md5_hash / name, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def open_document(self, md5_hash, name):
+        """mmap 打开为惰性 JSON 文档（需要 close 或 with）"""
+        return LazyJsonDocument.open(self.root / md5_hash / name)
+
+    def copy_to(self, md5_hash, name, dest):
+        # 目标可能是合成缓存的硬链接，先删除再写入以免改动缓存内容
+        Path(dest).unlink(missing_ok=True)
+        shutil.copy2(self.root / md5_hash / name, dest)
+
+
+class PackStorage:
+    """打包素材库：一个文件对应一个数据版本，mmap 后按索引随机读取"""
+
+    writable = False
+
+    def __init__(self, pack_path):
+        self.root = Path(pack_path)
+        self._file = open(self.root, 'rb')
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self._file.close()
+            raise ValueError(f"不是有效的素材包: {self.root}")
+        self.index = self._read_index()
+
+    def _read_index(self):
+        data = self._map
+        tail = len(PACK_MAGIC) + _FOOTER.size
+        if len(data) < len(PACK_MAGIC) + tail or data[:len(PACK_MAGIC)] != PACK_MAGIC \
+                or data[-len(PACK_MAGIC):] != PACK_MAGIC:
+            raise ValueError(f"不是有效的素材包: {self.root}")
+        offset, length = _FOOTER.unpack(data[-tail:-len(PACK_MAGIC)])
+        index = json.loads(data[offset:offset + length].decode('utf-8'))
+        if index.get('version') != PACK_VERSION:
+            raise ValueError(f"不支持的素材包版本: {index.get('version')}")
+        return index['items']
+
+    def close(self):
+        self._map.close()
+        self._file.close()
+
+    def item_path(self, md5_hash):
+        return self.root / md5_hash
+
+    def iter_items(self):
+        return iter(self.index)
+
+    def exists(self, md5_hash, name=None):
+        files = self.index.get(md5_hash)
+        if files is None:
+            return False
+        return name in files if name else True
+
+    def list_files(self, md5_hash, pattern='*'):
+        files = self.index.get(md5_hash, {})
+        return sorted(name for name in files if fnmatch.fnmatchcase(name, pattern))
+
+    def stat(self, md5_hash, name):
+        entry = self.index.get(md5_hash, {}).get(name)
+        if entry is None:
+            return None
+        return entry[1], entry[2]
+
+    def _entry(self, md5_hash, name):
+        entry = self.index.get(md5_hash, {}).get(name)
+        if entry is None:
+            raise FileNotFoundError(f"{self.root / md5_hash / name}")
+        return entry
+
+    def read_bytes(self, md5_hash, name):
+        offset, size, _ = self._entry(md5_hash, name)
+        return self._map[offset:offset + size]
+
+    def open(self, md5_hash, name):
+        return io.BytesIO(self.read_bytes(md5_hash, name))
+
+    def load_json(self, md5_hash, name):
+        return json.loads(self.read_bytes(md5_hash, name).decode('utf-8'))
+
+    def open_document(self, md5_hash, name):
+        return LazyJsonDocument(self.read_bytes(md5_hash, name))
+
+    def copy_to(self, md5_hash, name, dest):
+        offset, size, mtime_ns = self._entry(md5_hash, name)
+        Path(dest).unlink(missing_ok=True)
+        with open(dest, 'wb') as f:
+            f.write(self._map[offset:offset + size])
+        os.utime(dest, ns=(mtime_ns, mtime_ns))
+
+
+def pack_directory(source_dir, pack_path, progress_callback=None):
+    """把目录存储打包为一个 .sdmpack 文件，返回打包的素材数量"""
+    source = DirectoryStorage(source_dir)
+    pack_path = Path(pack_path)
+    pack_path.parent.mkdir(parents=True, exist_ok=True)
+    temp_path = pack_path.with_name(pack_path.name + ".partial")
+
+    items = {}
+    with open(temp_path, 'wb') as out:
+        out.write(PACK_MAGIC)
+        for md5_hash in sorted(source.iter_items()):
+            files = {}
+            for name in source.list_files(md5_hash):
+                path = source.root / md5_hash / name
+                st = path.stat()
+                offset = out.tell()
+                with open(path, 'rb') as f:
+                    shutil.copyfileobj(f, out)
+                files[name] = [offset, out.tell() - offset, st.st_mtime_ns]
+            items[md5_hash] = files
+            if progress_callback:
+                progress_callback(len(items))
+
+        index = json.dumps({'version': PACK_VERSION, 'items': items},
+                           ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        index_offset = out.tell()
+        out.write(index)
+        out.write(_FOOTER.pack(index_offset, len(index)))
+        out.write(PACK_MAGIC)
+
+    # 关闭已打开的旧包再替换
+    _close_cached(pack_path)
+    os.replace(temp_path, pack_path)
+    return len(items)
+
+
+# ==================== 存储定位 ====================
+
+_storages = {}
+_storages_lock = threading.Lock()
+
+
+def _close_cached(path):
+    with _storages_lock:
+        storage = _storages.pop(str(Path(path)), None)
+    if isinstance(storage, PackStorage):
+        storage.close()
+
+
+def open_storage(path):
+    """打开存储：.sdmpack 文件为打包存储，其他为目录存储（打包存储按路径复用）"""
+    path = Path(path)
+    if path.suffix.lower() != PACK_SUFFIX:
+        return DirectoryStorage(path)
+
+    key = str(path)
+    with _storages_lock:
+        storage = _storages.get(key)
+        if storage is None:
+            storage = _storages[key] = PackStorage(path)
+        return storage
+
+
+def storage_for(item_path):
+    """根据素材位置 <存储路径>/<md5> 返回 (存储, md5)"""
+    item_path = Path(item_path)
+    return open_storage(item_path.parent), item_path.name
+
+
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) == 4 and sys.argv[1] == 'pack':
+        count = pack_directory(sys.argv[2], sys.argv[3])
+        print(f"已打包 {count} 个素材: {sys.argv[3]}")
+    elif len(sys.argv) == 3 and sys.argv[1] == 'list':
+        storage = open_storage(sys.argv[2])
+        for md5_hash in storage.iter_items():
+            print(md5_hash, ' '.join(storage.list_files(md5_hash)))
+    else:
+        print("用法: python asset_storage.py pack <素材目录> <输出.sdmpack>")
+        print("      python asset_storage.py list <素材目录或.sdmpack>")
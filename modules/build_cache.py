@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+合成结果缓存模块 - 相同输入（role.json、服装组合、动画、选项）直接复用上次的输出
+
+缓存键为以下内容的 SHA-256：
+  - role.json 文件内容
+  - 按合并顺序排列的服装 (MD5, 类型, dress.json/PNG 的大小和修改时间)
+  - 动作文件路径和大小、修改时间
+  - 合成选项
+每个条目保存在 cache_dir/<键>/，命中时硬链接（不支持时复制）到输出目录（清单按输出目录名改写），
+总大小超过上限时按最近使用时间淘汰。
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import time
+from pathlib import Path
+
+from asset_storage import storage_for
+from outfit_cache import source_stamp, COMPILED_FORMAT_VERSION
+from instrumentation import span, count
+from build_manifest import MANIFEST_FILE, load_manifest, rename_skeleton, write_manifest
+
+# 合成逻辑变化时递增使旧缓存失效
+BUILD_CACHE_VERSION = 3
+
+ENTRY_FILE = "entry.json"
+# 缓存中统一的骨架 JSON 文件名（恢复时改为 <输出目录名>.json）
+SKELETON_FILE = "skeleton.json"
+
+
+def build_key(role_path, selected_items, action_files, options, role_images=()):
+    """计算合成输入的缓存键，role_images 为角色自带图片的 [(图片名, (大小, 修改时间))]"""
+    digest = hashlib.sha256()
+    digest.update(f"v{BUILD_CACHE_VERSION}.{COMPILED_FORMAT_VERSION}\0".encode())
+
+    with open(role_path, 'rb') as f:
+        digest.update(hashlib.md5(f.read()).digest())
+    digest.update(json.dumps(list(role_images)).encode('utf-8'))
+
+    # 后合并的服装会覆盖同名插槽的附件，保持合并顺序
+    for md5_hash, item_data in selected_items.items():
+        stamp = source_stamp(item_data['path'])
+        digest.update(json.dumps([md5_hash, item_data['type'], stamp]).encode('utf-8'))
+
+    # 动作文件的合并顺序影响冲突处理结果，保持原顺序
+    for action_file in action_files:
+        storage, md5_hash = storage_for(Path(action_file).parent)
+        stat = storage.stat(md5_hash, Path(action_file).name)
+        digest.update(json.dumps([str(action_file), stat]).encode('utf-8'))
+
+    digest.update(json.dumps(options, sort_keys=True, default=str).encode('utf-8'))
+    return digest.hexdigest()
+
+
+def _stamp(path):
+    st = path.stat()
+    return st.st_size, st.st_mtime_ns
+
+
+def _link_or_copy(source, dest):
+    """硬链接，跨设备或不支持时复制"""
+    if dest.exists():
+        dest.unlink()
+    try:
+        os.link(source, dest)
+    except OSError:
+        shutil.copy2(source, dest)
+
+
+class BuildResultCache:
+    def __init__(self, cache_dir="cache/builds", max_bytes=2 * 1024 ** 3):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+
+    def _entry_dir(self, key):
+        return self.cache_dir / key
+
+    def _read_entry(self, key):
+        entry_file = self._entry_dir(key) / ENTRY_FILE
+        try:
+            with open(entry_file, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def restore(self, key, output_dir):
+        """命中时把缓存的输出放到 output_dir，返回当时的合成结果；未命中返回 None"""
+        entry = self._read_entry(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        entry_dir = self._entry_dir(key)
+        # 硬链接的文件可能在输出目录中被原地修改过，大小或修改时间不一致时丢弃该条目
+        for name, stamp in entry['files'].items():
+            try:
+                if list(_stamp(entry_dir / name)) != stamp:
+                    raise OSError(name)
+            except OSError:
+                print(f"[WARN] 合成缓存 {key[:12]} 已损坏，重新合成")
+                self.invalidate(key)
+                self.misses += 1
+                return None
+
+        output_dir = Path(output_dir)
+        output_dir.mkdir(parents=True, exist_ok=True)
+        json_path = output_dir / f"{output_dir.name}.json"
+        with span('build_cache.restore', files=len(entry['files'])):
+            for name in entry['files']:
+                if name == MANIFEST_FILE:
+                    # 清单记录骨架 JSON 的文件名，按本次输出目录改写
+                    write_manifest(output_dir, rename_skeleton(load_manifest(entry_dir / name), json_path.name))
+                    continue
+                dest = json_path if name == SKELETON_FILE else output_dir / name
+                _link_or_copy(entry_dir / name, dest)
+
+        # 更新最近使用时间
+        os.utime(entry_dir / ENTRY_FILE)
+        self.hits += 1
+        count('build_cache.hit')
+
+        result = dict(entry['result'])
+        result['json_path'] = str(json_path)
+        if 'manifest_path' in result:
+            result['manifest_path'] = str(output_dir / MANIFEST_FILE)
+        return result
+
+    def store(self, key, output_dir, result, image_files):
+        """保存一次合成的输出（骨架 JSON + image_files），写入临时目录后整体改名"""
+        output_dir = Path(output_dir)
+        entry_dir = self._entry_dir(key)
+        temp_dir = self.cache_dir / f".{key}.{os.getpid()}.tmp"
+        if temp_dir.exists():
+            shutil.rmtree(temp_dir)
+        temp_dir.mkdir(parents=True)
+
+        files = {}
+        try:
+            _link_or_copy(Path(result['json_path']), temp_dir / SKELETON_FILE)
+            files[SKELETON_FILE] = _stamp(temp_dir / SKELETON_FILE)
+            for name in sorted(set(image_files)):
+                source = output_dir / name
+                if not source.exists():
+                    # 清理未引用数据时删除的图片
+                    continue
+                _link_or_copy(source, temp_dir / name)
+                files[name] = _stamp(temp_dir / name)
+
+            entry_result = {k: v for k, v in result.items() if k != 'json_path'}
+            with open(temp_dir / ENTRY_FILE, 'w', encoding='utf-8') as f:
+                json.dump({'files': files, 'size': sum(size for size, _ in files.values()), 'stored_at': time.time(),
+                           'result': entry_result}, f, ensure_ascii=False, default=str)
+
+            if entry_dir.exists():
+                shutil.rmtree(entry_dir)
+            temp_dir.rename(entry_dir)
+        except OSError as e:
+            print(f"[WARN] 无法写入合成缓存: {e}")
+            shutil.rmtree(temp_dir, ignore_errors=True)
+            return False
+
+        self.evict()
+        return True
+
+    def entries(self):
+        """[(最近使用时间, 大小, 键)]"""
+        entries = []
+        for entry_dir in self.cache_dir.iterdir():
+            if entry_dir.name.startswith('.') or not entry_dir.is_dir():
+                continue
+            entry = self._read_entry(entry_dir.name)
+            if entry is None:
+                continue
+            entries.append(((entry_dir / ENTRY_FILE).stat().st_mtime, entry['size'], entry_dir.name))
+        return entries
+
+    def evict(self):
+        """按最近使用时间淘汰，直到总大小不超过 max_bytes，返回淘汰数量"""
+        entries = sorted(self.entries())
+        total = sum(size for _, size, _ in entries)
+        evicted = 0
+        for _, size, key in entries:
+            if total <= self.max_bytes:
+                break
+            self.invalidate(key)
+            total -= size
+            evicted += 1
+        return evicted
+
+    def invalidate(self, key):
+        shutil.rmtree(self._entry_dir(key), ignore_errors=True)
+
+    def clear(self):
+        for _, _, key in self.entries():
+            self.invalidate(key)
+
+    def stats(self):
+        entries = self.entries()
+        return {'entries': len(entries), 'bytes': sum(size for _, size, _ in entries),
+                'max_bytes': self.max_bytes, 'hits': self.hits, 'misses': self.misses}
+
+
+if __name__ == "__main__":
+    cache = BuildResultCache()
+    print(f"合成缓存: {cache.cache_dir.absolute()} {cache.stats()}")
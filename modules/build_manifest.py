@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+合成清单模块 - 骨架内容哈希与输出文件清单
+
+skeleton.hash 为骨架 JSON（hash 字段为空时）的 SHA-1，按 Spine 的写法做 base64 编码去掉填充。
+合成输出目录中的 manifest.json 列出每个输出文件的大小和 SHA-256，
+下游增量上传时比较新旧清单即可跳过未变化的文件：
+    {"version": 1, "skeleton": "角色名.json", "hash": skeleton.hash,
+     "files": {文件名: {"size": 字节数, "sha256": 十六进制}}}
+"""
+
+import base64
+import hashlib
+import json
+import re
+from pathlib import Path
+
+MANIFEST_FILE = "manifest.json"
+MANIFEST_VERSION = 1
+
+# 骨架 JSON 中 skeleton 总在最前面，第一个 hash 字段即 skeleton.hash（缩进和紧凑两种格式）
+_EMPTY_HASH = re.compile(r'"hash":( ?)""')
+
+
+def with_content_hash(text):
+    """把序列化文本中空的 skeleton.hash 替换为内容哈希，返回 (新文本, 哈希)"""
+    digest = base64.b64encode(hashlib.sha1(text.encode('utf-8')).digest()).decode('ascii').rstrip('=')
+    return _EMPTY_HASH.sub(lambda m: f'"hash":{m.group(1)}"{digest}"', text, count=1), digest
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def build_manifest(output_dir, json_name, skeleton_hash, file_names, known=None):
+    """为 output_dir 中的骨架 JSON 和 file_names（不存在的跳过）生成清单，文件按名称排序
+
+    known 为 {文件名: ((大小, 修改时间), sha256)}，大小和修改时间未变的文件不重新计算哈希，并原地更新
+    """
+    output_dir = Path(output_dir)
+    files = {}
+    for name in sorted(set(file_names) | {json_name}):
+        path = output_dir / name
+        if not path.is_file():
+            continue
+        st = path.stat()
+        stat = (st.st_size, st.st_mtime_ns)
+        if known is not None and name in known and known[name][0] == stat:
+            sha256 = known[name][1]
+        else:
+            sha256 = file_sha256(path)
+            if known is not None:
+                known[name] = (stat, sha256)
+        files[name] = {'size': st.st_size, 'sha256': sha256}
+    if known is not None:
+        for name in [n for n in known if n not in files]:
+            del known[name]
+    return {'version': MANIFEST_VERSION, 'skeleton': json_name, 'hash': skeleton_hash, 'files': files}
+
+
+def rename_skeleton(manifest, json_name):
+    """骨架 JSON 改名后（如从合成缓存恢复到其他目录）更新清单"""
+    files = dict(manifest['files'])
+    files[json_name] = files.pop(manifest['skeleton'])
+    return dict(manifest, skeleton=json_name, files=dict(sorted(files.items())))
+
+
+def write_manifest(output_dir, manifest):
+    path = Path(output_dir) / MANIFEST_FILE
+    # 输出可能是合成缓存的硬链接，先删除再写入
+    if path.exists():
+        path.unlink()
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, ensure_ascii=False)
+    return path
+
+
+def load_manifest(path):
+    path = Path(path)
+    if path.is_dir():
+        path = path / MANIFEST_FILE
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def diff_manifests(old, new):
+    """比较两个清单，返回 (新增或变化的文件, 删除的文件)"""
+    old_files = old.get('files', {}) if old else {}
+    new_files = new.get('files', {})
+    changed = [name for name, info in new_files.items() if old_files.get(name) != info]
+    removed = [name for name in old_files if name not in new_files]
+    return changed, removed
+
+
+def verify(output_dir):
+    """检查输出目录与清单是否一致，返回不一致的文件名列表"""
+    output_dir = Path(output_dir)
+    manifest = load_manifest(output_dir)
+    mismatched = []
+    for name, info in manifest['files'].items():
+        path = output_dir / name
+        if not path.is_file() or path.stat().st_size != info['size'] or file_sha256(path) != info['sha256']:
+            mismatched.append(name)
+    return mismatched
+
+
+if __name__ == "__main__":
+    import argparse
+    import sys
+
+    parser = argparse.ArgumentParser(description="合成清单")
+    sub = parser.add_subparsers(dest='command', required=True)
+    verify_parser = sub.add_parser('verify', help="检查输出目录与清单是否一致")
+    verify_parser.add_argument('output_dir')
+    diff_parser = sub.add_parser('diff', help="列出相对旧清单需要上传/删除的文件")
+    diff_parser.add_argument('old', help="旧清单或输出目录")
+    diff_parser.add_argument('new', help="新清单或输出目录")
+    args = parser.parse_args()
+
+    if args.command == 'verify':
+        mismatched = verify(args.output_dir)
+        for name in mismatched:
+            print(f"[FAIL] {name}")
+        if not mismatched:
+            print("[OK] 输出与清单一致")
+        sys.exit(1 if mismatched else 0)
+    else:
+        changed, removed = diff_manifests(load_manifest(args.old), load_manifest(args.new))
+        for name in changed:
+            print(f"+ {name}")
+        for name in removed:
+            print(f"- {name}")
+        print(f"变化 {len(changed)} 个, 删除 {len(removed)} 个")
@@ -0,0 +1,392 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+素材目录服务 - 本机 HTTP/JSON 接口，目录常驻内存，供流水线工具高频查询和合成
+
+    python modules/catalog_service.py --db database/clothing.db --port 8765
+
+接口（均返回 JSON）:
+    GET  /health
+    GET  /stats                               各类型数量、已打标/未打标、动画数
+    GET  /items?type=Hair&labeled=1&q=名称&offset=0&limit=100
+    GET  /items/<md5>
+    GET  /animations
+    GET  /animations/<md5>
+    POST /items/<md5>/label                   {"custom_name", "description", "version"}，版本冲突返回 409
+    POST /animations/<md5>/label              {"action_name", "description", "version"}
+    POST /build                               {"role", "items": [md5...], "output", "animations": [...],
+                                               "prune_unused", "quantize", "force"}
+
+查询直接读内存索引；写入经 ClothingDatabase（线程池）后更新索引。
+其他程序（如 main.py）直接写数据库时，通过 PRAGMA data_version 检测并在后台重新加载；
+本服务自己的写入只增量更新索引（写入后记录 data_version，不触发重新加载）。
+"""
+
+import asyncio
+import json
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from urllib.parse import urlsplit, parse_qs
+
+from database import ClothingDatabase, VersionConflictError
+from instrumentation import span, count, debug
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+# 检查外部写入的间隔（秒）
+POLL_INTERVAL = 1.0
+# 请求体上限
+MAX_BODY_BYTES = 1024 * 1024
+
+_STATUS_TEXT = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+                409: 'Conflict', 413: 'Payload Too Large', 500: 'Internal Server Error'}
+
+
+class HttpError(Exception):
+    def __init__(self, status, message, **extra):
+        """extra 为附加到错误响应中的字段"""
+        super().__init__(message)
+        self.status = status
+        self.extra = extra
+
+
+def _label_sort_key(item):
+    # 与 ClothingDatabase.get_items_by_type 的排序一致
+    return (item['custom_name'] is None, item['custom_name'] or '', item['md5_hash'])
+
+
+class CatalogIndex:
+    """目录的内存索引：按 MD5 和类型查找服装，按 MD5 查找动画"""
+
+    def __init__(self, items, animations):
+        self.items = {item['md5_hash']: item for item in items}
+        self.animations = {anim['md5_hash']: anim for anim in animations}
+        self.by_type = {}
+        for item in self.items.values():
+            self.by_type.setdefault(item['clothing_type'], []).append(item['md5_hash'])
+        for md5_list in self.by_type.values():
+            md5_list.sort(key=lambda md5_hash: _label_sort_key(self.items[md5_hash]))
+        self._dirty_types = set()
+        self._statistics = None
+
+    @classmethod
+    def load(cls, db):
+        with span('service.load'):
+            return cls(db.get_all_items(), db.get_all_animations())
+
+    def put_item(self, item):
+        old = self.items.get(item['md5_hash'])
+        if old is not None and old['clothing_type'] != item['clothing_type']:
+            self.by_type[old['clothing_type']].remove(item['md5_hash'])
+        if old is None or old['clothing_type'] != item['clothing_type']:
+            self.by_type.setdefault(item['clothing_type'], []).append(item['md5_hash'])
+        self.items[item['md5_hash']] = item
+        # 标签变化后排序延迟到下次按类型查询
+        self._dirty_types.add(item['clothing_type'])
+        self._statistics = None
+
+    def put_animation(self, anim):
+        self.animations[anim['md5_hash']] = anim
+        self._statistics = None
+
+    def _type_md5s(self, clothing_type):
+        md5_list = self.by_type.get(clothing_type, [])
+        if clothing_type in self._dirty_types:
+            md5_list.sort(key=lambda md5_hash: _label_sort_key(self.items[md5_hash]))
+            self._dirty_types.discard(clothing_type)
+        return md5_list
+
+    def items_of_type(self, clothing_type):
+        return [self.items[md5_hash] for md5_hash in self._type_md5s(clothing_type)]
+
+    def query(self, clothing_type=None, labeled=None, text=None, offset=0, limit=100):
+        """返回 (总数, 当前页)；没有过滤条件时只取出当前页"""
+        types = [clothing_type] if clothing_type else sorted(self.by_type)
+        if labeled is None and not text:
+            if len(types) == 1:
+                md5_list = self._type_md5s(types[0])
+            else:
+                md5_list = [md5_hash for t in types for md5_hash in self._type_md5s(t)]
+            return len(md5_list), [self.items[md5_hash] for md5_hash in md5_list[offset:offset + limit]]
+
+        items = [item for t in types for item in self.items_of_type(t)]
+        if labeled is not None:
+            items = [item for item in items if (item['custom_name'] is not None) == labeled]
+        if text:
+            text = text.lower()
+            items = [item for item in items
+                     if text in (item['custom_name'] or '').lower() or text in (item['description'] or '').lower()]
+        return len(items), items[offset:offset + limit]
+
+    def statistics(self):
+        """与 ClothingDatabase.get_statistics 格式相同（缓存到下次写入）"""
+        if self._statistics is not None:
+            return self._statistics
+        type_stats = []
+        for clothing_type in sorted(self.by_type):
+            md5_list = self.by_type[clothing_type]
+            if not md5_list:
+                continue
+            labeled = sum(1 for md5_hash in md5_list if self.items[md5_hash]['custom_name'] is not None)
+            type_stats.append({'clothing_type': clothing_type, 'count': len(md5_list),
+                               'labeled_count': labeled, 'unlabeled_count': len(md5_list) - labeled})
+        self._statistics = {'total_items': len(self.items), 'total_animations': len(self.animations),
+                            'type_stats': type_stats}
+        return self._statistics
+
+
+class CatalogService:
+    def __init__(self, db, builder=None, poll_interval=POLL_INTERVAL):
+        """builder 为 SpineBuilder，为 None 时 /build 不可用"""
+        self.db = db
+        self.builder = builder
+        self.poll_interval = poll_interval
+        self.index = CatalogIndex.load(db)
+        # 数据库写入和合成在线程池中执行，不阻塞查询
+        self.executor = ThreadPoolExecutor(max_workers=4)
+        self._build_lock = None
+        self._version_conn = None
+        self._data_version = None
+        # 写入与版本检查互斥，保证记录的 data_version 紧跟在本服务的写入之后
+        self._version_lock = threading.Lock()
+        self.requests = 0
+
+    # ==================== 外部写入检测 ====================
+
+    def _read_data_version(self):
+        if self._version_conn is None:
+            self._version_conn = sqlite3.connect(str(self.db.db_path), check_same_thread=False)
+        return self._version_conn.execute('PRAGMA data_version').fetchone()[0]
+
+    def _external_change(self):
+        """上次记录后数据库是否被其他连接修改（本服务的写入已在 _write 中记录）"""
+        with self._version_lock:
+            version = self._read_data_version()
+            changed = version != self._data_version
+            self._data_version = version
+            return changed
+
+    async def _watch(self):
+        loop = asyncio.get_running_loop()
+        self._data_version = await loop.run_in_executor(self.executor, self._read_data_version)
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            try:
+                if not await loop.run_in_executor(self.executor, self._external_change):
+                    continue
+                # 整体重新加载后替换，查询始终看到完整的索引
+                self.index = await loop.run_in_executor(self.executor, CatalogIndex.load, self.db)
+                debug("目录已重新加载: %d 个素材", len(self.index.items))
+            except sqlite3.Error as e:
+                print(f"[WARN] 检查数据库变化失败: {e}")
+
+    # ==================== 路由 ====================
+
+    async def handle(self, method, path, query, body):
+        parts = [p for p in path.split('/') if p]
+        if method == 'GET':
+            return self.handle_get(parts, query)
+        if method == 'POST':
+            payload = json.loads(body.decode('utf-8')) if body else {}
+            if not isinstance(payload, dict):
+                raise HttpError(400, "请求体必须是 JSON 对象")
+            return await self.handle_post(parts, payload)
+        raise HttpError(405, f"不支持的方法: {method}")
+
+    def handle_get(self, parts, query):
+        index = self.index
+        if parts == ['health']:
+            return {'status': 'ok', 'items': len(index.items), 'animations': len(index.animations)}
+        if parts == ['stats']:
+            return index.statistics()
+        if parts == ['items']:
+            labeled = query.get('labeled')
+            total, items = index.query(query.get('type'), None if labeled is None else labeled == '1',
+                                       query.get('q'), int(query.get('offset', 0)), int(query.get('limit', 100)))
+            return {'total': total, 'items': items}
+        if len(parts) == 2 and parts[0] == 'items':
+            item = index.items.get(parts[1])
+            if item is None:
+                raise HttpError(404, f"没有该素材: {parts[1]}")
+            return item
+        if parts == ['animations']:
+            return {'total': len(index.animations), 'animations': list(index.animations.values())}
+        if len(parts) == 2 and parts[0] == 'animations':
+            anim = index.animations.get(parts[1])
+            if anim is None:
+                raise HttpError(404, f"没有该动画: {parts[1]}")
+            return anim
+        raise HttpError(404, f"未知路径: /{'/'.join(parts)}")
+
+    async def handle_post(self, parts, payload):
+        loop = asyncio.get_running_loop()
+        if len(parts) == 3 and parts[0] == 'items' and parts[2] == 'label':
+            md5_hash = parts[1]
+
+            def write():
+                updated = self.db.update_clothing_label(md5_hash, payload.get('custom_name'),
+                                                        payload.get('description'),
+                                                        expected_version=payload.get('version'))
+                return self.db.get_item_by_md5(md5_hash) if updated else None
+            item = await self._write(loop, write)
+            if item is None:
+                raise HttpError(404, f"没有该素材: {md5_hash}")
+            self.index.put_item(item)
+            return item
+
+        if len(parts) == 3 and parts[0] == 'animations' and parts[2] == 'label':
+            md5_hash = parts[1]
+
+            def write():
+                updated = self.db.update_animation_label(md5_hash, payload.get('action_name'),
+                                                         payload.get('description'),
+                                                         expected_version=payload.get('version'))
+                if not updated:
+                    return None
+                return self.db.get_animation_by_md5(md5_hash)
+            anim = await self._write(loop, write)
+            if anim is None:
+                raise HttpError(404, f"没有该动画: {md5_hash}")
+            self.index.put_animation(anim)
+            return anim
+
+        if parts == ['build']:
+            return await self.build(loop, payload)
+        raise HttpError(404, f"未知路径: /{'/'.join(parts)}")
+
+    def _tracked_write(self, work):
+        """执行本服务的写入（调用方随后增量更新索引），记录写入后的 data_version 以免 _watch 重新加载"""
+        with self._version_lock:
+            tracking = self._data_version is not None
+            # 写入前已有未检测到的外部修改时不更新记录，仍由 _watch 重新加载
+            if tracking and self._read_data_version() != self._data_version:
+                tracking = False
+            try:
+                return work()
+            finally:
+                if tracking:
+                    self._data_version = self._read_data_version()
+
+    async def _write(self, loop, work):
+        try:
+            return await loop.run_in_executor(self.executor, self._tracked_write, work)
+        except VersionConflictError as e:
+            raise HttpError(409, str(e), current=e.current)
+
+    async def build(self, loop, payload):
+        if self.builder is None:
+            raise HttpError(404, "服务未启用合成")
+        for field in ('role', 'items', 'output'):
+            if not payload.get(field):
+                raise HttpError(400, f"缺少字段: {field}")
+
+        selected_items = {}
+        for md5_hash in payload['items']:
+            item = self.index.items.get(md5_hash)
+            if item is None:
+                raise HttpError(404, f"没有该素材: {md5_hash}")
+            selected_items[md5_hash] = {'type': item['clothing_type'], 'path': item['source_path']}
+        animations = payload.get('animations') or []
+
+        def run():
+            return self.builder.build_character(
+                payload['role'], selected_items, Path(payload['output']), bool(animations),
+                animation_paths=animations,
+                prune_unused=bool(payload.get('prune_unused')),
+                quantize=payload.get('quantize'),
+                force=bool(payload.get('force'))
+            )
+        # SpineBuilder 的动作缓存不是线程安全的，合成逐个执行
+        async with self._build_lock:
+            return await loop.run_in_executor(self.executor, run)
+
+    # ==================== HTTP ====================
+
+    async def serve_connection(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+
+                keep_alive = headers.get('connection', '').lower() != 'close'
+                try:
+                    method, target, _ = request_line.decode('latin-1').split(' ', 2)
+                    length = int(headers.get('content-length', 0))
+                    if length > MAX_BODY_BYTES:
+                        raise HttpError(413, "请求体过大")
+                    body = await reader.readexactly(length) if length else b''
+                    url = urlsplit(target)
+                    query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+                    status, result = 200, await self.handle(method, url.path, query, body)
+                except HttpError as e:
+                    status, result = e.status, dict(e.extra, error=str(e))
+                    keep_alive = keep_alive and e.status != 413
+                except (ValueError, UnicodeDecodeError) as e:
+                    status, result = 400, {'error': str(e)}
+                except Exception as e:
+                    print(f"[WARN] 请求处理失败 {request_line!r}: {e}")
+                    status, result = 500, {'error': str(e)}
+
+                self.requests += 1
+                count('service.request')
+                payload = json.dumps(result, ensure_ascii=False, default=str).encode('utf-8')
+                writer.write(
+                    f"HTTP/1.1 {status} {_STATUS_TEXT.get(status, '')}\r\n"
+                    f"Content-Type: application/json; charset=utf-8\r\n"
+                    f"Content-Length: {len(payload)}\r\n"
+                    f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode('latin-1') + payload
+                )
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host=DEFAULT_HOST, port=DEFAULT_PORT, ready=None):
+        """运行服务直到被取消；ready 为可选回调，监听开始后以实际端口调用"""
+        self._build_lock = asyncio.Lock()
+        server = await asyncio.start_server(self.serve_connection, host, port)
+        watcher = asyncio.create_task(self._watch())
+        actual_port = server.sockets[0].getsockname()[1]
+        print(f"目录服务已启动: http://{host}:{actual_port} ({len(self.index.items)} 个素材)")
+        if ready:
+            ready(actual_port)
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            watcher.cancel()
+            self.executor.shutdown(wait=False)
+
+
+if __name__ == "__main__":
+    import argparse
+    from spine_builder import SpineBuilder
+    from outfit_cache import CompiledOutfitCache
+    from build_cache import BuildResultCache
+
+    parser = argparse.ArgumentParser(description="素材目录服务")
+    parser.add_argument('--db', default="database/clothing.db")
+    parser.add_argument('--host', default=DEFAULT_HOST)
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--no-build', action='store_true', help="不提供 /build 接口")
+    args = parser.parse_args()
+
+    db = ClothingDatabase(args.db)
+    builder = None if args.no_build else SpineBuilder(db, CompiledOutfitCache(), BuildResultCache())
+    try:
+        asyncio.run(CatalogService(db, builder).serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+目录快照模块 - 把数据库导出为紧凑的列式快照文件，在其他机器上流式导入
+
+文件格式：
+    b'SDMSNAP1' | 帧... | 结束帧
+    帧: 元数据长度 u32 | 数据长度 u32 | 元数据 JSON | 数据
+    首帧元数据: {"version": 1, "created_at": ..., "tables": {表名: 行数}}
+    数据块帧:   {"table": 表名, "columns": [列名...], "rows": 行数, "sizes": [每列压缩后字节数...]}
+                数据为各列依次拼接，每列是 zlib 压缩的 JSON 数组（同一列的值相邻，压缩率高）
+    结束帧:     {"end": true}
+读取时一次只解压一个数据块（BLOCK_ROWS 行），内存占用与快照大小无关。
+"""
+
+import json
+import struct
+import time
+import zlib
+
+SNAPSHOT_MAGIC = b"SDMSNAP1"
+SNAPSHOT_VERSION = 1
+SNAPSHOT_SUFFIX = ".sdmsnap"
+# 每个数据块的行数
+BLOCK_ROWS = 8192
+
+_FRAME = struct.Struct('<II')
+
+# 快照包含的表（按导入顺序）；自增 id 不导出，导入时重新分配
+SNAPSHOT_TABLES = ('clothing_items', 'animations', 'import_history', 'image_metadata', 'outfit_index')
+
+
+class SnapshotError(ValueError):
+    """快照文件格式错误或版本不支持"""
+
+
+def _table_columns(cursor, table):
+    cursor.execute(f'PRAGMA table_info({table})')
+    return [row[1] for row in cursor.fetchall() if row[1] != 'id']
+
+
+def _write_frame(out, meta, payload=b''):
+    meta_bytes = json.dumps(meta, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    out.write(_FRAME.pack(len(meta_bytes), len(payload)))
+    out.write(meta_bytes)
+    out.write(payload)
+
+
+def _read_frame(stream):
+    header = stream.read(_FRAME.size)
+    if len(header) != _FRAME.size:
+        raise SnapshotError("快照意外结束")
+    meta_length, payload_length = _FRAME.unpack(header)
+    meta = json.loads(stream.read(meta_length).decode('utf-8'))
+    payload = stream.read(payload_length)
+    if len(payload) != payload_length:
+        raise SnapshotError("快照意外结束")
+    return meta, payload
+
+
+def write_snapshot(conn, out, tables=SNAPSHOT_TABLES, block_rows=BLOCK_ROWS):
+    """把 conn 中的表写入二进制流 out，返回 {表名: 行数}"""
+    cursor = conn.cursor()
+    columns = {table: _table_columns(cursor, table) for table in tables}
+    counts = {}
+    for table in tables:
+        cursor.execute(f'SELECT COUNT(*) FROM {table}')
+        counts[table] = cursor.fetchone()[0]
+
+    out.write(SNAPSHOT_MAGIC)
+    _write_frame(out, {'version': SNAPSHOT_VERSION, 'created_at': time.time(), 'tables': counts})
+    for table in tables:
+        names = columns[table]
+        cursor.execute(f"SELECT {', '.join(names)} FROM {table} ORDER BY rowid")
+        while True:
+            rows = cursor.fetchmany(block_rows)
+            if not rows:
+                break
+            chunks = [zlib.compress(json.dumps(list(values), ensure_ascii=False, separators=(',', ':'),
+                                               default=str).encode('utf-8'))
+                      for values in zip(*rows)]
+            _write_frame(out, {'table': table, 'columns': names, 'rows': len(rows),
+                               'sizes': [len(chunk) for chunk in chunks]}, b''.join(chunks))
+    _write_frame(out, {'end': True})
+    return counts
+
+
+def read_snapshot(stream):
+    """读取快照头，返回 (头信息, 数据块生成器)；生成器逐块产出 (表名, 列名, 行列表)"""
+    if stream.read(len(SNAPSHOT_MAGIC)) != SNAPSHOT_MAGIC:
+        raise SnapshotError("不是目录快照文件")
+    header, _ = _read_frame(stream)
+    if header.get('version') != SNAPSHOT_VERSION:
+        raise SnapshotError(f"不支持的快照版本: {header.get('version')}")
+
+    def blocks():
+        while True:
+            meta, payload = _read_frame(stream)
+            if meta.get('end'):
+                return
+            columns = []
+            offset = 0
+            for size in meta['sizes']:
+                columns.append(json.loads(zlib.decompress(payload[offset:offset + size])))
+                offset += size
+            yield meta['table'], meta['columns'], list(zip(*columns))
+    return header, blocks()
+
+
+def print_info(snapshot_path):
+    with open(snapshot_path, 'rb') as f:
+        header, blocks = read_snapshot(f)
+        block_count = sum(1 for _ in blocks)
+    print(f"快照版本 {header['version']}, 创建于 {time.ctime(header['created_at'])}")
+    for table, rows in header['tables'].items():
+        print(f"  {table}: {rows} 行")
+    print(f"  共 {block_count} 个数据块")
+
+
+if __name__ == "__main__":
+    import argparse
+    from database import ClothingDatabase
+
+    parser = argparse.ArgumentParser(description="目录快照导出/导入")
+    parser.add_argument('command', choices=['export', 'import', 'info'])
+    parser.add_argument('snapshot', help=f"快照文件（{SNAPSHOT_SUFFIX}）")
+    parser.add_argument('--db', default="database/clothing.db")
+    parser.add_argument('--merge', action='store_true', help="导入时保留现有数据，跳过已存在的 MD5")
+    parser.add_argument('--rebase', metavar='OLD=NEW', help="导入时改写素材路径前缀")
+    args = parser.parse_args()
+
+    if args.command == 'info':
+        print_info(args.snapshot)
+    elif args.command == 'export':
+        start = time.perf_counter()
+        counts = ClothingDatabase(args.db).export_snapshot(args.snapshot)
+        print(f"已导出 {counts} ({time.perf_counter() - start:.2f} 秒): {args.snapshot}")
+    else:
+        path_prefix = tuple(args.rebase.split('=', 1)) if args.rebase else None
+        start = time.perf_counter()
+        counts = ClothingDatabase(args.db).import_snapshot(args.snapshot, args.merge, path_prefix)
+        print(f"已导入 {counts} ({time.perf_counter() - start:.2f} 秒)")
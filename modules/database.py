@@ -4,28 +4,126 @@
 数据库模块 - 管理服装素材的MD5和标签信息
 """
 
+import os
 import sqlite3
 import json
+import random
+import time
 from pathlib import Path
 from datetime import datetime
 
+from instrumentation import traced, count, debug
+from catalog_snapshot import write_snapshot, read_snapshot, SnapshotError, SNAPSHOT_TABLES
+
+# 统计汇总表与实际聚合的一致性检查间隔（秒）
+STATS_CHECK_INTERVAL = 600
+
+# 多个程序共用同一个数据库（如共享盘）时：等待锁的超时（秒）和写事务重试次数
+BUSY_TIMEOUT = 10.0
+WRITE_RETRIES = 5
+
+# 统计汇总表的维护触发器 {名称: 定义}
+STATS_TRIGGERS = {
+    'stats_clothing_insert': '''CREATE TRIGGER IF NOT EXISTS stats_clothing_insert AFTER INSERT ON clothing_items
+        BEGIN
+            INSERT OR IGNORE INTO stats_summary (scope, name) VALUES ('type', NEW.clothing_type);
+            UPDATE stats_summary
+            SET count = count + 1, labeled_count = labeled_count + (NEW.custom_name IS NOT NULL)
+            WHERE scope = 'type' AND name = NEW.clothing_type;
+        END''',
+    'stats_clothing_delete': '''CREATE TRIGGER IF NOT EXISTS stats_clothing_delete AFTER DELETE ON clothing_items
+        BEGIN
+            UPDATE stats_summary
+            SET count = count - 1, labeled_count = labeled_count - (OLD.custom_name IS NOT NULL)
+            WHERE scope = 'type' AND name = OLD.clothing_type;
+        END''',
+    'stats_clothing_update': '''CREATE TRIGGER IF NOT EXISTS stats_clothing_update
+        AFTER UPDATE OF clothing_type, custom_name ON clothing_items
+        BEGIN
+            UPDATE stats_summary
+            SET count = count - 1, labeled_count = labeled_count - (OLD.custom_name IS NOT NULL)
+            WHERE scope = 'type' AND name = OLD.clothing_type;
+            INSERT OR IGNORE INTO stats_summary (scope, name) VALUES ('type', NEW.clothing_type);
+            UPDATE stats_summary
+            SET count = count + 1, labeled_count = labeled_count + (NEW.custom_name IS NOT NULL)
+            WHERE scope = 'type' AND name = NEW.clothing_type;
+        END''',
+    'stats_animation_insert': '''CREATE TRIGGER IF NOT EXISTS stats_animation_insert AFTER INSERT ON animations
+        BEGIN
+            INSERT OR IGNORE INTO stats_summary (scope, name) VALUES ('animations', '');
+            UPDATE stats_summary SET count = count + 1 WHERE scope = 'animations';
+        END''',
+    'stats_animation_delete': '''CREATE TRIGGER IF NOT EXISTS stats_animation_delete AFTER DELETE ON animations
+        BEGIN
+            UPDATE stats_summary SET count = count - 1 WHERE scope = 'animations';
+        END''',
+}
+
+
+class VersionConflictError(Exception):
+    """标签已被其他人修改（乐观锁版本号不一致），current 为数据库中的当前记录"""
+
+    def __init__(self, md5_hash, current):
+        super().__init__(f"{md5_hash} 已被修改（当前版本 {current.get('version')}）")
+        self.md5_hash = md5_hash
+        self.current = current
+
+
+def _is_busy(error):
+    message = str(error).lower()
+    return 'locked' in message or 'busy' in message
+
+
 class ClothingDatabase:
     def __init__(self, db_path="database/clothing.db"):
         self.db_path = Path(db_path)
         self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        # 上次统计一致性检查的时间（0 表示首次获取统计时检查）
+        self._stats_checked_at = 0
+        # 因数据库被锁而重试的写事务次数
+        self.write_retries = 0
         self.init_database()
     
     def get_connection(self):
-        """获取数据库连接"""
-        conn = sqlite3.connect(str(self.db_path))
+        """获取数据库连接（被其他进程锁住时最多等待 BUSY_TIMEOUT 秒）"""
+        conn = sqlite3.connect(str(self.db_path), timeout=BUSY_TIMEOUT)
         conn.row_factory = sqlite3.Row
         return conn
     
-    def init_database(self):
-        """初始化数据库表"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
+    def _write(self, work):
+        """在写事务中执行 work(cursor) 并返回其结果
         
+        BEGIN IMMEDIATE 开始时即取得写锁，读改写之间不会被其他进程插入写入；
+        等待超时仍被锁时回滚并随机退避后重试整个事务（work 必须可重复执行）。
+        """
+        for attempt in range(WRITE_RETRIES):
+            conn = self.get_connection()
+            try:
+                conn.execute('BEGIN IMMEDIATE')
+                result = work(conn.cursor())
+                conn.commit()
+                return result
+            except sqlite3.OperationalError as e:
+                conn.rollback()
+                if not _is_busy(e) or attempt == WRITE_RETRIES - 1:
+                    raise
+                self.write_retries += 1
+                count('db.write_retry')
+                delay = random.uniform(0.05, 0.2) * 2 ** attempt
+                debug("数据库被锁，%.2f 秒后重试 (%d/%d)", delay, attempt + 1, WRITE_RETRIES)
+                time.sleep(delay)
+            except Exception:
+                conn.rollback()
+                raise
+            finally:
+                conn.close()
+    
+    def init_database(self):
+        """初始化数据库表（在写事务中执行，多个程序同时启动也只会建表/升级一次）"""
+        self._write(self._create_schema)
+        debug("数据库初始化完成")
+    
+    def _create_schema(self, cursor):
         # 服装素材表
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS clothing_items (
@@ -39,7 +137,8 @@ class ClothingDatabase:
                 has_animation BOOLEAN DEFAULT 0,
                 source_path TEXT,
                 created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                version INTEGER NOT NULL DEFAULT 0
             )
         ''')
         
@@ -52,10 +151,17 @@ class ClothingDatabase:
                 action_name TEXT,
                 description TEXT,
                 source_path TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                version INTEGER NOT NULL DEFAULT 0
             )
         ''')
         
+        # 旧数据库升级：标签乐观锁版本号
+        for table in ('clothing_items', 'animations'):
+            cursor.execute(f'PRAGMA table_info({table})')
+            if 'version' not in [row[1] for row in cursor.fetchall()]:
+                cursor.execute(f'ALTER TABLE {table} ADD COLUMN version INTEGER NOT NULL DEFAULT 0')
+        
         # 导入历史表 - 防止重复导入
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS import_history (
@@ -67,6 +173,37 @@ class ClothingDatabase:
             )
         ''')
         
+        # 图片元数据表 - 导入时分析（尺寸、不透明区域包围盒、文件大小）
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS image_metadata (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                md5_hash TEXT NOT NULL,
+                file_name TEXT NOT NULL,
+                width INTEGER NOT NULL,
+                height INTEGER NOT NULL,
+                bbox_x INTEGER,
+                bbox_y INTEGER,
+                bbox_width INTEGER,
+                bbox_height INTEGER,
+                file_size INTEGER,
+                UNIQUE (md5_hash, file_name)
+            )
+        ''')
+        
+        # 服装兼容性索引 - 插槽、骨骼、附件名（JSON），见 outfit_index
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS outfit_index (
+                md5_hash TEXT PRIMARY KEY,
+                clothing_type TEXT NOT NULL,
+                slots TEXT NOT NULL,
+                bones TEXT NOT NULL,
+                attachments TEXT NOT NULL,
+                version INTEGER NOT NULL,
+                dress_size INTEGER,
+                dress_mtime INTEGER
+            )
+        ''')
+        
         # 分类统计视图
         cursor.execute('''
             CREATE VIEW IF NOT EXISTS clothing_stats AS
@@ -78,10 +215,26 @@ class ClothingDatabase:
             GROUP BY clothing_type
         ''')
         
-        conn.commit()
-        conn.close()
-        print("数据库初始化完成")
+        # 统计汇总表 - 由触发器增量维护，scope 为 'type'（按服装类型）或 'animations'
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'stats_summary'")
+        stats_created = cursor.fetchone() is None
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS stats_summary (
+                scope TEXT NOT NULL,
+                name TEXT NOT NULL,
+                count INTEGER NOT NULL DEFAULT 0,
+                labeled_count INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (scope, name)
+            )
+        ''')
+        for trigger in STATS_TRIGGERS.values():
+            cursor.execute(trigger)
+        
+        if stats_created:
+            # 旧数据库首次升级时从现有数据生成汇总
+            self._rebuild_statistics(cursor)
     
+    @traced('db.check_md5_exists')
     def check_md5_exists(self, md5_hash):
         """检查MD5是否已存在于服装表"""
         conn = self.get_connection()
@@ -91,6 +244,7 @@ class ClothingDatabase:
         conn.close()
         return result is not None
     
+    @traced('db.check_animation_exists')
     def check_animation_exists(self, md5_hash):
         """检查MD5是否已存在于动画表"""
         conn = self.get_connection()
@@ -100,56 +254,71 @@ class ClothingDatabase:
         conn.close()
         return result is not None
     
+    @traced('db.add_clothing_item')
     def add_clothing_item(self, md5_hash, folder_name, clothing_type, 
                          custom_name=None, description=None, 
                          thumbnail_path=None, has_animation=False, source_path=None):
-        """添加服装素材"""
-        if self.check_md5_exists(md5_hash):
-            print(f"MD5 {md5_hash} 已存在，跳过")
-            return False
-        
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        
-        try:
+        """添加服装素材（已存在时跳过，多个进程同时导入同一素材也只会添加一次）"""
+        def work(cursor):
             cursor.execute('''
                 INSERT INTO clothing_items 
                 (md5_hash, folder_name, clothing_type, custom_name, description, 
                  thumbnail_path, has_animation, source_path)
                 VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(md5_hash) DO NOTHING
             ''', (md5_hash, folder_name, clothing_type, custom_name, 
                   description, thumbnail_path, has_animation, source_path))
+            if cursor.rowcount == 0:
+                return False
             
             # 记录导入历史
             cursor.execute('''
                 INSERT OR REPLACE INTO import_history (md5_hash, source_folder)
                 VALUES (?, ?)
             ''', (md5_hash, source_path))
-            
-            conn.commit()
-            print(f"添加服装: {md5_hash} -> {clothing_type}")
             return True
+        
+        try:
+            added = self._write(work)
         except sqlite3.Error as e:
             print(f"数据库错误: {e}")
             return False
-        finally:
-            conn.close()
+        if added:
+            debug("添加服装: %s -> %s", md5_hash, clothing_type)
+        else:
+            debug("MD5 %s 已存在，跳过", md5_hash)
+        return added
     
-    def update_clothing_label(self, md5_hash, custom_name, description=None, thumbnail_path=None):
-        """更新服装标签"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
+    @traced('db.update_clothing_label')
+    def update_clothing_label(self, md5_hash, custom_name, description=None, thumbnail_path=None,
+                              expected_version=None):
+        """更新服装标签（thumbnail_path 为 None 时保留原缩略图）
         
-        cursor.execute('''
-            UPDATE clothing_items 
-            SET custom_name = ?, description = ?, thumbnail_path = ?, updated_at = ?
-            WHERE md5_hash = ?
-        ''', (custom_name, description, thumbnail_path, datetime.now(), md5_hash))
+        expected_version 为读取记录时的 version，记录已被其他人修改时抛出 VersionConflictError；
+        为 None 时直接覆盖。每次更新 version 加 1。
+        """
+        def work(cursor):
+            sql = '''
+                UPDATE clothing_items 
+                SET custom_name = ?, description = ?, thumbnail_path = COALESCE(?, thumbnail_path),
+                    updated_at = ?, version = version + 1
+                WHERE md5_hash = ?
+            '''
+            params = [custom_name, description, thumbnail_path, datetime.now(), md5_hash]
+            if expected_version is not None:
+                sql += ' AND version = ?'
+                params.append(expected_version)
+            cursor.execute(sql, params)
+            if cursor.rowcount == 0 and expected_version is not None:
+                cursor.execute('SELECT * FROM clothing_items WHERE md5_hash = ?', (md5_hash,))
+                current = cursor.fetchone()
+                if current is not None:
+                    raise VersionConflictError(md5_hash, dict(current))
+            return cursor.rowcount > 0
         
-        conn.commit()
-        conn.close()
-        return cursor.rowcount > 0
+        return self._write(work)
     
+    @traced('db.get_all_items')
     def get_all_items(self, clothing_type=None):
         """获取所有服装素材"""
         conn = self.get_connection()
@@ -168,6 +337,7 @@ class ClothingDatabase:
         conn.close()
         return results
     
+    @traced('db.get_items_by_type')
     def get_items_by_type(self):
         """按类型分组获取服装"""
         conn = self.get_connection()
@@ -188,6 +358,7 @@ class ClothingDatabase:
         conn.close()
         return result
     
+    @traced('db.get_item_by_md5')
     def get_item_by_md5(self, md5_hash):
         """通过MD5获取服装信息"""
         conn = self.get_connection()
@@ -197,25 +368,59 @@ class ClothingDatabase:
         conn.close()
         return dict(result) if result else None
     
+    @traced('db.add_animation')
     def add_animation(self, md5_hash, folder_name, action_name=None, description=None, source_path=None):
-        """添加动画"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        
-        try:
+        """添加动画（已存在时更新文件夹和路径，action_name / description 为 None 时保留原标签）"""
+        def work(cursor):
+            # REPLACE 会删除旧行（不触发删除触发器、丢失其他人写入的标签），用 UPSERT 原地更新
             cursor.execute('''
-                INSERT OR REPLACE INTO animations 
+                INSERT INTO animations 
                 (md5_hash, folder_name, action_name, description, source_path)
                 VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT(md5_hash) DO UPDATE SET
+                    folder_name = excluded.folder_name,
+                    action_name = COALESCE(excluded.action_name, action_name),
+                    description = COALESCE(excluded.description, description),
+                    source_path = COALESCE(excluded.source_path, source_path)
             ''', (md5_hash, folder_name, action_name, description, source_path))
-            conn.commit()
             return True
+        
+        try:
+            return self._write(work)
         except sqlite3.Error as e:
             print(f"数据库错误: {e}")
             return False
-        finally:
-            conn.close()
     
+    @traced('db.update_animation_label')
+    def update_animation_label(self, md5_hash, action_name, description=None, expected_version=None):
+        """更新动画标签，expected_version 的含义同 update_clothing_label"""
+        def work(cursor):
+            sql = 'UPDATE animations SET action_name = ?, description = ?, version = version + 1 WHERE md5_hash = ?'
+            params = [action_name, description, md5_hash]
+            if expected_version is not None:
+                sql += ' AND version = ?'
+                params.append(expected_version)
+            cursor.execute(sql, params)
+            if cursor.rowcount == 0 and expected_version is not None:
+                cursor.execute('SELECT * FROM animations WHERE md5_hash = ?', (md5_hash,))
+                current = cursor.fetchone()
+                if current is not None:
+                    raise VersionConflictError(md5_hash, dict(current))
+            return cursor.rowcount > 0
+        
+        return self._write(work)
+    
+    @traced('db.get_animation_by_md5')
+    def get_animation_by_md5(self, md5_hash):
+        """通过MD5获取动画信息"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute('SELECT * FROM animations WHERE md5_hash = ?', (md5_hash,))
+        result = cursor.fetchone()
+        conn.close()
+        return dict(result) if result else None
+    
+    @traced('db.get_all_animations')
     def get_all_animations(self):
         """获取所有动画"""
         conn = self.get_connection()
@@ -225,37 +430,312 @@ class ClothingDatabase:
         conn.close()
         return results
     
+    @traced('db.get_statistics')
     def get_statistics(self):
-        """获取统计信息"""
+        """获取统计信息（读取触发器维护的汇总表，与素材数量无关；定期与实际聚合核对）"""
+        if time.time() - self._stats_checked_at >= STATS_CHECK_INTERVAL:
+            self.check_statistics()
+        
         conn = self.get_connection()
         cursor = conn.cursor()
         
-        cursor.execute('SELECT * FROM clothing_stats')
+        cursor.execute('''
+            SELECT name AS clothing_type, count, labeled_count, count - labeled_count AS unlabeled_count
+            FROM stats_summary
+            WHERE scope = 'type' AND count > 0
+            ORDER BY name
+        ''')
         stats = [dict(row) for row in cursor.fetchall()]
         
-        cursor.execute('SELECT COUNT(*) FROM clothing_items')
-        total_items = cursor.fetchone()[0]
-        
-        cursor.execute('SELECT COUNT(*) FROM animations')
-        total_animations = cursor.fetchone()[0]
+        cursor.execute("SELECT count FROM stats_summary WHERE scope = 'animations'")
+        row = cursor.fetchone()
+        total_animations = row[0] if row else 0
         
         conn.close()
         
         return {
-            'total_items': total_items,
+            'total_items': sum(stat['count'] for stat in stats),
             'total_animations': total_animations,
             'type_stats': stats
         }
     
-    def delete_item(self, md5_hash):
-        """删除服装素材"""
+    def _actual_statistics(self, cursor):
+        """实际聚合 {(scope, name): (count, labeled_count)}（全表扫描）"""
+        actual = {}
+        cursor.execute('SELECT * FROM clothing_stats')
+        for row in cursor.fetchall():
+            actual[('type', row['clothing_type'])] = (row['count'], row['labeled_count'] or 0)
+        cursor.execute('SELECT COUNT(*) FROM animations')
+        actual[('animations', '')] = (cursor.fetchone()[0], 0)
+        return actual
+    
+    @traced('db.check_statistics')
+    def check_statistics(self, repair=True):
+        """核对汇总表与实际聚合，返回不一致的 [(scope, name, 汇总值, 实际值)]，repair 为 True 时重建汇总"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        # 在同一个读事务中读取，避免其他连接的写入造成误报
+        cursor.execute('BEGIN')
+        actual = self._actual_statistics(cursor)
+        cursor.execute('SELECT scope, name, count, labeled_count FROM stats_summary')
+        summary = {(row['scope'], row['name']): (row['count'], row['labeled_count']) for row in cursor.fetchall()}
+        conn.rollback()
+        conn.close()
+        
+        mismatches = []
+        for key in sorted(set(actual) | set(summary)):
+            stored = summary.get(key, (0, 0))
+            real = actual.get(key, (0, 0))
+            if stored != real:
+                mismatches.append(key + (stored, real))
+        
+        if mismatches:
+            print(f"[WARN] 统计汇总与实际数据不一致 {len(mismatches)} 项: {mismatches[:5]}")
+            if repair:
+                self.rebuild_statistics()
+        self._stats_checked_at = time.time()
+        return mismatches
+    
+    @traced('db.rebuild_statistics')
+    def rebuild_statistics(self):
+        """从实际数据重建统计汇总表"""
+        try:
+            self._write(self._rebuild_statistics)
+        except sqlite3.Error as e:
+            print(f"数据库错误: {e}")
+            raise
+    
+    def _rebuild_statistics(self, cursor):
+        actual = self._actual_statistics(cursor)
+        cursor.execute('DELETE FROM stats_summary')
+        cursor.executemany(
+            'INSERT INTO stats_summary (scope, name, count, labeled_count) VALUES (?, ?, ?, ?)',
+            [key + value for key, value in actual.items()]
+        )
+    
+    @traced('db.update_source_paths')
+    def update_source_paths(self, path_map, table='animations'):
+        """批量更新 source_path {md5: 新路径}，在一个事务中完成，返回更新行数"""
+        if table not in ('animations', 'clothing_items'):
+            raise ValueError(f"不支持的表: {table}")
+        
+        def work(cursor):
+            cursor.executemany(
+                f'UPDATE {table} SET source_path = ? WHERE md5_hash = ?',
+                [(path, md5_hash) for md5_hash, path in path_map.items()]
+            )
+            return cursor.rowcount
+        
+        try:
+            return self._write(work)
+        except sqlite3.Error as e:
+            print(f"数据库错误: {e}")
+            raise
+    
+    @traced('db.update_thumbnail_paths')
+    def update_thumbnail_paths(self, path_map):
+        """批量更新服装缩略图路径 {md5: 路径}，返回更新行数"""
+        def work(cursor):
+            cursor.executemany(
+                'UPDATE clothing_items SET thumbnail_path = ? WHERE md5_hash = ?',
+                [(path, md5_hash) for md5_hash, path in path_map.items()]
+            )
+            return cursor.rowcount
+        
+        try:
+            return self._write(work)
+        except sqlite3.Error as e:
+            print(f"数据库错误: {e}")
+            raise
+    
+    @traced('db.save_image_metadata')
+    def save_image_metadata(self, records):
+        """批量保存图片元数据（见 image_analyzer.analyze_folder），在一个事务中完成"""
+        rows = []
+        for record in records:
+            bbox = record.get('bbox')
+            if bbox:
+                bbox_values = (bbox[0], bbox[1], bbox[2] - bbox[0], bbox[3] - bbox[1])
+            else:
+                bbox_values = (None, None, 0, 0)
+            rows.append((record['md5_hash'], record['file_name'], record['width'], record['height'])
+                        + bbox_values + (record.get('file_size'),))
+        
+        def work(cursor):
+            cursor.executemany('''
+                INSERT OR REPLACE INTO image_metadata
+                (md5_hash, file_name, width, height, bbox_x, bbox_y, bbox_width, bbox_height, file_size)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', rows)
+            return len(rows)
+        
+        try:
+            return self._write(work)
+        except sqlite3.Error as e:
+            print(f"数据库错误: {e}")
+            raise
+    
+    @traced('db.get_image_metadata')
+    def get_image_metadata(self, md5_hash):
+        """获取某个素材的图片元数据（按文件名排序）"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute('SELECT * FROM image_metadata WHERE md5_hash = ? ORDER BY file_name', (md5_hash,))
+        results = [dict(row) for row in cursor.fetchall()]
+        conn.close()
+        return results
+    
+    @traced('db.get_image_summary')
+    def get_image_summary(self, md5_hashes=None):
+        """图片汇总：数量、总像素、裁剪透明边后的像素、字节数（可限定 MD5 列表，用于图集估算）"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        
+        sql = '''
+            SELECT COUNT(*) AS images,
+                   COALESCE(SUM(width * height), 0) AS pixels,
+                   COALESCE(SUM(bbox_width * bbox_height), 0) AS trimmed_pixels,
+                   COALESCE(SUM(file_size), 0) AS bytes
+            FROM image_metadata
+        '''
+        if md5_hashes is not None:
+            md5_hashes = list(md5_hashes)
+            cursor.execute(sql + f" WHERE md5_hash IN ({','.join('?' * len(md5_hashes))})", md5_hashes)
+        else:
+            cursor.execute(sql)
+        result = dict(cursor.fetchone())
+        conn.close()
+        return result
+    
+    @traced('db.save_outfit_index')
+    def save_outfit_index(self, entries):
+        """批量保存服装索引（见 outfit_index.extract_outfit_index），在一个事务中完成"""
+        rows = [(entry['md5_hash'], entry['clothing_type'],
+                 json.dumps(entry['slots'], ensure_ascii=False),
+                 json.dumps(entry['bones'], ensure_ascii=False),
+                 json.dumps(entry['attachments'], ensure_ascii=False),
+                 entry['version'], entry.get('dress_size'), entry.get('dress_mtime'))
+                for entry in entries]
+        
+        def work(cursor):
+            cursor.executemany('''
+                INSERT OR REPLACE INTO outfit_index
+                (md5_hash, clothing_type, slots, bones, attachments, version, dress_size, dress_mtime)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ''', rows)
+            return len(rows)
+        
+        try:
+            return self._write(work)
+        except sqlite3.Error as e:
+            print(f"数据库错误: {e}")
+            raise
+    
+    @traced('db.get_outfit_index')
+    def get_outfit_index(self):
+        """获取全部服装索引 {md5: 索引}"""
         conn = self.get_connection()
         cursor = conn.cursor()
-        cursor.execute('DELETE FROM clothing_items WHERE md5_hash = ?', (md5_hash,))
-        cursor.execute('DELETE FROM import_history WHERE md5_hash = ?', (md5_hash,))
-        conn.commit()
+        cursor.execute('SELECT * FROM outfit_index')
+        results = {}
+        for row in cursor.fetchall():
+            entry = dict(row)
+            for field in ('slots', 'bones', 'attachments'):
+                entry[field] = json.loads(entry[field])
+            results[entry['md5_hash']] = entry
         conn.close()
-        return cursor.rowcount > 0
+        return results
+    
+    @traced('db.delete_item')
+    def delete_item(self, md5_hash):
+        """删除服装素材"""
+        def work(cursor):
+            cursor.execute('DELETE FROM clothing_items WHERE md5_hash = ?', (md5_hash,))
+            deleted = cursor.rowcount
+            cursor.execute('DELETE FROM import_history WHERE md5_hash = ?', (md5_hash,))
+            cursor.execute('DELETE FROM image_metadata WHERE md5_hash = ?', (md5_hash,))
+            cursor.execute('DELETE FROM outfit_index WHERE md5_hash = ?', (md5_hash,))
+            return deleted > 0
+        
+        return self._write(work)
+    
+    @traced('db.export_snapshot')
+    def export_snapshot(self, snapshot_path):
+        """导出目录快照（见 catalog_snapshot），返回 {表名: 行数}"""
+        snapshot_path = Path(snapshot_path)
+        temp_path = snapshot_path.with_name(snapshot_path.name + ".partial")
+        conn = self.get_connection()
+        try:
+            # 在一个读事务中导出，各表互相一致
+            conn.execute('BEGIN')
+            with open(temp_path, 'wb') as out:
+                counts = write_snapshot(conn, out)
+            conn.rollback()
+        finally:
+            conn.close()
+        os.replace(temp_path, snapshot_path)
+        return counts
+    
+    @traced('db.import_snapshot')
+    def import_snapshot(self, snapshot_path, merge=False, path_prefix=None, progress_callback=None):
+        """流式导入目录快照，在一个事务中完成，返回 {表名: 导入行数}
+        
+        merge 为 False 时先清空快照中的表（替换整个目录），为 True 时保留现有数据并跳过已存在的 MD5；
+        path_prefix=(旧前缀, 新前缀) 时改写 source_path / thumbnail_path（素材库在另一台机器上的位置不同）；
+        progress_callback(已导入行数) 每个数据块调用一次。
+        """
+        def rebase(value):
+            if value and value.startswith(path_prefix[0]):
+                return path_prefix[1] + value[len(path_prefix[0]):]
+            return value
+        
+        def work(cursor):
+            counts = {}
+            with open(snapshot_path, 'rb') as f:
+                header, blocks = read_snapshot(f)
+                # 逐行触发器对批量导入太慢：导入期间删除，结束后重建触发器和汇总
+                for name in STATS_TRIGGERS:
+                    cursor.execute(f'DROP TRIGGER IF EXISTS {name}')
+                if not merge:
+                    for table in header['tables']:
+                        if table in SNAPSHOT_TABLES:
+                            cursor.execute(f'DELETE FROM {table}')
+                
+                known_columns = {}
+                for table, columns, rows in blocks:
+                    if table not in SNAPSHOT_TABLES:
+                        raise SnapshotError(f"快照包含未知的表: {table}")
+                    if table not in known_columns:
+                        cursor.execute(f'PRAGMA table_info({table})')
+                        known_columns[table] = {row[1] for row in cursor.fetchall()}
+                    # 只导入本数据库中存在的列（快照可能来自其他版本）
+                    keep = [i for i, name in enumerate(columns) if name in known_columns[table]]
+                    names = [columns[i] for i in keep]
+                    if len(keep) != len(columns):
+                        rows = [tuple(row[i] for i in keep) for row in rows]
+                    if path_prefix:
+                        path_columns = [i for i, name in enumerate(names) if name in ('source_path', 'thumbnail_path')]
+                        if path_columns:
+                            rows = [tuple(rebase(v) if i in path_columns else v for i, v in enumerate(row))
+                                    for row in rows]
+                    
+                    cursor.executemany(
+                        f"INSERT {'OR IGNORE ' if merge else ''}INTO {table} ({', '.join(names)}) "
+                        f"VALUES ({', '.join('?' * len(names))})", rows)
+                    counts[table] = counts.get(table, 0) + cursor.rowcount
+                    if progress_callback:
+                        progress_callback(sum(counts.values()))
+            
+            for trigger in STATS_TRIGGERS.values():
+                cursor.execute(trigger)
+            self._rebuild_statistics(cursor)
+            return counts
+        
+        try:
+            return self._write(work)
+        except sqlite3.Error as e:
+            print(f"数据库错误: {e}")
+            raise
 
 # 测试代码
 if __name__ == "__main__":
@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+图片分析模块 - 导入时用进程池分析每个文件夹的 PNG（尺寸、透明包围盒、字节数）并生成缩略图
+
+分析结果写入 image_metadata 表，缩略图路径写入 clothing_items.thumbnail_path，
+预览、图集估算和清理可以直接读取元数据而不必解码图片。
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from pathlib import Path
+
+from PIL import Image
+
+from asset_storage import storage_for
+from instrumentation import span, count
+
+# 每批写入数据库的文件夹数
+DB_BATCH_SIZE = 200
+
+
+def alpha_bbox(img):
+    """不透明像素的包围盒 (x0, y0, x1, y1)，全透明返回 None，无透明通道返回整张图"""
+    if img.mode == 'P' and 'transparency' in img.info:
+        img = img.convert('RGBA')
+    if img.mode in ('RGBA', 'LA', 'PA'):
+        return img.getchannel('A').getbbox()
+    return (0, 0) + img.size
+
+
+def make_thumbnail(storage, md5_hash, name, output_path, size=(128, 128)):
+    """生成缩略图并保存，返回输出路径"""
+    output_path = Path(output_path)
+    with span('image.decode', file=name), storage.open(md5_hash, name) as f, Image.open(f) as img:
+        # reduce 不支持调色板、1 位和 16 位模式，先转换
+        if img.mode in ('P', 'PA', '1'):
+            img = img.convert('RGBA')
+        elif img.mode.startswith('I;16'):
+            img = img.convert('I')
+        # 先按整数倍快速缩小，再做高质量缩放
+        factor = min(img.width // size[0], img.height // size[1])
+        if factor >= 2:
+            img = img.reduce(factor)
+        img.thumbnail(size, Image.Resampling.LANCZOS)
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+        img.save(output_path)
+    return str(output_path)
+
+
+def analyze_folder(item_path, thumbnail_path=None, thumb_size=(128, 128)):
+    """分析单个素材文件夹（进程池任务）
+
+    返回 {'md5': ..., 'images': [元数据...], 'thumbnail_path': ..., 'errors': [...]}
+    """
+    storage, md5_hash = storage_for(item_path)
+    result = {'md5': md5_hash, 'images': [], 'thumbnail_path': None, 'errors': []}
+
+    png_files = storage.list_files(md5_hash, "*.png")
+    for name in png_files:
+        try:
+            file_size, _ = storage.stat(md5_hash, name)
+            with Image.open(storage.open(md5_hash, name)) as img:
+                width, height = img.size
+                bbox = alpha_bbox(img)
+            result['images'].append({
+                'md5_hash': md5_hash,
+                'file_name': name,
+                'width': width,
+                'height': height,
+                'bbox': bbox,
+                'file_size': file_size,
+            })
+        except Exception as e:
+            result['errors'].append(f"{name}: {e}")
+
+    if thumbnail_path and png_files:
+        try:
+            result['thumbnail_path'] = make_thumbnail(storage, md5_hash, png_files[0], thumbnail_path, thumb_size)
+        except Exception as e:
+            result['errors'].append(f"缩略图 {png_files[0]}: {e}")
+    return result
+
+
+class ImageAnalyzer:
+    def __init__(self, db, thumbnail_dir=None, workers=None, thumb_size=(128, 128)):
+        """thumbnail_dir 为空时只分析不生成缩略图；workers 默认 CPU 核数"""
+        self.db = db
+        self.thumbnail_dir = Path(thumbnail_dir) if thumbnail_dir else None
+        self.workers = workers or os.cpu_count() or 1
+        self.thumb_size = thumb_size
+        self.summary = None
+
+    def _thumbnail_path(self, md5_hash, with_thumbnail):
+        if self.thumbnail_dir is None or not with_thumbnail:
+            return None
+        return str(self.thumbnail_dir / f"{md5_hash}.png")
+
+    def run(self, items):
+        """分析 items [(md5, source_path, 是否生成缩略图)]，items 可以是生成器
+
+        提交的任务数限制在 workers 的数倍以内，导入和分析可以同时进行，内存占用固定。
+        返回汇总 {'folders', 'images', 'pixels', 'bytes', 'thumbnails', 'failed'}
+        """
+        self.summary = {'folders': 0, 'images': 0, 'pixels': 0, 'bytes': 0, 'thumbnails': 0, 'failed': 0}
+        self._records = []
+        self._thumbnails = {}
+        window = self.workers * 4
+
+        with ProcessPoolExecutor(max_workers=self.workers) as pool:
+            pending = set()
+            for md5_hash, source_path, with_thumbnail in items:
+                pending.add(pool.submit(analyze_folder, str(source_path),
+                                        self._thumbnail_path(md5_hash, with_thumbnail), self.thumb_size))
+                if len(pending) >= window:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    self._collect(done)
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                self._collect(done)
+
+        self._flush()
+        return self.summary
+
+    def _collect(self, futures):
+        summary = self.summary
+        for future in futures:
+            try:
+                result = future.result()
+            except Exception as e:
+                print(f"[WARN] 图片分析失败: {e}")
+                summary['failed'] += 1
+                continue
+
+            summary['folders'] += 1
+            for error in result['errors']:
+                print(f"[WARN] 图片分析 {result['md5']}: {error}")
+            if result['errors']:
+                summary['failed'] += 1
+            for image in result['images']:
+                summary['images'] += 1
+                summary['pixels'] += image['width'] * image['height']
+                summary['bytes'] += image['file_size']
+            self._records.extend(result['images'])
+            if result['thumbnail_path']:
+                self._thumbnails[result['md5']] = result['thumbnail_path']
+                summary['thumbnails'] += 1
+            count('image.analyzed', len(result['images']))
+
+            if summary['folders'] % DB_BATCH_SIZE == 0:
+                self._flush()
+
+    def _flush(self):
+        if self._records:
+            self.db.save_image_metadata(self._records)
+            self._records = []
+        if self._thumbnails:
+            self.db.update_thumbnail_paths(self._thumbnails)
+            self._thumbnails = {}
+
+
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) < 2:
+        print("用法: python image_analyzer.py <素材文件夹>")
+        sys.exit(1)
+    for image in analyze_folder(sys.argv[1])['images']:
+        print(f"{image['file_name']}: {image['width']}x{image['height']} bbox={image['bbox']} {image['file_size']} 字节")
@@ -0,0 +1,324 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+图片优化模块 - 合成输出阶段用进程池处理 PNG
+
+  - recompress: 无损重新压缩（结果不更小时保留原文件）
+  - trim:       裁掉透明边，并调整引用该图片的附件（区域附件的 x/y/width/height，网格的 uvs）
+                网格按 透明包围盒 ∪ UV 包围盒 裁剪，被 linkedmesh 等其他附件引用的图片不裁剪
+  - scale:      按比例缩小（低配目标用），附件的世界尺寸不变
+
+结果按 源图片 SHA-256 + 配置 缓存在 cache_dir，未变化的图片不再重新编码。
+"""
+
+import hashlib
+import io
+import json
+import math
+import os
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from PIL import Image
+
+from image_analyzer import alpha_bbox
+from instrumentation import span, count
+
+# 处理逻辑变化时递增使旧缓存失效
+OPTIMIZER_VERSION = 1
+
+# 少于该数量的图片需要编码时在当前进程处理（避免进程池启动开销）
+POOL_MIN_IMAGES = 4
+
+
+def default_options():
+    """默认优化配置"""
+    return {
+        'recompress': True,
+        'trim': False,
+        'scale': 1.0,
+    }
+
+
+def _png_bytes(img):
+    buffer = io.BytesIO()
+    img.save(buffer, format='PNG', optimize=True)
+    return buffer.getvalue()
+
+
+def optimize_png(data, options, uv_bbox=None):
+    """处理单张 PNG（进程池任务），返回 (新数据, 信息)
+
+    uv_bbox 为网格 UV 的归一化包围盒 (u0, v0, u1, v1)，裁剪时必须保留；
+    信息: {'size': 原尺寸, 'crop': 裁剪框 (x0, y0, x1, y1) 或 None, 'output_size': 输出尺寸, 'scaled': 是否缩小}
+    """
+    img = Image.open(io.BytesIO(data))
+    img.load()
+    width, height = img.size
+    info = {'size': [width, height], 'crop': None, 'output_size': [width, height], 'scaled': False}
+    changed = False
+
+    if options.get('trim') and options.get('trim_allowed', True):
+        bbox = alpha_bbox(img)
+        if bbox is None:
+            # 全透明图片保留 1 像素
+            bbox = (0, 0, 1, 1)
+        if uv_bbox is not None:
+            u0, v0, u1, v1 = uv_bbox
+            bbox = (min(bbox[0], max(0, math.floor(u0 * width))), min(bbox[1], max(0, math.floor(v0 * height))),
+                    max(bbox[2], min(width, math.ceil(u1 * width))), max(bbox[3], min(height, math.ceil(v1 * height))))
+        if tuple(bbox) != (0, 0, width, height):
+            img = img.crop(bbox)
+            info['crop'] = list(bbox)
+            changed = True
+
+    scale = options.get('scale', 1.0)
+    if scale < 1.0:
+        size = (max(1, round(img.width * scale)), max(1, round(img.height * scale)))
+        if size != img.size:
+            img = img.resize(size, Image.Resampling.LANCZOS)
+            info['scaled'] = True
+            changed = True
+    info['output_size'] = list(img.size)
+
+    if not changed and not options.get('recompress'):
+        return data, info
+    output = _png_bytes(img)
+    if not changed and len(output) >= len(data):
+        return data, info
+    return output, info
+
+
+def image_references(skins):
+    """统计皮肤中引用每张图片的附件类型 {图片文件名: [附件...]}，只处理 3.x 字典格式皮肤"""
+    references = {}
+    for skin in skins.values():
+        if not isinstance(skin, dict):
+            continue
+        for slot_attachments in skin.values():
+            for attach_name, attach_data in slot_attachments.items():
+                if not isinstance(attach_data, dict):
+                    continue
+                name = attach_data.get('path', attach_name) + ".png"
+                references.setdefault(name, []).append(attach_data)
+    return references
+
+
+def trim_constraint(attachments):
+    """根据引用图片的附件决定能否裁剪，返回 (能否裁剪, 网格 UV 包围盒)"""
+    uv_bbox = None
+    for attach_data in attachments:
+        attach_type = attach_data.get('type', 'region')
+        if attach_data.get('sequence') or attach_type not in ('region', 'mesh'):
+            return False, None
+        if attach_type == 'mesh':
+            uvs = attach_data.get('uvs', [])
+            if not uvs:
+                return False, None
+            us, vs = uvs[0::2], uvs[1::2]
+            box = (min(us), min(vs), max(us), max(vs))
+            uv_bbox = box if uv_bbox is None else (min(uv_bbox[0], box[0]), min(uv_bbox[1], box[1]),
+                                                   max(uv_bbox[2], box[2]), max(uv_bbox[3], box[3]))
+    return bool(attachments), uv_bbox
+
+
+def adjust_attachment(attach_data, info):
+    """按裁剪结果返回调整后的附件（新字典，原附件不修改）"""
+    crop = info.get('crop')
+    if not crop:
+        return attach_data
+    width, height = info['size']
+    x0, y0, x1, y1 = crop
+    crop_width, crop_height = x1 - x0, y1 - y0
+    attach_type = attach_data.get('type', 'region')
+    result = dict(attach_data)
+
+    if attach_type == 'region':
+        # 每像素对应的附件单位
+        unit_x = attach_data.get('width', width) / width
+        unit_y = attach_data.get('height', height) / height
+        # 裁剪框中心相对原图中心的偏移（图片 y 向下，Spine y 向上）
+        dx = ((x0 + x1) / 2 - width / 2) * unit_x * attach_data.get('scaleX', 1)
+        dy = (height / 2 - (y0 + y1) / 2) * unit_y * attach_data.get('scaleY', 1)
+        angle = math.radians(attach_data.get('rotation', 0))
+        result['x'] = attach_data.get('x', 0) + dx * math.cos(angle) - dy * math.sin(angle)
+        result['y'] = attach_data.get('y', 0) + dx * math.sin(angle) + dy * math.cos(angle)
+        result['width'] = crop_width * unit_x
+        result['height'] = crop_height * unit_y
+    elif attach_type == 'mesh':
+        uvs = attach_data.get('uvs', [])
+        result['uvs'] = [(u * width - x0) / crop_width if i % 2 == 0 else (u * height - y0) / crop_height
+                         for i, u in enumerate(uvs)]
+        if 'width' in attach_data:
+            result['width'] = attach_data['width'] * crop_width / width
+        if 'height' in attach_data:
+            result['height'] = attach_data['height'] * crop_height / height
+    return result
+
+
+class ImageOptimizer:
+    def __init__(self, cache_dir="cache/images", workers=None, max_bytes=1024 ** 3):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.workers = workers or os.cpu_count() or 1
+        self.max_bytes = max_bytes
+        # 源图片哈希 {(存储位置, 文件夹 MD5, 图片名): ((大小, 修改时间), sha256)}
+        self._source_hashes = {}
+
+    def _source_hash(self, storage, folder_md5, img_name):
+        key = (str(storage.root), folder_md5, img_name)
+        stat = storage.stat(folder_md5, img_name)
+        cached = self._source_hashes.get(key)
+        if cached and cached[0] == stat:
+            return cached[1], None
+        data = bytes(storage.read_bytes(folder_md5, img_name))
+        digest = hashlib.sha256(data).hexdigest()
+        self._source_hashes[key] = (stat, digest)
+        return digest, data
+
+    def _cache_key(self, source_hash, options, uv_bbox):
+        config = json.dumps([OPTIMIZER_VERSION, options, uv_bbox], sort_keys=True)
+        return f"{source_hash[:32]}_{hashlib.md5(config.encode()).hexdigest()[:12]}"
+
+    def _load(self, key):
+        try:
+            with open(self.cache_dir / f"{key}.json", 'r', encoding='utf-8') as f:
+                info = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return info if (self.cache_dir / f"{key}.png").exists() else None
+
+    def _store(self, key, data, info):
+        png_file = self.cache_dir / f"{key}.png"
+        tmp_file = png_file.with_suffix('.tmp')
+        try:
+            with open(tmp_file, 'wb') as f:
+                f.write(data)
+            tmp_file.replace(png_file)
+            with open(self.cache_dir / f"{key}.json", 'w', encoding='utf-8') as f:
+                json.dump(info, f)
+        except OSError as e:
+            print(f"[WARN] 无法写入图片优化缓存 {key}: {e}")
+
+    def run(self, images, output_dir, options=None, skins=None):
+        """处理 images [(存储, 文件夹 MD5, 图片名)]，写入 output_dir
+
+        skins 为合成后的皮肤（裁剪时用于判断能否裁剪）。
+        返回 (每张图片的信息 {图片名: 信息}, 报告)
+        """
+        output_dir = Path(output_dir)
+        options = dict(default_options(), **(options or {}))
+        references = image_references(skins) if options['trim'] and skins else {}
+        report = {'images': 0, 'bytes_before': 0, 'bytes_after': 0, 'saved': 0,
+                  'cache_hits': 0, 'encoded': 0, 'trimmed': 0, 'scaled': 0}
+        results = {}
+        jobs = []
+
+        with span('image_optimizer.lookup', images=len(images)):
+            for storage, folder_md5, img_name in images:
+                source_hash, data = self._source_hash(storage, folder_md5, img_name)
+                image_options = dict(options)
+                uv_bbox = None
+                if options['trim']:
+                    image_options['trim_allowed'], uv_bbox = trim_constraint(references.get(img_name, []))
+                key = self._cache_key(source_hash, image_options, uv_bbox)
+                report['images'] += 1
+                report['bytes_before'] += storage.stat(folder_md5, img_name)[0]
+                info = self._load(key)
+                if info is not None:
+                    report['cache_hits'] += 1
+                    results[img_name] = (key, info)
+                    continue
+                if data is None:
+                    data = bytes(storage.read_bytes(folder_md5, img_name))
+                jobs.append((img_name, key, data, image_options, uv_bbox))
+
+        if jobs:
+            with span('image_optimizer.encode', images=len(jobs)):
+                if len(jobs) < POOL_MIN_IMAGES or self.workers == 1:
+                    encoded = [optimize_png(data, opts, uv_bbox) for _, _, data, opts, uv_bbox in jobs]
+                else:
+                    with ProcessPoolExecutor(max_workers=min(self.workers, len(jobs))) as pool:
+                        encoded = list(pool.map(optimize_png, *zip(*[job[2:] for job in jobs])))
+            for (img_name, key, _, _, _), (data, info) in zip(jobs, encoded):
+                self._store(key, data, info)
+                results[img_name] = (key, info)
+                report['encoded'] += 1
+            count('image_optimizer.encoded', len(jobs))
+
+        infos = {}
+        for img_name, (key, info) in results.items():
+            dest = output_dir / img_name
+            # 输出可能是合成缓存的硬链接，先删除再复制
+            if dest.exists():
+                dest.unlink()
+            shutil.copyfile(self.cache_dir / f"{key}.png", dest)
+            report['bytes_after'] += dest.stat().st_size
+            report['trimmed'] += 1 if info.get('crop') else 0
+            report['scaled'] += 1 if info['scaled'] else 0
+            infos[img_name] = info
+        report['saved'] = report['bytes_before'] - report['bytes_after']
+        self.evict()
+        return infos, report
+
+    def apply_crops(self, skins, image_infos):
+        """裁剪透明边后调整引用这些图片的附件（皮肤的插槽字典须为本次合成新建的），返回调整数量"""
+        adjusted = 0
+        for skin in skins.values():
+            if not isinstance(skin, dict):
+                continue
+            for slot_attachments in skin.values():
+                for attach_name, attach_data in slot_attachments.items():
+                    if not isinstance(attach_data, dict):
+                        continue
+                    info = image_infos.get(attach_data.get('path', attach_name) + ".png")
+                    if info and info.get('crop'):
+                        slot_attachments[attach_name] = adjust_attachment(attach_data, info)
+                        adjusted += 1
+        return adjusted
+
+    def evict(self):
+        """缓存超过 max_bytes 时按修改时间删除最旧的条目，返回删除数量"""
+        entries = []
+        total = 0
+        for png_file in self.cache_dir.glob("*.png"):
+            st = png_file.stat()
+            entries.append((st.st_mtime, st.st_size, png_file))
+            total += st.st_size
+        removed = 0
+        for _, size, png_file in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            png_file.unlink()
+            png_file.with_suffix('.json').unlink(missing_ok=True)
+            total -= size
+            removed += 1
+        return removed
+
+    def clear(self):
+        for cache_file in list(self.cache_dir.glob("*.png")) + list(self.cache_dir.glob("*.json")):
+            cache_file.unlink()
+
+
+def format_report(report):
+    """格式化优化报告"""
+    saved_percent = report['saved'] * 100 / report['bytes_before'] if report['bytes_before'] else 0
+    return (f"图片优化: {report['images']} 张, {report['bytes_before']} -> {report['bytes_after']} 字节 "
+            f"(节省 {report['saved']} 字节, {saved_percent:.1f}%), 重新编码 {report['encoded']}, "
+            f"缓存命中 {report['cache_hits']}, 裁剪 {report['trimmed']}, 缩小 {report['scaled']}")
+
+
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) < 2:
+        print("用法: python image_optimizer.py <图片.png> [--trim] [--scale 0.5]")
+        sys.exit(1)
+    opts = default_options()
+    opts['trim'] = '--trim' in sys.argv
+    if '--scale' in sys.argv:
+        opts['scale'] = float(sys.argv[sys.argv.index('--scale') + 1])
+    source = Path(sys.argv[1]).read_bytes()
+    output, result = optimize_png(source, opts)
+    print(f"{len(source)} -> {len(output)} 字节, {result}")
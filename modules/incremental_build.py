@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+增量合成模块 - 记录每个输出目录上次合成的状态，再次合成时只重做变化的部分
+
+Composition 按 MD5 记录每套服装的贡献：
+  - 编译结果（骨骼、插槽、附件、图片列表），源文件未变化时直接复用
+  - 输出目录中的每张图片来自哪个 MD5 / 动作目录，只复制来源变化或输出被改动的图片，
+    删除已移除服装的图片
+  - 皮肤中每个插槽序列化后的文本，附件对象不变时直接复用
+  - 输出文件的 SHA-256（清单），文件未变化时不重新计算
+骨骼和插槽（绘制顺序）仍由各服装的编译结果按合并顺序组合（只是字典操作），
+输出与完整合成逐字节相同。
+"""
+
+import json
+from collections import OrderedDict
+
+from outfit_cache import source_stamp
+from instrumentation import span, count
+
+# 保留状态的输出目录数量
+MAX_COMPOSITIONS = 8
+
+
+def _file_stat(path):
+    try:
+        st = path.stat()
+    except OSError:
+        return None
+    return st.st_size, st.st_mtime_ns
+
+
+def _indent(text, depth):
+    return text.replace('\n', '\n' + '  ' * depth)
+
+
+def _key(name):
+    return json.dumps(name, ensure_ascii=False)
+
+
+class Composition:
+    """一个输出目录上次合成的状态"""
+
+    def __init__(self):
+        # {MD5: (指纹, 类型, 源文件标记, 编译结果)}
+        self.outfits = {}
+        # {图片名: (来源, 源文件 (大小, 修改时间), 输出文件 (大小, 修改时间))}
+        self.images = {}
+        # {(皮肤名, 插槽名): (附件 (名称, 对象) 元组, 序列化文本)}
+        self.skin_texts = {}
+        # 清单用的已知文件哈希 {文件名: ((大小, 修改时间), sha256)}
+        self.file_hashes = {}
+        # 最近一次合成的复用情况
+        self.last_stats = {}
+
+    # ==================== 服装 ====================
+
+    def outfit(self, md5_hash, folder_path, clothing_type, fingerprint, compile_outfit):
+        """返回服装的编译结果，源文件未变化时复用上次的结果，否则调用 compile_outfit()"""
+        stamp = source_stamp(folder_path)
+        cached = self.outfits.get(md5_hash)
+        if cached and cached[0] == fingerprint and cached[1] == clothing_type and cached[2] == stamp:
+            self.last_stats['reused_outfits'] = self.last_stats.get('reused_outfits', 0) + 1
+            return cached[3]
+        compiled = compile_outfit()
+        if compiled is not None:
+            self.outfits[md5_hash] = (fingerprint, clothing_type, stamp, compiled)
+        return compiled
+
+    def retain(self, md5_hashes):
+        """丢弃不再选中的服装"""
+        for md5_hash in [m for m in self.outfits if m not in md5_hashes]:
+            del self.outfits[md5_hash]
+
+    # ==================== 图片 ====================
+
+    def sync_images(self, sources, output_dir):
+        """sources 为按复制顺序排列的 [(来源, 存储, 文件夹 MD5, 图片名)]，同名图片后者覆盖前者
+
+        只复制来源或源文件变化、输出文件缺失或被改动的图片，删除本状态复制过但已不再需要的图片，
+        返回复制的数量
+        """
+        desired = {}
+        for owner, storage, folder_md5, img_name in sources:
+            desired[img_name] = (owner, storage, folder_md5)
+
+        copied = 0
+        for img_name, (owner, storage, folder_md5) in desired.items():
+            dest = output_dir / img_name
+            source_stat = storage.stat(folder_md5, img_name)
+            previous = self.images.get(img_name)
+            if previous and previous[0] == owner and previous[1] == source_stat and previous[2] == _file_stat(dest):
+                continue
+            with span('file.copy'):
+                storage.copy_to(folder_md5, img_name, dest)
+            count('file.copy')
+            copied += 1
+            self.images[img_name] = (owner, source_stat, _file_stat(dest))
+
+        removed = self._remove_stale(desired, output_dir)
+        self.last_stats.update(copied_images=copied, reused_images=len(desired) - copied, removed_images=removed)
+        return copied
+
+    def release_images(self, img_names, output_dir):
+        """图片改由其他阶段（图片优化）写入：删除不再需要的图片，不再跟踪其余图片"""
+        removed = self._remove_stale(img_names, output_dir)
+        # 仍记录归属以便之后删除，来源为 None 时下次增量复制会重新写入
+        self.images = {img_name: (None, None, None) for img_name in img_names}
+        self.last_stats['removed_images'] = removed
+
+    def _remove_stale(self, img_names, output_dir):
+        """删除本状态复制过但不在 img_names 中的图片（已移除服装的图片），返回删除数量"""
+        removed = 0
+        for img_name in [name for name in self.images if name not in img_names]:
+            del self.images[img_name]
+            path = output_dir / img_name
+            if path.exists():
+                path.unlink()
+                removed += 1
+        return removed
+
+    # ==================== 序列化 ====================
+
+    def _dumps_skin(self, skin_name, skin, used):
+        entries = []
+        reused = 0
+        for slot_name, attachments in skin.items():
+            cache_key = (skin_name, slot_name)
+            text = None
+            if isinstance(attachments, dict):
+                objects = tuple(attachments.items())
+                cached = self.skin_texts.get(cache_key)
+                if (cached and len(cached[0]) == len(objects)
+                        and all(a[0] == b[0] and a[1] is b[1] for a, b in zip(cached[0], objects))):
+                    text = cached[1]
+                    reused += 1
+            if text is None:
+                text = _indent(json.dumps(attachments, indent=2, ensure_ascii=False), 3)
+            if isinstance(attachments, dict):
+                # 保存附件对象的引用，保证对象不被回收后 is 比较仍然可靠
+                used[cache_key] = (objects, text)
+            entries.append(f'      {_key(slot_name)}: {text}')
+        self.last_stats['reused_skin_slots'] = self.last_stats.get('reused_skin_slots', 0) + reused
+        return '{\n' + ',\n'.join(entries) + '\n    }'
+
+    def dumps(self, spine_data):
+        """与 json.dumps(spine_data, indent=2, ensure_ascii=False) 结果相同，皮肤插槽的文本按附件对象复用"""
+        used = {}
+        entries = []
+        for key, value in spine_data.items():
+            if key == 'skins' and isinstance(value, dict) and value:
+                skin_entries = []
+                for skin_name, skin in value.items():
+                    if isinstance(skin, dict) and skin:
+                        text = self._dumps_skin(skin_name, skin, used)
+                    else:
+                        text = _indent(json.dumps(skin, indent=2, ensure_ascii=False), 2)
+                    skin_entries.append(f'    {_key(skin_name)}: {text}')
+                text = '{\n' + ',\n'.join(skin_entries) + '\n  }'
+            else:
+                text = _indent(json.dumps(value, indent=2, ensure_ascii=False), 1)
+            entries.append(f'  {_key(key)}: {text}')
+        self.skin_texts = used
+        if not entries:
+            return '{}'
+        return '{\n' + ',\n'.join(entries) + '\n}'
+
+
+class CompositionStore:
+    """按输出目录保存 Composition，超出数量时淘汰最久未用的"""
+
+    def __init__(self, max_entries=MAX_COMPOSITIONS):
+        self._compositions = OrderedDict()
+        self.max_entries = max_entries
+
+    def get(self, output_dir):
+        key = str(output_dir.resolve())
+        composition = self._compositions.get(key)
+        if composition is None:
+            composition = self._compositions[key] = Composition()
+        self._compositions.move_to_end(key)
+        while len(self._compositions) > self.max_entries:
+            self._compositions.popitem(last=False)
+        composition.last_stats = {}
+        return composition
+
+    def discard(self, output_dir):
+        self._compositions.pop(str(output_dir.resolve()), None)
+
+    def clear(self):
+        self._compositions.clear()
@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+性能埋点模块 - 命名计时区间、计数器、直方图，导出 JSON 或 Chrome trace
+
+通过环境变量开启（未开启时 span 返回空操作对象，几乎没有开销）：
+    SDM_TRACE=1                 开启计时
+    SDM_TRACE_FILE=trace.json   导出文件（默认 sdm_trace.json，程序退出时写入）
+    SDM_TRACE_FORMAT=chrome     导出格式 chrome（chrome://tracing / Perfetto）或 json（汇总）
+    SDM_DEBUG=1                 输出 [DEBUG] 日志
+"""
+
+import atexit
+import functools
+import json
+import os
+import threading
+import time
+
+# 直方图分桶上限（毫秒）
+HISTOGRAM_BUCKETS_MS = (0.1, 0.5, 1, 5, 10, 50, 100, 500, 1000, 5000)
+
+# 最多保留的区间事件数，超出后只更新直方图
+MAX_EVENTS = 1000000
+
+
+class _NullSpan:
+    """未开启时的空操作区间"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def set(self, **args):
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    __slots__ = ('tracer', 'name', 'args', 'start')
+
+    def __init__(self, tracer, name, args):
+        self.tracer = tracer
+        self.name = name
+        self.args = args
+        self.start = 0
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        end = time.perf_counter_ns()
+        if exc_type is not None:
+            self.args = dict(self.args or {}, error=exc_type.__name__)
+        self.tracer._record(self.name, self.start, end, self.args)
+        return False
+
+    def set(self, **args):
+        """给区间追加参数（如处理数量）"""
+        self.args = dict(self.args or {}, **args)
+
+
+class Tracer:
+    def __init__(self):
+        self.enabled = False
+        self.debug_enabled = False
+        self.trace_file = None
+        self.trace_format = 'chrome'
+        self._lock = threading.Lock()
+        self._origin = time.perf_counter_ns()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.events = []
+            self.counters = {}
+            self.histograms = {}
+
+    def enable(self, trace_file=None, trace_format=None):
+        self.enabled = True
+        if trace_file:
+            self.trace_file = trace_file
+        if trace_format:
+            self.trace_format = trace_format
+
+    def disable(self):
+        self.enabled = False
+
+    # ==================== 记录 ====================
+
+    def span(self, name, **args):
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, name, args or None)
+
+    def count(self, name, value=1):
+        if not self.enabled:
+            return
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def _record(self, name, start, end, args):
+        duration_ms = (end - start) / 1e6
+        with self._lock:
+            hist = self.histograms.get(name)
+            if hist is None:
+                hist = self.histograms[name] = {
+                    'count': 0, 'total_ms': 0.0, 'min_ms': duration_ms, 'max_ms': duration_ms,
+                    'buckets': [0] * (len(HISTOGRAM_BUCKETS_MS) + 1),
+                }
+            hist['count'] += 1
+            hist['total_ms'] += duration_ms
+            hist['min_ms'] = min(hist['min_ms'], duration_ms)
+            hist['max_ms'] = max(hist['max_ms'], duration_ms)
+            for i, bound in enumerate(HISTOGRAM_BUCKETS_MS):
+                if duration_ms <= bound:
+                    hist['buckets'][i] += 1
+                    break
+            else:
+                hist['buckets'][-1] += 1
+
+            if len(self.events) < MAX_EVENTS:
+                self.events.append((name, start, end, threading.get_ident(), args))
+
+    # ==================== 导出 ====================
+
+    def summary(self):
+        """汇总：计数器和各区间的直方图"""
+        with self._lock:
+            histograms = {}
+            for name, hist in self.histograms.items():
+                histograms[name] = dict(hist, mean_ms=hist['total_ms'] / hist['count'],
+                                        bucket_bounds_ms=list(HISTOGRAM_BUCKETS_MS))
+            return {'counters': dict(self.counters), 'histograms': histograms}
+
+    def chrome_trace(self):
+        """Chrome trace 事件格式（时间单位微秒）"""
+        pid = os.getpid()
+        with self._lock:
+            events = [{
+                'name': name, 'cat': name.split('.')[0], 'ph': 'X', 'pid': pid, 'tid': tid,
+                'ts': (start - self._origin) / 1000, 'dur': (end - start) / 1000,
+                'args': args or {},
+            } for name, start, end, tid, args in self.events]
+            counter_ts = (time.perf_counter_ns() - self._origin) / 1000
+            for name, value in self.counters.items():
+                events.append({'name': name, 'ph': 'C', 'pid': pid, 'ts': counter_ts, 'args': {'value': value}})
+        return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+    def export(self, path=None, trace_format=None):
+        """写出 trace 文件，返回路径"""
+        path = path or self.trace_file or 'sdm_trace.json'
+        trace_format = trace_format or self.trace_format
+        if trace_format == 'chrome':
+            data = self.chrome_trace()
+        else:
+            data = self.summary()
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False)
+        return path
+
+
+tracer = Tracer()
+
+
+def span(name, **args):
+    """计时区间：with span('db.query', sql='...'): ..."""
+    if not tracer.enabled:
+        return _NULL_SPAN
+    return _Span(tracer, name, args or None)
+
+
+def count(name, value=1):
+    """累加计数器"""
+    if tracer.enabled:
+        tracer.count(name, value)
+
+
+def traced(name):
+    """函数装饰器：整个调用作为一个区间"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not tracer.enabled:
+                return func(*args, **kwargs)
+            with _Span(tracer, name, None):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def debug(message, *args):
+    """[DEBUG] 日志，未开启时不做格式化"""
+    if tracer.debug_enabled:
+        print("[DEBUG] " + (message % args if args else message))
+
+
+def _env_flag(name):
+    return os.environ.get(name, '').lower() not in ('', '0', 'false', 'no', 'off')
+
+
+def _configure_from_env():
+    tracer.debug_enabled = _env_flag('SDM_DEBUG')
+    if _env_flag('SDM_TRACE'):
+        tracer.enable(os.environ.get('SDM_TRACE_FILE', 'sdm_trace.json'),
+                      os.environ.get('SDM_TRACE_FORMAT', 'chrome'))
+        atexit.register(_export_at_exit)
+
+
+def _export_at_exit():
+    if tracer.events or tracer.counters:
+        tracer.export()
+
+
+_configure_from_env()
+
+
+if __name__ == "__main__":
+    tracer.enable()
+    for i in range(3):
+        with span('demo.sleep', index=i):
+            time.sleep(0.01)
+        count('demo.items')
+    print(json.dumps(tracer.summary(), indent=2))
@@ -0,0 +1,344 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+JSON 精简模块 - 浮点精度量化、去除默认值、删除冗余关键帧
+"""
+
+import json
+import math
+import time
+
+# 字段精度（小数位数），未列出的字段使用 default
+DEFAULT_PRECISION = {
+    'default': 3,
+    'vertices': 3,
+    'uvs': 5,
+    'time': 4,
+    'angle': 2,
+    'rotation': 2,
+    'value': 3,
+    'scaleX': 4,
+    'scaleY': 4,
+    'x': 2,
+    'y': 2,
+    'c1': 4, 'c2': 4, 'c3': 4, 'c4': 4,
+    'curve': 4,
+    'mix': 4,
+}
+
+# 骨骼 / 插槽 / 区域附件的默认值（与 Spine 读取时的默认值一致）
+BONE_DEFAULTS = {
+    'x': 0, 'y': 0, 'rotation': 0, 'scaleX': 1, 'scaleY': 1,
+    'shearX': 0, 'shearY': 0, 'length': 0, 'transform': 'normal', 'inherit': 'normal',
+}
+SLOT_DEFAULTS = {'color': 'ffffffff', 'blend': 'normal'}
+REGION_DEFAULTS = {'x': 0, 'y': 0, 'rotation': 0, 'scaleX': 1, 'scaleY': 1, 'color': 'ffffffff'}
+MESH_DEFAULTS = {'color': 'ffffffff'}
+
+# 关键帧中不参与数值比较的字段
+KEY_META_FIELDS = ('time', 'curve', 'c2', 'c3', 'c4')
+
+
+def default_options():
+    """默认量化配置"""
+    return {
+        'precision': dict(DEFAULT_PRECISION),
+        'strip_defaults': True,
+        'drop_redundant_keys': True,
+        'indent': None,
+    }
+
+
+class JsonQuantizer:
+    def __init__(self, options=None):
+        self.options = default_options()
+        if options:
+            self.options.update(options)
+            if 'precision' in options:
+                self.options['precision'] = dict(DEFAULT_PRECISION, **options['precision'])
+        self.precision = self.options['precision']
+        self.dropped_keys = 0
+
+    # ==================== 数值 ====================
+
+    def _round(self, value, field):
+        digits = self.precision.get(field, self.precision['default'])
+        rounded = round(value, digits)
+        if rounded == int(rounded):
+            return int(rounded)
+        return rounded
+
+    def _quantize(self, value, field):
+        """递归量化，返回新对象（不修改原数据）"""
+        if isinstance(value, float):
+            if math.isnan(value) or math.isinf(value):
+                return value
+            return self._round(value, field)
+        if isinstance(value, dict):
+            return {k: self._quantize(v, k) for k, v in value.items()}
+        if isinstance(value, list):
+            return [self._quantize(v, field) for v in value]
+        return value
+
+    # ==================== 默认值 ====================
+
+    def _strip(self, data, defaults):
+        return {k: v for k, v in data.items() if not (k in defaults and v == defaults[k])}
+
+    def _strip_defaults(self, spine_data):
+        if 'bones' in spine_data:
+            spine_data['bones'] = [self._strip(b, BONE_DEFAULTS) for b in spine_data['bones']]
+        if 'slots' in spine_data:
+            spine_data['slots'] = [self._strip(s, SLOT_DEFAULTS) for s in spine_data['slots']]
+
+        skins = spine_data.get('skins', {})
+        skin_list = skins.values() if isinstance(skins, dict) else [s.get('attachments', {}) for s in skins]
+        for skin in skin_list:
+            for slot_attachments in skin.values():
+                for attach_name, attach_data in slot_attachments.items():
+                    attach_type = attach_data.get('type', 'region')
+                    if attach_type == 'region':
+                        slot_attachments[attach_name] = self._strip(attach_data, REGION_DEFAULTS)
+                    elif attach_type in ('mesh', 'linkedmesh'):
+                        slot_attachments[attach_name] = self._strip(attach_data, MESH_DEFAULTS)
+
+    # ==================== 关键帧 ====================
+
+    def _key_values(self, key):
+        return {k: v for k, v in key.items() if k not in KEY_META_FIELDS}
+
+    def _is_linear(self, key):
+        return 'curve' not in key or key['curve'] == 'linear'
+
+    def _collinear(self, prev, key, nxt):
+        """线性插值下 key 是否可由前后关键帧插值得到（在量化精度内）"""
+        if not (self._is_linear(prev) and self._is_linear(key)):
+            return False
+        t0, t1, t2 = prev.get('time', 0), key.get('time', 0), nxt.get('time', 0)
+        if t2 <= t0:
+            return False
+        ratio = (t1 - t0) / (t2 - t0)
+        values = self._key_values(key)
+        prev_values, next_values = self._key_values(prev), self._key_values(nxt)
+        if set(values) != set(prev_values) or set(values) != set(next_values):
+            return False
+        for field, value in values.items():
+            a, b = prev_values[field], next_values[field]
+            if not all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in (a, value, b)):
+                return False
+            tolerance = 0.5 * 10 ** -self.precision.get(field, self.precision['default'])
+            if abs(a + (b - a) * ratio - value) > tolerance:
+                return False
+        return True
+
+    def _drop_redundant(self, keys, discrete=False):
+        """删除冗余关键帧
+
+        - 与前后关键帧数值完全相同的中间帧（任何曲线下都是常量）
+        - 线性插值下可由前后帧插值得到的中间帧
+        - 离散时间轴（attachment）中与前一帧相同的帧
+        """
+        if len(keys) < 2 or not all(isinstance(k, dict) for k in keys):
+            return keys
+        result = [keys[0]]
+        # 自上一个保留帧以来已删除的帧，删除新帧时需要一并重新检查
+        pending = []
+        for i in range(1, len(keys)):
+            key = keys[i]
+            prev = result[-1]
+            if discrete:
+                if self._key_values(key) == self._key_values(prev):
+                    self.dropped_keys += 1
+                    continue
+                result.append(key)
+                continue
+            if i == len(keys) - 1:
+                result.append(key)
+                continue
+            nxt = keys[i + 1]
+            if all(self._redundant(prev, k, nxt) for k in pending + [key]):
+                pending.append(key)
+                self.dropped_keys += 1
+                continue
+            pending = []
+            result.append(key)
+        return result
+
+    def _redundant(self, prev, key, nxt):
+        values = self._key_values(key)
+        if values == self._key_values(prev) and values == self._key_values(nxt):
+            return True
+        return self._collinear(prev, key, nxt)
+
+    def _drop_redundant_keys(self, spine_data):
+        for anim_data in spine_data.get('animations', {}).values():
+            for group in ('bones', 'slots'):
+                for target_name, timelines in anim_data.get(group, {}).items():
+                    for timeline_name, keys in list(timelines.items()):
+                        if isinstance(keys, list):
+                            timelines[timeline_name] = self._drop_redundant(keys, discrete=timeline_name == 'attachment')
+            for group in ('ik', 'transform'):
+                timelines = anim_data.get(group)
+                if isinstance(timelines, dict):
+                    for name, keys in list(timelines.items()):
+                        if isinstance(keys, list):
+                            timelines[name] = self._drop_redundant(keys)
+            for by_slot in anim_data.get('deform', {}).values():
+                for by_attachment in by_slot.values():
+                    for attach_name, keys in list(by_attachment.items()):
+                        by_attachment[attach_name] = self._drop_redundant(keys)
+
+    # ==================== 对外接口 ====================
+
+    def quantize(self, spine_data):
+        """返回量化后的新文档"""
+        self.dropped_keys = 0
+        result = self._quantize(spine_data, None)
+        # 保持 skeleton 等字段原样（hash、版本号等字符串不受影响）
+        if self.options['strip_defaults']:
+            self._strip_defaults(result)
+        if self.options['drop_redundant_keys']:
+            self._drop_redundant_keys(result)
+        return result
+
+    def dumps(self, spine_data):
+        """按配置序列化（indent=None 时使用紧凑分隔符）"""
+        indent = self.options['indent']
+        separators = (',', ':') if indent is None else None
+        return json.dumps(spine_data, indent=indent, separators=separators, ensure_ascii=False)
+
+
+# ==================== 等效性检查 ====================
+
+def _sample(keys, t, field):
+    """在时间 t 采样关键帧（stepped 取前一帧，其余按线性近似）"""
+    prev = None
+    for key in keys:
+        if key.get('time', 0) >= t:
+            if prev is None or key.get('time', 0) == t:
+                return key.get(field)
+            if prev.get('curve') == 'stepped':
+                return prev.get(field)
+            a, b = prev.get(field), key.get(field)
+            if not isinstance(a, (int, float)) or not isinstance(b, (int, float)):
+                return a
+            t0, t1 = prev.get('time', 0), key.get('time', 0)
+            return a + (b - a) * (t - t0) / (t1 - t0)
+        prev = key
+    return prev.get(field) if prev else None
+
+
+def check_equivalence(original, quantized, options=None, path=''):
+    """检查量化结果与原文档在容差内等效，返回问题列表
+
+    数值按字段精度比较；被去除的字段按默认值比较；被删除的关键帧在量化后的时间轴上采样比较。
+    """
+    quantizer = JsonQuantizer(options)
+    problems = []
+
+    def tolerance(field):
+        digits = quantizer.precision.get(field, quantizer.precision['default'])
+        return 0.5 * 10 ** -digits + 1e-9
+
+    def defaults_for(path):
+        if path.startswith('/bones/'):
+            return BONE_DEFAULTS
+        if path.startswith('/slots/'):
+            return SLOT_DEFAULTS
+        if path.startswith('/skins/'):
+            return dict(REGION_DEFAULTS, **MESH_DEFAULTS)
+        return {}
+
+    def compare(a, b, field, path):
+        if isinstance(a, bool) or isinstance(b, bool):
+            if a != b:
+                problems.append(f"{path}: {a} != {b}")
+        elif isinstance(a, (int, float)) and isinstance(b, (int, float)):
+            if abs(a - b) > tolerance(field):
+                problems.append(f"{path}: {a} != {b}")
+        elif isinstance(a, dict) and isinstance(b, dict):
+            defaults = defaults_for(path)
+            for k, v in a.items():
+                if k in b:
+                    compare(v, b[k], k, f"{path}/{k}")
+                elif k in defaults:
+                    compare(v, defaults[k], k, f"{path}/{k}")
+                else:
+                    problems.append(f"{path}/{k}: 缺失")
+        elif isinstance(a, list) and isinstance(b, list):
+            if len(a) == len(b):
+                for i, (x, y) in enumerate(zip(a, b)):
+                    compare(x, y, field, f"{path}/{i}")
+            elif '/animations/' in path and all(isinstance(k, dict) for k in a + b):
+                # 关键帧被删除：在量化后的时间轴上采样
+                for key in a:
+                    for k, v in key.items():
+                        if k in KEY_META_FIELDS:
+                            continue
+                        sampled = _sample(b, key.get('time', 0), k)
+                        compare(v, sampled, k, f"{path}@{key.get('time', 0)}/{k}")
+            else:
+                problems.append(f"{path}: 长度 {len(a)} != {len(b)}")
+        elif a != b:
+            problems.append(f"{path}: {a!r} != {b!r}")
+
+    compare(original, quantized, None, path)
+    return problems
+
+
+def benchmark(spine_data, options=None, repeat=5):
+    """对比原始输出（indent=2）与量化输出的大小和解析耗时"""
+    original_text = json.dumps(spine_data, indent=2, ensure_ascii=False)
+    quantizer = JsonQuantizer(options)
+
+    start = time.perf_counter()
+    quantized = quantizer.quantize(spine_data)
+    quantize_time = time.perf_counter() - start
+    quantized_text = quantizer.dumps(quantized)
+
+    def parse_time(text):
+        best = None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            json.loads(text)
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        return best
+
+    original_bytes = len(original_text.encode('utf-8'))
+    quantized_bytes = len(quantized_text.encode('utf-8'))
+    return {
+        'original_bytes': original_bytes,
+        'quantized_bytes': quantized_bytes,
+        'ratio': original_bytes / quantized_bytes if quantized_bytes else 0,
+        'original_parse_ms': parse_time(original_text) * 1000,
+        'quantized_parse_ms': parse_time(quantized_text) * 1000,
+        'quantize_ms': quantize_time * 1000,
+        'dropped_keys': quantizer.dropped_keys,
+        'problems': check_equivalence(spine_data, quantized, options),
+    }
+
+
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) < 2:
+        print("用法: python json_quantizer.py <输入.json> [输出.json]")
+        sys.exit(1)
+
+    with open(sys.argv[1], 'r', encoding='utf-8') as f:
+        spine_data = json.load(f)
+
+    result = benchmark(spine_data)
+    print(f"大小: {result['original_bytes']} -> {result['quantized_bytes']} 字节 ({result['ratio']:.2f}x)")
+    print(f"解析: {result['original_parse_ms']:.2f} ms -> {result['quantized_parse_ms']:.2f} ms")
+    print(f"删除关键帧: {result['dropped_keys']}")
+    problem_count = len(result['problems'])
+    print(f"等效性检查: {'通过' if not problem_count else f'{problem_count} 个问题'}")
+    for problem in result['problems'][:20]:
+        print(f"  {problem}")
+
+    if len(sys.argv) > 2:
+        quantizer = JsonQuantizer()
+        with open(sys.argv[2], 'w', encoding='utf-8') as f:
+            f.write(quantizer.dumps(quantizer.quantize(spine_data)))
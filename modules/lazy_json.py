@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+惰性 JSON 文档模块 - mmap 读取，只索引对象成员的字节区间，按需解析单个成员
+
+扫描时用 find 跳过数值数组等内容，只有字符串和括号的位置会回到 Python，
+因此对 mesh 顶点很多的 dress.json / action.json，索引远快于完整 json.load。
+"""
+
+import json
+import mmap
+import re
+from collections.abc import Mapping
+
+_STRING = re.compile(rb'"[^"\\]*(?:\\.[^"\\]*)*"')
+_SCALAR = re.compile(rb'[^,}\]\s]*')
+_WS = re.compile(rb'[ \t\r\n]*')
+
+_OPEN_BRACE = ord('{')
+_OPEN_BRACKET = ord('[')
+_QUOTE = ord('"')
+_COLON = ord(':')
+_COMMA = ord(',')
+_CLOSE_BRACE = ord('}')
+
+# 跳过容器时追踪的结构字符：引号、左括号、右括号
+_STRUCTURAL = (b'"', b'{', b'[', b'}', b']')
+
+
+class LazyJsonError(ValueError):
+    """文档结构不是合法的 JSON 对象"""
+
+
+def _skip_ws(buf, pos):
+    return _WS.match(buf, pos).end()
+
+
+def _peek(buf, pos):
+    if pos >= len(buf):
+        raise LazyJsonError("文档意外结束")
+    return buf[pos]
+
+
+def skip_value(buf, pos):
+    """返回从 pos 开始的 JSON 值的结束位置（不解析内容）"""
+    first = _peek(buf, pos)
+    if first == _QUOTE:
+        return _string_end(buf, pos)
+    if first == _OPEN_BRACE or first == _OPEN_BRACKET:
+        return _skip_container(buf, pos)
+    return _SCALAR.match(buf, pos).end()
+
+
+def _string_end(buf, pos):
+    """pos 为开引号，返回闭引号之后的位置"""
+    find = buf.find
+    end = find(b'"', pos + 1)
+    while end != -1:
+        backslashes = 0
+        while buf[end - 1 - backslashes] == 0x5c:
+            backslashes += 1
+        if backslashes % 2 == 0:
+            return end + 1
+        end = find(b'"', end + 1)
+    raise LazyJsonError(f"字符串未结束 (位置 {pos})")
+
+
+def _skip_container(buf, pos):
+    """跳过 pos 处的对象或数组
+
+    分别用 find（memchr）查找每种结构字符的下一个位置，只在这些位置回到 Python，
+    数值和空白整段跳过。
+    """
+    find = buf.find
+    size = len(buf)
+    next_pos = []
+    for char in _STRUCTURAL:
+        found = find(char, pos)
+        next_pos.append(found if found != -1 else size)
+
+    depth = 0
+    while True:
+        at = min(next_pos)
+        if at >= size:
+            raise LazyJsonError(f"括号未闭合 (位置 {pos})")
+        kind = next_pos.index(at)
+        if kind == 0:
+            # 字符串内的括号不计入，跳过后刷新落在字符串内的位置
+            cursor = _string_end(buf, at)
+            for i, found in enumerate(next_pos):
+                if found < cursor:
+                    found = find(_STRUCTURAL[i], cursor)
+                    next_pos[i] = found if found != -1 else size
+            continue
+        if kind <= 2:
+            depth += 1
+        else:
+            depth -= 1
+            if depth == 0:
+                return at + 1
+        found = find(_STRUCTURAL[kind], at + 1)
+        next_pos[kind] = found if found != -1 else size
+
+
+def index_object(buf, start):
+    """索引 start 处对象的直接成员，返回 {键: (值起点, 值终点)}"""
+    if _peek(buf, start) != _OPEN_BRACE:
+        raise LazyJsonError(f"位置 {start} 不是 JSON 对象")
+    members = {}
+    pos = _skip_ws(buf, start + 1)
+    if _peek(buf, pos) == _CLOSE_BRACE:
+        return members
+    while True:
+        m = _STRING.match(buf, pos)
+        if m is None:
+            raise LazyJsonError(f"位置 {pos} 应为键名")
+        key = json.loads(bytes(buf[m.start():m.end()]))
+        pos = _skip_ws(buf, m.end())
+        if _peek(buf, pos) != _COLON:
+            raise LazyJsonError(f"位置 {pos} 应为 ':'")
+        value_start = _skip_ws(buf, pos + 1)
+        value_end = skip_value(buf, value_start)
+        members[key] = (value_start, value_end)
+        pos = _skip_ws(buf, value_end)
+        separator = _peek(buf, pos)
+        if separator == _COMMA:
+            pos = _skip_ws(buf, pos + 1)
+        elif separator == _CLOSE_BRACE:
+            return members
+        else:
+            raise LazyJsonError(f"位置 {pos} 应为 ',' 或 '}}'")
+
+
+class LazyObject(Mapping):
+    """只读的惰性 JSON 对象：首次访问时索引成员，取值时才解析该成员（结果缓存）"""
+
+    def __init__(self, buf, start):
+        self._buf = buf
+        self._start = start
+        self._members = None
+        self._values = {}
+
+    @property
+    def members(self):
+        if self._members is None:
+            self._members = index_object(self._buf, self._start)
+        return self._members
+
+    def __getitem__(self, key):
+        if key in self._values:
+            return self._values[key]
+        start, end = self.members[key]
+        value = json.loads(bytes(self._buf[start:end]))
+        self._values[key] = value
+        return value
+
+    def __iter__(self):
+        return iter(self.members)
+
+    def __len__(self):
+        return len(self.members)
+
+    def __contains__(self, key):
+        return key in self.members
+
+    def raw(self, key):
+        """成员的原始字节"""
+        start, end = self.members[key]
+        return bytes(self._buf[start:end])
+
+    def child(self, key):
+        """返回对象类型成员的 LazyObject（不存在或不是对象时返回 None）"""
+        span = self.members.get(key)
+        if span is None or self._buf[span[0]] != _OPEN_BRACE:
+            return None
+        return LazyObject(self._buf, span[0])
+
+    def materialize(self):
+        """解析为普通 dict"""
+        return {key: self[key] for key in self.members}
+
+
+class LazyJsonDocument(LazyObject):
+    """惰性 JSON 文档，根节点必须是对象
+
+    with LazyJsonDocument.open(path) as doc:
+        clothing_type = doc.get('type')
+        for slot_name in doc.child('attachments'): ...
+    """
+
+    def __init__(self, buf, close=None):
+        self._close = close
+        start = _skip_ws(buf, 0) if len(buf) else 0
+        if not len(buf) or buf[start] != _OPEN_BRACE:
+            raise LazyJsonError("文档根节点不是 JSON 对象")
+        super().__init__(buf, start)
+
+    @classmethod
+    def open(cls, path):
+        """mmap 打开文件（空文件按空文档报错）"""
+        f = open(path, 'rb')
+        try:
+            buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            f.close()
+            raise LazyJsonError(f"空文件: {path}")
+
+        def close():
+            buf.close()
+            f.close()
+        try:
+            return cls(buf, close)
+        except LazyJsonError:
+            close()
+            raise
+
+    def close(self):
+        self._values = {}
+        if self._close is not None:
+            self._close()
+            self._close = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+
+if __name__ == "__main__":
+    import sys
+    import time
+
+    if len(sys.argv) < 2:
+        print("用法: python lazy_json.py <文件.json>")
+        sys.exit(1)
+
+    start = time.perf_counter()
+    with open(sys.argv[1], 'rb') as f:
+        json.load(f)
+    full_ms = (time.perf_counter() - start) * 1000
+
+    start = time.perf_counter()
+    with LazyJsonDocument.open(sys.argv[1]) as doc:
+        keys = list(doc)
+        nested = {key: len(doc.child(key)) for key in keys if doc.child(key) is not None}
+    lazy_ms = (time.perf_counter() - start) * 1000
+
+    print(f"完整解析 {full_ms:.1f} ms / 惰性索引 {lazy_ms:.1f} ms")
+    print(f"顶层键: {keys}")
+    print(f"对象成员数: {nested}")
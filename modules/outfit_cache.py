@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+服装预编译缓存模块 - 每套服装 (MD5 + 角色骨架指纹) 只编译一次
+"""
+
+import hashlib
+import pickle
+import zlib
+from pathlib import Path
+
+from asset_storage import storage_for
+
+# 编译格式版本，转换逻辑变化时递增使旧缓存失效
+COMPILED_FORMAT_VERSION = 1
+
+
+def role_fingerprint(role_bones):
+    """根据角色骨骼名称列表计算骨架指纹"""
+    digest = hashlib.md5()
+    for bone in role_bones:
+        digest.update(bone['name'].encode('utf-8'))
+        digest.update(b'\0')
+    return digest.hexdigest()[:16]
+
+
+def source_stamp(folder_path):
+    """记录 dress.json 与 PNG 的大小和修改时间，用于检测源文件变化"""
+    storage, md5_hash = storage_for(folder_path)
+    stamp = []
+    for name in ["dress.json"] + storage.list_files(md5_hash, "*.png"):
+        st = storage.stat(md5_hash, name)
+        if st is not None:
+            stamp.append((name,) + st)
+    return tuple(stamp)
+
+
+class CompiledOutfitCache:
+    """预编译服装缓存
+
+    编译结果包含：
+      - bones:       dress.json 中的骨骼
+      - attachments: 过滤后并已转换为 mesh 的附件 {slot: {attach: data}}
+      - slot_bones:  每个插槽解析到的骨骼名称
+      - images:      需要复制的图片文件名列表
+    以 zlib 压缩的 pickle 存储在 cache_dir/<md5>_<指纹>.bin
+    """
+
+    def __init__(self, cache_dir="cache/outfits"):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self._memory = {}
+        self.hits = 0
+        self.misses = 0
+
+    def _cache_file(self, md5_hash, fingerprint):
+        return self.cache_dir / f"{md5_hash}_{fingerprint}.bin"
+
+    def load(self, md5_hash, fingerprint, folder_path):
+        """读取编译结果，源文件变化或格式不匹配时返回 None"""
+        key = (md5_hash, fingerprint)
+        stamp = source_stamp(folder_path)
+
+        compiled = self._memory.get(key)
+        if compiled is not None and compiled['stamp'] == stamp:
+            self.hits += 1
+            return compiled
+
+        cache_file = self._cache_file(md5_hash, fingerprint)
+        if cache_file.exists():
+            try:
+                with open(cache_file, 'rb') as f:
+                    compiled = pickle.loads(zlib.decompress(f.read()))
+                if (compiled.get('version') == COMPILED_FORMAT_VERSION
+                        and compiled.get('stamp') == stamp):
+                    self._memory[key] = compiled
+                    self.hits += 1
+                    return compiled
+            except Exception as e:
+                print(f"[WARN] 无法读取编译缓存 {cache_file.name}: {e}")
+
+        self.misses += 1
+        return None
+
+    def store(self, md5_hash, fingerprint, folder_path, compiled):
+        """保存编译结果（写临时文件后替换，避免半写入的缓存）"""
+        compiled = dict(compiled)
+        compiled['version'] = COMPILED_FORMAT_VERSION
+        compiled['stamp'] = source_stamp(folder_path)
+        self._memory[(md5_hash, fingerprint)] = compiled
+
+        cache_file = self._cache_file(md5_hash, fingerprint)
+        tmp_file = cache_file.with_suffix('.tmp')
+        try:
+            data = zlib.compress(pickle.dumps(compiled, protocol=pickle.HIGHEST_PROTOCOL))
+            with open(tmp_file, 'wb') as f:
+                f.write(data)
+            tmp_file.replace(cache_file)
+        except OSError as e:
+            print(f"[WARN] 无法写入编译缓存 {cache_file.name}: {e}")
+        return compiled
+
+    def invalidate(self, md5_hash):
+        """删除某个 MD5 的全部编译结果"""
+        for key in [k for k in self._memory if k[0] == md5_hash]:
+            del self._memory[key]
+        for cache_file in self.cache_dir.glob(f"{md5_hash}_*.bin"):
+            cache_file.unlink()
+
+    def clear(self):
+        """清空缓存"""
+        self._memory.clear()
+        for cache_file in self.cache_dir.glob("*.bin"):
+            cache_file.unlink()
+
+
+if __name__ == "__main__":
+    cache = CompiledOutfitCache()
+    print(f"编译缓存目录: {cache.cache_dir.absolute()}")
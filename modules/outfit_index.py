@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+服装兼容性索引模块 - 预先记录每套服装的插槽、骨骼和附件名
+
+合成页据此按所选 role.json 过滤不兼容的服装，并在选择时立即提示插槽冲突，
+不需要交互时解析 dress.json。
+"""
+
+from asset_storage import storage_for
+from outfit_cache import role_fingerprint
+from skeleton_model import SkeletonModel
+from instrumentation import span, traced
+
+# 索引格式版本，提取规则变化时递增使旧索引重建
+INDEX_FORMAT_VERSION = 1
+
+
+def extract_outfit_index(dress_doc, clothing_type, builder):
+    """从惰性 dress 文档提取索引（只读取键名和骨骼，不解析附件数据）"""
+    attachments = dress_doc.child('attachments')
+    names = {}
+    if attachments is not None:
+        for slot_name in attachments:
+            slot_attachments = attachments.child(slot_name)
+            names[slot_name] = dict.fromkeys(slot_attachments) if slot_attachments is not None else {}
+    if clothing_type == "BaseBody":
+        # 与合成时相同的手部变体过滤规则
+        names = builder.filter_basebody_attachments(names)
+
+    bones = [{'name': bone['name'], 'parent': bone.get('parent')}
+             for bone in dress_doc.get('bones', []) if isinstance(bone, dict) and 'name' in bone]
+    return {
+        'slots': list(names),
+        'attachments': {slot_name: list(attach_names) for slot_name, attach_names in names.items()},
+        'bones': bones,
+    }
+
+
+class OutfitIndex:
+    def __init__(self, db, builder):
+        """builder 为 SpineBuilder，用于复用插槽→骨骼解析和 BaseBody 过滤规则"""
+        self.db = db
+        self.builder = builder
+        self._entries = None
+        # {角色骨架指纹: {md5: 兼容性报告}}
+        self._compatibility = {}
+
+    @traced('index.refresh')
+    def refresh(self, check_stale=False):
+        """为缺少索引的服装建立索引，check_stale 为 True 时同时重建 dress.json 已变化的，返回更新数量"""
+        entries = self.db.get_outfit_index()
+        rows = []
+        for item in self.db.get_all_items():
+            md5_hash = item['md5_hash']
+            entry = entries.get(md5_hash)
+            if entry is not None and entry['version'] == INDEX_FORMAT_VERSION and not check_stale:
+                continue
+            if not item['source_path']:
+                continue
+            try:
+                storage, folder_md5 = storage_for(item['source_path'])
+                stamp = storage.stat(folder_md5, "dress.json")
+                if stamp is None:
+                    continue
+                if (entry is not None and entry['version'] == INDEX_FORMAT_VERSION
+                        and (entry['dress_size'], entry['dress_mtime']) == stamp):
+                    continue
+                with span('json.index', file='dress.json'), \
+                        storage.open_document(folder_md5, "dress.json") as dress_doc:
+                    extracted = extract_outfit_index(dress_doc, item['clothing_type'], self.builder)
+            except (OSError, ValueError) as e:
+                print(f"[WARN] 无法建立服装索引 {md5_hash}: {e}")
+                continue
+            extracted.update({
+                'md5_hash': md5_hash,
+                'clothing_type': item['clothing_type'],
+                'version': INDEX_FORMAT_VERSION,
+                'dress_size': stamp[0],
+                'dress_mtime': stamp[1],
+            })
+            rows.append(extracted)
+
+        if rows:
+            self.db.save_outfit_index(rows)
+            self._entries = None
+            self._compatibility.clear()
+        return len(rows)
+
+    def entries(self):
+        """{md5: 索引}（缓存在内存中，refresh 后重新读取）"""
+        if self._entries is None:
+            self._entries = self.db.get_outfit_index()
+        return self._entries
+
+    # ==================== 兼容性 ====================
+
+    def check(self, entry, role_model):
+        """检查一套服装是否适配角色骨架
+
+        unresolved_slots: 在 角色骨骼 + 服装骨骼 中找不到对应骨骼（合成时会挂到 root）的插槽
+        missing_parents:  父骨骼既不在角色中也不在服装中的服装骨骼
+        """
+        unresolved = []
+        combined = None
+        for slot_name in entry['slots']:
+            # 角色骨骼能解析到非 root 骨骼时，加入服装骨骼后也一定能解析到
+            if self.builder.find_bone_by_slot_name(slot_name, role_model) != 'root':
+                continue
+            if entry['bones'] and combined is None:
+                combined = SkeletonModel({'bones': list(role_model.bones)})
+                combined.add_bones(entry['bones'])
+            if combined is None or self.builder.find_bone_by_slot_name(slot_name, combined) == 'root':
+                unresolved.append(slot_name)
+
+        dress_bones = {bone['name'] for bone in entry['bones']}
+        missing_parents = [
+            bone['name'] for bone in entry['bones']
+            if bone['parent'] and bone['parent'] not in dress_bones and bone['parent'] not in role_model.bone_index
+        ]
+        return {
+            'compatible': not unresolved and not missing_parents,
+            'unresolved_slots': unresolved,
+            'missing_parents': missing_parents,
+        }
+
+    @traced('index.compatibility')
+    def compatibility(self, role_bones):
+        """所有已索引服装对该角色骨架的兼容性 {md5: 报告}（按骨架指纹缓存）"""
+        fingerprint = role_fingerprint(role_bones)
+        cached = self._compatibility.get(fingerprint)
+        if cached is not None:
+            return cached
+
+        role_model = SkeletonModel({'bones': list(role_bones)})
+        reports = {md5_hash: self.check(entry, role_model) for md5_hash, entry in self.entries().items()}
+        self._compatibility[fingerprint] = reports
+        return reports
+
+    def slot_collisions(self, md5_hashes):
+        """多套服装使用同一插槽的情况 {插槽: [md5, ...]}（后合并的会覆盖先合并的附件）"""
+        entries = self.entries()
+        users = {}
+        for md5_hash in md5_hashes:
+            entry = entries.get(md5_hash)
+            if entry is None:
+                continue
+            for slot_name in entry['slots']:
+                users.setdefault(slot_name, []).append(md5_hash)
+        return {slot_name: owners for slot_name, owners in users.items() if len(owners) > 1}
+
+
+if __name__ == "__main__":
+    import json
+    import sys
+    from database import ClothingDatabase
+    from spine_builder import SpineBuilder
+
+    db = ClothingDatabase()
+    index = OutfitIndex(db, SpineBuilder(db))
+    print(f"新建索引: {index.refresh()}")
+    if len(sys.argv) > 1:
+        with open(sys.argv[1], 'r', encoding='utf-8') as f:
+            role_bones = json.load(f).get('bones', [])
+        reports = index.compatibility(role_bones)
+        incompatible = {md5: r for md5, r in reports.items() if not r['compatible']}
+        print(f"兼容 {len(reports) - len(incompatible)} / {len(reports)}")
+        for md5_hash, report in list(incompatible.items())[:20]:
+            print(f"  {md5_hash}: 插槽 {report['unresolved_slots']} 缺少父骨骼 {report['missing_parents']}")
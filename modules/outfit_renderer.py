@@ -0,0 +1,506 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+合成预览模块 - 把合成后的初始姿势（setup pose）画成一张图片，合成页切换服装时即时预览
+
+  - 骨骼世界变换按 Spine 运行时的 updateWorldTransform 计算（支持 inherit / transform 各模式）
+  - 区域附件的四个角、网格顶点（含骨骼权重）用 NumPy 批量变换到世界坐标
+  - 按插槽顺序（绘制顺序）逐个附件光栅化：附件所有三角形覆盖的像素一次算出重心坐标，
+    双线性采样纹理后按预乘 alpha 叠加；纹理按屏幕上的缩放比例先整数倍缩小（相当于 mipmap）
+  - 渲染结果按 角色文件 + 服装（MD5、类型、源文件标记）+ 尺寸 缓存，解码后的纹理另行缓存
+只绘制 region / mesh / linkedmesh 附件，按普通混合模式叠加，不计算 IK 等约束和裁剪附件。
+"""
+
+import math
+import os
+from collections import OrderedDict
+
+import numpy as np
+from PIL import Image
+
+from outfit_cache import source_stamp
+from preview_decoder import image_size
+from instrumentation import span, count
+
+# 默认输出尺寸（长边像素）
+DEFAULT_SIZE = 512
+
+# 画面四周留白（像素）
+PADDING = 8
+
+# 可绘制的附件类型（无 type 为区域附件）
+DRAWABLE_TYPES = ('region', 'mesh', 'skinnedmesh', 'weightedmesh', 'linkedmesh')
+
+
+# ==================== 骨骼 ====================
+
+def _local_matrix(rotation_x, rotation_y, scale_x, scale_y):
+    rx = math.radians(rotation_x)
+    ry = math.radians(rotation_y)
+    return math.cos(rx) * scale_x, math.cos(ry) * scale_y, math.sin(rx) * scale_x, math.sin(ry) * scale_y
+
+
+def _world_transform(bone, parent):
+    """单个骨骼的世界变换 (a, b, c, d, worldX, worldY)，parent 为父骨骼的世界变换"""
+    x = bone.get('x', 0)
+    y = bone.get('y', 0)
+    rotation = bone.get('rotation', 0)
+    scale_x = bone.get('scaleX', 1)
+    scale_y = bone.get('scaleY', 1)
+    shear_x = bone.get('shearX', 0)
+    shear_y = bone.get('shearY', 0)
+
+    if parent is None:
+        return _local_matrix(rotation + shear_x, rotation + 90 + shear_y, scale_x, scale_y) + (x, y)
+
+    pa, pb, pc, pd, parent_x, parent_y = parent
+    world_x = pa * x + pb * y + parent_x
+    world_y = pc * x + pd * y + parent_y
+    mode = bone.get('inherit', bone.get('transform', 'normal'))
+
+    if mode == 'onlyTranslation':
+        return _local_matrix(rotation + shear_x, rotation + 90 + shear_y, scale_x, scale_y) + (world_x, world_y)
+
+    if mode == 'noRotationOrReflection':
+        s = pa * pa + pc * pc
+        if s > 0.0001:
+            s = abs(pa * pd - pb * pc) / s
+            pb = pc * s
+            pd = pa * s
+            parent_rotation = math.degrees(math.atan2(pc, pa))
+        else:
+            pa = pc = 0
+            parent_rotation = 90 - math.degrees(math.atan2(pd, pb))
+        la, lb, lc, ld = _local_matrix(rotation + shear_x - parent_rotation,
+                                       rotation + shear_y - parent_rotation + 90, scale_x, scale_y)
+        return pa * la - pb * lc, pa * lb - pb * ld, pc * la + pd * lc, pc * lb + pd * ld, world_x, world_y
+
+    if mode in ('noScale', 'noScaleOrReflection'):
+        cos = math.cos(math.radians(rotation))
+        sin = math.sin(math.radians(rotation))
+        za = pa * cos + pb * sin
+        zc = pc * cos + pd * sin
+        s = math.sqrt(za * za + zc * zc)
+        if s > 0.00001:
+            s = 1 / s
+        za *= s
+        zc *= s
+        s = math.sqrt(za * za + zc * zc)
+        if mode == 'noScale' and pa * pd - pb * pc < 0:
+            s = -s
+        r = math.pi / 2 + math.atan2(zc, za)
+        zb = math.cos(r) * s
+        zd = math.sin(r) * s
+        la, lb, lc, ld = _local_matrix(shear_x, 90 + shear_y, scale_x, scale_y)
+        return za * la + zb * lc, za * lb + zb * ld, zc * la + zd * lc, zc * lb + zd * ld, world_x, world_y
+
+    la, lb, lc, ld = _local_matrix(rotation + shear_x, rotation + 90 + shear_y, scale_x, scale_y)
+    return pa * la + pb * lc, pa * lb + pb * ld, pc * la + pd * lc, pc * lb + pd * ld, world_x, world_y
+
+
+def bone_world_transforms(bones):
+    """计算初始姿势下所有骨骼的世界变换，返回 (矩阵数组 (N, 2, 3)，{骨骼名: 序号})
+
+    序号与 bones 的顺序相同（带权重网格的骨骼序号即指向该列表）；父骨骼缺失时按根骨骼处理
+    """
+    index = {bone['name']: i for i, bone in enumerate(bones)}
+    transforms = [None] * len(bones)
+    for i in range(len(bones)):
+        # 沿父骨骼链向上找到已计算的祖先，再自上而下计算（骨骼顺序不要求父骨骼在前）
+        chain = []
+        current = i
+        while current is not None and transforms[current] is None and current not in chain:
+            chain.append(current)
+            current = index.get(bones[current].get('parent'))
+        for bone_index in reversed(chain):
+            parent_index = index.get(bones[bone_index].get('parent'))
+            parent = transforms[parent_index] if parent_index is not None else None
+            transforms[bone_index] = _world_transform(bones[bone_index], parent)
+    matrices = np.array([[[a, b, x], [c, d, y]] for a, b, c, d, x, y in transforms], dtype=np.float64)
+    return matrices.reshape(len(bones), 2, 3), index
+
+
+# ==================== 附件 ====================
+
+def _parse_color(value):
+    """Spine 颜色 RRGGBBAA 转为 (r, g, b, a)，0~1"""
+    if not isinstance(value, str) or len(value) < 6:
+        return None
+    value = value.ljust(8, 'f')
+    try:
+        return tuple(int(value[i:i + 2], 16) / 255 for i in (0, 2, 4, 6))
+    except ValueError:
+        return None
+
+
+def _weighted_vertices(vertices, vertex_count, matrices):
+    """带权重的顶点 [骨骼数, (骨骼序号, x, y, 权重)...] 变换到世界坐标"""
+    vertex_ids, bone_ids, xs, ys, weights = [], [], [], [], []
+    i = 0
+    for vertex in range(vertex_count):
+        bone_count = int(vertices[i])
+        i += 1
+        for _ in range(bone_count):
+            vertex_ids.append(vertex)
+            bone_ids.append(int(vertices[i]))
+            xs.append(vertices[i + 1])
+            ys.append(vertices[i + 2])
+            weights.append(vertices[i + 3])
+            i += 4
+    vertex_ids = np.array(vertex_ids, dtype=np.intp)
+    bone_ids = np.array(bone_ids, dtype=np.intp)
+    if len(bone_ids) and (bone_ids.min() < 0 or bone_ids.max() >= len(matrices)):
+        raise ValueError("顶点权重引用了不存在的骨骼")
+    m = matrices[bone_ids]
+    local = np.stack([xs, ys, np.ones(len(xs))], axis=1)
+    world = np.einsum('kij,kj->ki', m, local) * np.asarray(weights)[:, None]
+    return np.stack([np.bincount(vertex_ids, world[:, 0], vertex_count),
+                     np.bincount(vertex_ids, world[:, 1], vertex_count)], axis=1)
+
+
+def attachment_geometry(attachment, bone_matrix, matrices, parent_mesh=None):
+    """附件的三角形网格：(世界坐标 (n, 2), UV (n, 2), 三角形 (m, 3))
+
+    bone_matrix 为插槽骨骼的世界变换 (2, 3)，matrices 为全部骨骼（带权重网格用）；
+    linkedmesh 的几何取自 parent_mesh
+    """
+    attachment_type = attachment.get('type', 'region')
+    if attachment_type == 'region':
+        width = attachment.get('width', 0)
+        height = attachment.get('height', 0)
+        half = np.array([[-1, -1], [1, -1], [1, 1], [-1, 1]], dtype=np.float64) * (width / 2, height / 2)
+        local = half * (attachment.get('scaleX', 1), attachment.get('scaleY', 1))
+        angle = math.radians(attachment.get('rotation', 0))
+        rotation = np.array([[math.cos(angle), -math.sin(angle)], [math.sin(angle), math.cos(angle)]])
+        local = local @ rotation.T + (attachment.get('x', 0), attachment.get('y', 0))
+        points = local @ bone_matrix[:, :2].T + bone_matrix[:, 2]
+        uvs = np.array([[0, 1], [1, 1], [1, 0], [0, 0]], dtype=np.float64)
+        return points, uvs, np.array([[0, 1, 2], [2, 3, 0]], dtype=np.intp)
+
+    mesh = parent_mesh if attachment_type == 'linkedmesh' else attachment
+    if mesh is None:
+        return None
+    uvs = np.asarray(mesh.get('uvs', []), dtype=np.float64).reshape(-1, 2)
+    triangles = np.asarray(mesh.get('triangles', []), dtype=np.intp).reshape(-1, 3)
+    vertices = mesh.get('vertices', [])
+    vertex_count = len(uvs)
+    if vertex_count == 0 or len(triangles) == 0 or triangles.max() >= vertex_count:
+        return None
+    if len(vertices) == vertex_count * 2:
+        local = np.asarray(vertices, dtype=np.float64).reshape(-1, 2)
+        points = local @ bone_matrix[:, :2].T + bone_matrix[:, 2]
+    else:
+        points = _weighted_vertices(vertices, vertex_count, matrices)
+    return points, uvs, triangles
+
+
+# ==================== 光栅化 ====================
+
+def _premultiplied(img):
+    data = np.asarray(img.convert('RGBA'), dtype=np.float32) / 255
+    data[..., :3] *= data[..., 3:]
+    return data
+
+
+def _sample(texture, u, v):
+    """双线性采样（u, v 为 0~1 的数组），返回 (k, 4)"""
+    height, width = texture.shape[:2]
+    flat = texture.reshape(-1, 4)
+    x = np.clip(u * width - 0.5, 0, width - 1)
+    y = np.clip(v * height - 0.5, 0, height - 1)
+    x0 = x.astype(np.intp)
+    y0 = y.astype(np.intp)
+    fx = (x - x0)[:, None]
+    fy = (y - y0)[:, None]
+    dx = (x0 < width - 1).astype(np.intp)
+    i00 = y0 * width + x0
+    i10 = i00 + np.where(y0 < height - 1, width, 0)
+    # np.take 按行取值比花式索引快得多
+    c00 = np.take(flat, i00, axis=0)
+    c10 = np.take(flat, i10, axis=0)
+    top = c00 + (np.take(flat, i00 + dx, axis=0) - c00) * fx
+    bottom = c10 + (np.take(flat, i10 + dx, axis=0) - c10) * fx
+    return top + (bottom - top) * fy
+
+
+def _uv_coefficients(tri, tri_uvs):
+    """每个三角形内 UV 是屏幕坐标的仿射函数：uv = C @ (x, y, 1)，返回 (m, 2, 3) 和是否退化"""
+    e1 = tri[:, 1] - tri[:, 0]
+    e2 = tri[:, 2] - tri[:, 0]
+    det = e1[:, 0] * e2[:, 1] - e1[:, 1] * e2[:, 0]
+    degenerate = np.abs(det) < 1e-9
+    inv = 1 / np.where(degenerate, 1, det)
+    # 重心坐标 l1、l2 的系数
+    a1, b1 = e2[:, 1] * inv, -e2[:, 0] * inv
+    a2, b2 = -e1[:, 1] * inv, e1[:, 0] * inv
+    du1 = tri_uvs[:, 1] - tri_uvs[:, 0]
+    du2 = tri_uvs[:, 2] - tri_uvs[:, 0]
+    a = a1[:, None] * du1 + a2[:, None] * du2
+    b = b1[:, None] * du1 + b2[:, None] * du2
+    c = tri_uvs[:, 0] - a * tri[:, 0, 0:1] - b * tri[:, 0, 1:2]
+    return np.stack([a, b, c], axis=2), degenerate
+
+
+def rasterize(canvas, points, uvs, triangles, texture, tint=None):
+    """把三角形网格画到 canvas（(H, W, 4) 预乘 alpha），points 为画布像素坐标，返回绘制的像素数
+
+    逐行扫描：像素中心落在 [左边, 右边) 内的像素属于该三角形，相邻三角形的共享边不会重复绘制
+    """
+    height, width = canvas.shape[:2]
+    tri = points[triangles]
+    coefficients, degenerate = _uv_coefficients(tri, uvs[triangles])
+    if degenerate.any():
+        tri, coefficients = tri[~degenerate], coefficients[~degenerate]
+
+    # 顶点按 y 排序：长边 v0→v2，短边 v0→v1、v1→v2（同一条边在两个三角形中的计算完全相同）
+    order = np.argsort(tri[:, :, 1], axis=1, kind='stable')
+    tri = np.take_along_axis(tri, order[:, :, None], axis=1)
+    x0, y0 = tri[:, 0, 0], tri[:, 0, 1]
+    x1, y1 = tri[:, 1, 0], tri[:, 1, 1]
+    x2, y2 = tri[:, 2, 0], tri[:, 2, 1]
+    row_start = np.clip(np.ceil(y0 - 0.5), 0, height).astype(np.intp)
+    rows = np.clip(np.ceil(y2 - 0.5), 0, height).astype(np.intp) - row_start
+    rows = np.maximum(rows, 0)
+    if not rows.any():
+        return 0
+
+    # 展开所有三角形覆盖的行
+    tri_ids = np.repeat(np.arange(len(rows)), rows)
+    row_y = row_start[tri_ids] + (np.arange(tri_ids.size) - np.repeat(np.cumsum(rows) - rows, rows))
+    yc = row_y + 0.5
+    with np.errstate(divide='ignore', invalid='ignore'):
+        long_x = x0[tri_ids] + (yc - y0[tri_ids]) * ((x2 - x0) / (y2 - y0))[tri_ids]
+        upper = yc < y1[tri_ids]
+        short_x = np.where(upper,
+                           x0[tri_ids] + (yc - y0[tri_ids]) * ((x1 - x0) / (y1 - y0))[tri_ids],
+                           x1[tri_ids] + (yc - y1[tri_ids]) * ((x2 - x1) / (y2 - y1))[tri_ids])
+    col_start = np.clip(np.ceil(np.minimum(long_x, short_x) - 0.5), 0, width).astype(np.intp)
+    spans = np.clip(np.ceil(np.maximum(long_x, short_x) - 0.5), 0, width).astype(np.intp) - col_start
+    spans = np.maximum(spans, 0)
+    total = int(spans.sum())
+    if total == 0:
+        return 0
+
+    # 展开每行的像素，UV 由三角形的仿射系数直接算出
+    row_ids = np.repeat(np.arange(spans.size), spans)
+    px = col_start[row_ids] + (np.arange(total) - np.repeat(np.cumsum(spans) - spans, spans))
+    py = row_y[row_ids]
+    c = np.take(coefficients.astype(np.float32), tri_ids[row_ids], axis=0)
+    xc = px.astype(np.float32) + 0.5
+    ycf = py.astype(np.float32) + 0.5
+    u = c[:, 0, 0] * xc + c[:, 0, 1] * ycf + c[:, 0, 2]
+    v = c[:, 1, 0] * xc + c[:, 1, 1] * ycf + c[:, 1, 2]
+    color = _sample(texture, u, v)
+    if tint is not None:
+        color *= tint
+
+    pixels = py * width + px
+    flat = canvas.reshape(-1, 4)
+    flat[pixels] = color + np.take(flat, pixels, axis=0) * (1 - color[:, 3:])
+    return total
+
+
+def _triangle_area(points, triangles):
+    tri = points[triangles]
+    e1 = tri[:, 1] - tri[:, 0]
+    e2 = tri[:, 2] - tri[:, 0]
+    return float(np.abs(e1[:, 0] * e2[:, 1] - e1[:, 1] * e2[:, 0]).sum() / 2)
+
+
+def to_image(canvas):
+    """预乘 alpha 的画布转为 RGBA 图片"""
+    alpha = canvas[..., 3:]
+    rgb = np.divide(canvas[..., :3], alpha, out=np.zeros_like(canvas[..., :3]), where=alpha > 0)
+    data = np.concatenate([rgb, alpha], axis=2)
+    return Image.fromarray(np.clip(data * 255 + 0.5, 0, 255).astype(np.uint8), 'RGBA')
+
+
+# ==================== 渲染器 ====================
+
+class OutfitRenderer:
+    def __init__(self, builder, max_entries=32, max_texture_bytes=128 * 1024 ** 2):
+        """builder 为 SpineBuilder（用它的角色模板和服装编译缓存合并服装）"""
+        self.builder = builder
+        # {(角色文件, 角色图片, 服装, 尺寸): 图片}
+        self._renders = OrderedDict()
+        self.max_entries = max_entries
+        # {(存储位置, 文件夹 MD5, 图片名, (大小, 修改时间), 缩小倍数): 预乘 alpha 数组}，按字节数淘汰
+        self._textures = OrderedDict()
+        self._texture_bytes = 0
+        self.max_texture_bytes = max_texture_bytes
+        # 最近一次渲染的统计 {'attachments', 'pixels', 'missing_images', 'cached'}
+        self.last_stats = {}
+
+    def _render_key(self, role_path, selected_items, size):
+        role_path = os.path.abspath(role_path)
+        st = os.stat(role_path)
+        # 同类型服装的合并顺序影响结果，按合并顺序记录
+        outfits = tuple((md5_hash, item['type'], source_stamp(item['path']))
+                        for md5_hash, item in self.builder.merge_order(selected_items).items())
+        role_images = tuple((img_name, storage.stat(folder, img_name))
+                            for _, storage, folder, img_name in self.builder.role_image_sources(role_path))
+        return role_path, st.st_mtime_ns, st.st_size, role_images, outfits, size
+
+    def render(self, role_path, selected_items, size=DEFAULT_SIZE):
+        """渲染 role_path + selected_items（{md5: {'type', 'path'}}，同 build_character）的初始姿势
+
+        返回 RGBA 图片（长边 size 像素），相同的服装组合直接返回缓存（不要修改返回的图片）
+        """
+        key = self._render_key(role_path, selected_items, size)
+        image = self._renders.get(key)
+        if image is not None:
+            self._renders.move_to_end(key)
+            count('render.hit')
+            self.last_stats = dict(self.last_stats, cached=True)
+            return image
+
+        with span('render.compose'):
+            spine_data, images = self.builder.compose_setup(role_path, selected_items)
+        image = self.render_skeleton(spine_data, images, size)
+        self._renders[key] = image
+        while len(self._renders) > self.max_entries:
+            self._renders.popitem(last=False)
+        return image
+
+    def _texture(self, storage, folder_md5, img_name, factor):
+        key = (str(storage.root), folder_md5, img_name, storage.stat(folder_md5, img_name), factor)
+        texture = self._textures.get(key)
+        if texture is not None:
+            self._textures.move_to_end(key)
+            return texture
+        with span('image.decode', file=img_name):
+            with Image.open(storage.open(folder_md5, img_name)) as img:
+                img = img.convert('RGBA')
+                if factor >= 2:
+                    img = img.reduce(factor)
+                texture = _premultiplied(img)
+        self._textures[key] = texture
+        self._texture_bytes += texture.nbytes
+        while self._texture_bytes > self.max_texture_bytes and len(self._textures) > 1:
+            self._texture_bytes -= self._textures.popitem(last=False)[1].nbytes
+        return texture
+
+    def _drawables(self, spine_data, images):
+        """按绘制顺序返回 [(世界坐标, UV, 三角形, 图片来源, 图片名, 颜色)]，并统计缺失的图片"""
+        matrices, bone_index = bone_world_transforms(spine_data.get('bones', []))
+        skins = spine_data.get('skins', {})
+        if isinstance(skins, list):
+            # Spine 4 格式：[{'name': ..., 'attachments': {...}}]
+            skins = {skin.get('name'): skin.get('attachments', {}) for skin in skins}
+        default_skin = skins.get('default', {}) if isinstance(skins, dict) else {}
+
+        drawables = []
+        missing = []
+        for slot in spine_data.get('slots', []):
+            attachment_name = slot.get('attachment')
+            slot_skin = default_skin.get(slot['name'])
+            if not attachment_name or not isinstance(slot_skin, dict):
+                continue
+            attachment = slot_skin.get(attachment_name)
+            if not isinstance(attachment, dict) or attachment.get('type', 'region') not in DRAWABLE_TYPES:
+                continue
+
+            parent_mesh = None
+            if attachment.get('type') == 'linkedmesh':
+                parent_skin = skins.get(attachment.get('skin') or 'default', {}) if isinstance(skins, dict) else {}
+                parent_mesh = (parent_skin.get(slot['name']) or {}).get(attachment.get('parent'))
+
+            path = attachment.get('path') or attachment.get('name') or attachment_name
+            img_name = f"{path}.png"
+            source = images.get(img_name) or images.get(img_name.rsplit('/', 1)[-1])
+            if source is None:
+                missing.append(img_name)
+                continue
+
+            bone = bone_index.get(slot.get('bone'), bone_index.get('root', 0))
+            try:
+                geometry = attachment_geometry(attachment, matrices[bone], matrices, parent_mesh)
+            except (ValueError, IndexError, TypeError) as e:
+                print(f"[WARN] 无法计算附件 {slot['name']}/{attachment_name}: {e}")
+                continue
+            if geometry is None:
+                continue
+
+            colors = [c for c in (_parse_color(slot.get('color')), _parse_color(attachment.get('color'))) if c]
+            tint = None
+            if colors:
+                r, g, b, a = np.prod(np.array(colors), axis=0)
+                if (r, g, b, a) != (1, 1, 1, 1):
+                    tint = np.array([r * a, g * a, b * a, a], dtype=np.float32)
+            drawables.append(geometry + (source, img_name, tint))
+        return drawables, missing
+
+    def render_skeleton(self, spine_data, images, size=DEFAULT_SIZE):
+        """渲染已合成的骨架数据，images 为 {图片名: (存储, 文件夹 MD5)}，返回 RGBA 图片"""
+        with span('render.geometry'):
+            drawables, missing = self._drawables(spine_data, images)
+        if not drawables:
+            self.last_stats = {'attachments': 0, 'pixels': 0, 'missing_images': missing, 'cached': False}
+            return Image.new('RGBA', (size, size), (0, 0, 0, 0))
+
+        # 按所有附件的包围盒缩放到 size 以内（Spine 的 y 轴向上，图片向下）
+        all_points = np.concatenate([points for points, *_ in drawables])
+        min_x, min_y = all_points.min(axis=0)
+        max_x, max_y = all_points.max(axis=0)
+        scale = (size - PADDING * 2) / max(max_x - min_x, max_y - min_y, 1e-6)
+        width = max(1, int(math.ceil((max_x - min_x) * scale)) + PADDING * 2)
+        height = max(1, int(math.ceil((max_y - min_y) * scale)) + PADDING * 2)
+        canvas = np.zeros((height, width, 4), dtype=np.float32)
+
+        pixels = 0
+        with span('render.rasterize'):
+            for points, uvs, triangles, (storage, folder_md5), img_name, tint in drawables:
+                screen = np.empty_like(points)
+                screen[:, 0] = (points[:, 0] - min_x) * scale + PADDING
+                screen[:, 1] = (max_y - points[:, 1]) * scale + PADDING
+                # 纹理按屏幕上的缩放比例先整数倍缩小，避免远小于原图时采样失真
+                try:
+                    screen_area = _triangle_area(screen, triangles)
+                    texture_area = _triangle_area(uvs * image_size(storage, folder_md5, img_name), triangles)
+                    factor = int(math.sqrt(texture_area / screen_area)) if screen_area > 0 else 1
+                    texture = self._texture(storage, folder_md5, img_name, min(max(factor, 1), 64))
+                except Exception as e:
+                    print(f"[WARN] 无法读取图片 {img_name}: {e}")
+                    missing.append(img_name)
+                    continue
+                pixels += rasterize(canvas, screen, uvs, triangles, texture, tint)
+                count('render.attachment')
+
+        self.last_stats = {'attachments': len(drawables), 'pixels': pixels, 'missing_images': missing,
+                           'cached': False}
+        with span('render.encode'):
+            return to_image(canvas)
+
+    def clear(self):
+        self._renders.clear()
+        self._textures.clear()
+        self._texture_bytes = 0
+
+
+if __name__ == "__main__":
+    import argparse
+    import time
+    from spine_builder import SpineBuilder
+
+    parser = argparse.ArgumentParser(description="渲染服装组合的初始姿势预览")
+    parser.add_argument('role', help="role.json")
+    parser.add_argument('output', help="输出 PNG")
+    parser.add_argument('--item', action='append', default=[], metavar='TYPE=PATH',
+                        help="服装（类型=素材文件夹），可重复")
+    parser.add_argument('--size', type=int, default=DEFAULT_SIZE)
+    args = parser.parse_args()
+
+    from asset_storage import storage_for
+    selected = {}
+    for spec in args.item:
+        clothing_type, path = spec.split('=', 1)
+        selected[storage_for(path)[1]] = {'type': clothing_type, 'path': path}
+
+    renderer = OutfitRenderer(SpineBuilder(None))
+    start = time.perf_counter()
+    image = renderer.render(args.role, selected, args.size)
+    elapsed = (time.perf_counter() - start) * 1000
+    image.save(args.output)
+    stats = renderer.last_stats
+    print(f"附件 {stats['attachments']} 个, 像素 {stats['pixels']}, 缺失图片 {len(stats['missing_images'])} 张, "
+          f"{elapsed:.1f} ms: {args.output}")
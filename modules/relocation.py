@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+素材搬迁模块 - 同盘 rename、跨盘并行复制+校验、日志续传、数据库路径批量更新
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+
+from instrumentation import span, count
+
+JOURNAL_NAME = ".relocation_journal.jsonl"
+
+# 日志状态
+#   planned   - 计划搬迁
+#   copied    - 已复制到 .partial 临时目录并校验
+#   placed    - 已放到目标位置（源文件夹可能还在）
+#   done      - 源文件夹已处理完（move 时已删除）
+#   committed - 数据库路径已更新
+STATES = ('planned', 'copied', 'placed', 'done', 'committed')
+
+
+def same_device(source, target_dir):
+    """源文件夹和目标目录是否在同一设备（可直接 rename）"""
+    try:
+        return os.stat(source).st_dev == os.stat(target_dir).st_dev
+    except OSError:
+        return False
+
+
+def folder_manifest(folder, with_hash=False):
+    """文件夹内容清单 {相对路径: (大小, md5)}"""
+    folder = Path(folder)
+    manifest = {}
+    for path in folder.rglob("*"):
+        if not path.is_file():
+            continue
+        digest = None
+        if with_hash:
+            h = hashlib.md5()
+            with open(path, 'rb') as f:
+                for block in iter(lambda: f.read(1 << 20), b''):
+                    h.update(block)
+            digest = h.hexdigest()
+        manifest[path.relative_to(folder).as_posix()] = (path.stat().st_size, digest)
+    return manifest
+
+
+class RelocationJournal:
+    """JSONL 搬迁日志，记录每个 MD5 的最新状态"""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self.entries = {}
+        if self.path.exists():
+            with open(self.path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # 崩溃时可能留下半行，忽略
+                        continue
+                    self.entries[entry['md5']] = entry
+
+    def state(self, md5_hash):
+        entry = self.entries.get(md5_hash)
+        return entry['state'] if entry else None
+
+    def record(self, md5_hash, state, source, target):
+        entry = {'md5': md5_hash, 'state': state, 'source': str(source), 'target': str(target)}
+        with self._lock:
+            self.entries[md5_hash] = entry
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+
+    def remove(self):
+        if self.path.exists():
+            self.path.unlink()
+
+
+class AssetRelocator:
+    def __init__(self, db, workers=4, verify='size'):
+        """verify: 'size' 比较文件大小，'hash' 额外比较 MD5"""
+        self.db = db
+        self.workers = workers
+        self.verify = verify
+
+    def _verify(self, source, copied):
+        with_hash = self.verify == 'hash'
+        return folder_manifest(source, with_hash) == folder_manifest(copied, with_hash)
+
+    def _relocate_one(self, md5_hash, source, target, strategy, journal):
+        """搬迁单个文件夹，返回最终状态"""
+        state = journal.state(md5_hash)
+        partial = target.with_name(f".{target.name}.partial")
+
+        # 已经在目标位置（例如重复执行分离），不做任何操作
+        if source.exists() and target.exists() and os.path.samefile(source, target):
+            return 'unchanged'
+
+        # 续传：源已不存在但目标已就位，视为完成
+        if state in ('placed', 'done') or (not source.exists() and target.exists()):
+            if strategy == 'move' and source.exists() and target.exists():
+                shutil.rmtree(source)
+            journal.record(md5_hash, 'done', source, target)
+            return 'done'
+
+        if not source.exists():
+            return 'missing'
+
+        journal.record(md5_hash, 'planned', source, target)
+
+        # 目标已存在（旧的副本），先删除
+        if target.exists():
+            shutil.rmtree(target)
+
+        if strategy == 'move' and same_device(source, target.parent):
+            with span('file.rename', md5=md5_hash):
+                os.rename(source, target)
+            count('file.rename')
+            journal.record(md5_hash, 'done', source, target)
+            return 'done'
+
+        # 跨设备（或复制策略）：复制到临时目录 → 校验 → 放到目标位置 → 删除源
+        if partial.exists():
+            shutil.rmtree(partial)
+        with span('file.copytree', md5=md5_hash):
+            shutil.copytree(source, partial)
+        count('file.copytree')
+        if not self._verify(source, partial):
+            shutil.rmtree(partial)
+            raise IOError(f"复制校验失败: {source}")
+        journal.record(md5_hash, 'copied', source, target)
+
+        os.rename(partial, target)
+        journal.record(md5_hash, 'placed', source, target)
+
+        if strategy == 'move':
+            shutil.rmtree(source)
+        journal.record(md5_hash, 'done', source, target)
+        return 'done'
+
+    def relocate(self, items, target_dir, strategy='move', table='animations'):
+        """搬迁 items [(md5, source_path)] 到 target_dir/<md5>
+
+        strategy: 'move' 移动（同盘 rename，跨盘复制+校验后删除源）；'copy' 只复制。
+        move 完成后在一个事务中更新数据库 source_path；中断后再次调用会根据日志续传。
+        返回 {'done': n, 'unchanged': n, 'missing': n, 'failed': [(md5, 错误)], 'updated': n}
+        """
+        target_dir = Path(target_dir)
+        target_dir.mkdir(parents=True, exist_ok=True)
+        journal = RelocationJournal(target_dir / JOURNAL_NAME)
+
+        report = {'done': 0, 'unchanged': 0, 'missing': 0, 'failed': [], 'updated': 0}
+        plan = []
+        for md5_hash, source_path in items:
+            if journal.state(md5_hash) == 'committed':
+                continue
+            plan.append((md5_hash, Path(source_path), target_dir / md5_hash))
+
+        # 同盘 rename 很快，串行即可；跨盘复制使用线程池并行
+        same_dev, cross_dev = [], []
+        for entry in plan:
+            if strategy == 'move' and entry[1].exists() and same_device(entry[1], target_dir):
+                same_dev.append(entry)
+            else:
+                cross_dev.append(entry)
+
+        finished = []
+        for md5_hash, source, target in same_dev:
+            try:
+                status = self._relocate_one(md5_hash, source, target, strategy, journal)
+                report[status] += 1
+                if status == 'done':
+                    finished.append((md5_hash, target))
+            except OSError as e:
+                report['failed'].append((md5_hash, str(e)))
+
+        if cross_dev:
+            with ThreadPoolExecutor(max_workers=self.workers) as pool:
+                futures = {pool.submit(self._relocate_one, md5_hash, source, target, strategy, journal):
+                           (md5_hash, target) for md5_hash, source, target in cross_dev}
+                for future in as_completed(futures):
+                    md5_hash, target = futures[future]
+                    try:
+                        status = future.result()
+                        report[status] += 1
+                        if status == 'done':
+                            finished.append((md5_hash, target))
+                    except OSError as e:
+                        report['failed'].append((md5_hash, str(e)))
+
+        # 之前中断时已完成但未提交数据库的条目
+        pending = {md5_hash for md5_hash, _ in finished}
+        for md5_hash, entry in journal.entries.items():
+            if entry['state'] == 'done' and md5_hash not in pending:
+                finished.append((md5_hash, Path(entry['target'])))
+
+        if strategy == 'move' and finished:
+            path_map = {md5_hash: str(target) for md5_hash, target in finished}
+            report['updated'] = self.db.update_source_paths(path_map, table)
+            for md5_hash, target in finished:
+                journal.record(md5_hash, 'committed', journal.entries[md5_hash]['source'], target)
+
+        if not report['failed']:
+            journal.remove()
+        return report
+
+
+if __name__ == "__main__":
+    manifest = folder_manifest(Path(__file__).parent)
+    print(f"模块目录共 {len(manifest)} 个文件")
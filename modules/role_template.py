@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+角色模板缓存模块 - 已解析的 role.json 常驻内存，每次合成只复制会被修改的容器
+
+RoleTemplate 保存解析后的角色数据（只读，不要原地修改），
+instantiate() 返回合成用的副本：
+  - 顶层字典、bones / slots 列表、skins 的皮肤字典、skeleton 字典为新对象
+  - 骨骼、插槽和皮肤中每个插槽的附件字典与模板共享，
+    修改前经 SkeletonModel.writable_slot / writable_skin_slot 复制（写时复制）
+  - 合并动画时才复制动画容器层，关键帧列表共享
+缓存按 路径 + 修改时间 + 大小 失效，batch / 交互式重复合成时不再重复解析 role.json。
+"""
+
+import json
+import os
+from collections import OrderedDict
+
+from animation_merger import TIMELINE_DEPTH, copy_containers
+from outfit_cache import role_fingerprint
+from skeleton_pruner import IMAGE_ATTACHMENT_TYPES, iter_skins, attachment_image_name
+from instrumentation import span, count
+
+
+class RoleTemplate:
+    """解析后的角色骨架（只读）"""
+
+    def __init__(self, data):
+        self.data = data
+        skins = data.get('skins', {})
+        # 与模板共享、修改前需要复制的容器（插槽字典、皮肤中每个插槽的附件字典）
+        shared = [id(slot) for slot in data.get('slots', [])]
+        if isinstance(skins, dict):
+            shared.extend(id(atts) for skin in skins.values() if isinstance(skin, dict) for atts in skin.values())
+        self.shared_ids = frozenset(shared)
+        # 编译服装用的角色骨骼指纹（合并服装前的骨骼）
+        self.fingerprint = role_fingerprint(data.get('bones', []))
+        # 角色自带附件引用的图片文件名（与 role.json 放在一起）
+        self.image_names = sorted({
+            f"{attachment_image_name(attach_name, attach_data)}.png"
+            for _, skin in iter_skins(data) if isinstance(skin, dict)
+            for attachments in skin.values() if isinstance(attachments, dict)
+            for attach_name, attach_data in attachments.items()
+            if isinstance(attach_data, dict) and attach_data.get('type', 'region') in IMAGE_ATTACHMENT_TYPES
+        })
+
+    def instantiate(self, copy_animations=False):
+        """返回合成用的写时复制副本；copy_animations 为 True 时复制动画容器（合并动画前需要）"""
+        data = dict(self.data)
+        data['bones'] = list(self.data.get('bones', []))
+        data['slots'] = list(self.data.get('slots', []))
+        skins = self.data.get('skins', {})
+        if isinstance(skins, dict):
+            data['skins'] = {name: dict(skin) if isinstance(skin, dict) else skin for name, skin in skins.items()}
+        data['skeleton'] = dict(self.data.get('skeleton', {}))
+        if copy_animations and 'animations' in self.data:
+            data['animations'] = {
+                name: {group: copy_containers(value, TIMELINE_DEPTH.get(group, 0))
+                       for group, value in anim.items()}
+                for name, anim in self.data['animations'].items()
+            }
+        return data
+
+
+class RoleTemplateCache:
+    def __init__(self, max_entries=8):
+        # {绝对路径: (mtime_ns, size, RoleTemplate)}
+        self._templates = OrderedDict()
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, role_path):
+        """返回 role_path 的模板，文件未变化时直接复用"""
+        key = os.path.abspath(role_path)
+        st = os.stat(key)
+        cached = self._templates.get(key)
+        if cached and cached[0] == st.st_mtime_ns and cached[1] == st.st_size:
+            self._templates.move_to_end(key)
+            self.hits += 1
+            count('role_template.hit')
+            return cached[2]
+
+        self.misses += 1
+        count('role_template.miss')
+        with span('json.parse', file='role.json'), open(key, 'r', encoding='utf-8') as f:
+            template = RoleTemplate(json.load(f))
+
+        self._templates[key] = (st.st_mtime_ns, st.st_size, template)
+        self._templates.move_to_end(key)
+        while len(self._templates) > self.max_entries:
+            self._templates.popitem(last=False)
+        return template
+
+    def clear(self):
+        self._templates.clear()
+
+
+if __name__ == "__main__":
+    import sys
+    import time
+
+    if len(sys.argv) < 2:
+        print("用法: python role_template.py <role.json>")
+        sys.exit(1)
+
+    cache = RoleTemplateCache()
+    start = time.perf_counter()
+    template = cache.get(sys.argv[1])
+    parse_ms = (time.perf_counter() - start) * 1000
+    start = time.perf_counter()
+    for _ in range(100):
+        template.instantiate(copy_animations=True)
+    overlay_ms = (time.perf_counter() - start) * 1000 / 100
+    print(f"解析 {parse_ms:.2f} ms，每次实例化 {overlay_ms:.3f} ms")
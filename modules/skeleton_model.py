@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+骨架模型模块 - 带索引的骨骼/插槽容器，用于增量合并
+"""
+
+from skeleton_pruner import is_weighted_mesh, remap_weighted_vertices
+
+
+class SkeletonModel:
+    """包装 Spine 数据中的 bones / slots 列表
+
+    直接在原列表上追加，同时维护 名称→索引 映射，
+    追加（已存在则跳过）为 O(1)，并记录骨骼定义冲突。
+    shared_ids 为与角色模板共享的容器 id（见 role_template），经 writable_* 取得时先复制。
+    """
+
+    def __init__(self, spine_data, shared_ids=frozenset()):
+        self.shared_ids = shared_ids
+        self.bones = spine_data.setdefault('bones', [])
+        self.slots = spine_data.setdefault('slots', [])
+        self.bone_index = {}
+        self.slot_index = {}
+        # 冲突记录: [(骨骼名, 已有定义, 新定义)]
+        self.conflicts = []
+        # find_bone_containing 的查询缓存，新增骨骼时清空
+        self._lookup_cache = {}
+        self._lower_names = []
+
+        for i, bone in enumerate(self.bones):
+            self.bone_index.setdefault(bone['name'], i)
+            self._lower_names.append(bone['name'].lower())
+        for i, slot in enumerate(self.slots):
+            self.slot_index.setdefault(slot['name'], i)
+
+    # ==================== 骨骼 ====================
+
+    def has_bone(self, name):
+        return name in self.bone_index
+
+    def get_bone(self, name):
+        index = self.bone_index.get(name)
+        return self.bones[index] if index is not None else None
+
+    def add_bone(self, bone):
+        """追加骨骼，已存在时保留原定义；定义不同则记录冲突。返回是否追加"""
+        name = bone['name']
+        index = self.bone_index.get(name)
+        if index is not None:
+            existing = self.bones[index]
+            if existing != bone:
+                self.conflicts.append((name, existing, bone))
+            return False
+
+        self.bone_index[name] = len(self.bones)
+        self.bones.append(bone)
+        self._lower_names.append(name.lower())
+        self._lookup_cache.clear()
+        return True
+
+    def add_bones(self, bones):
+        """批量追加骨骼，返回新增数量"""
+        added = 0
+        for bone in bones:
+            if self.add_bone(bone):
+                added += 1
+        return added
+
+    def find_bone_containing(self, fragment):
+        """按顺序查找名称（忽略大小写）包含 fragment 的第一个骨骼"""
+        fragment = fragment.lower()
+        if fragment in self._lookup_cache:
+            return self._lookup_cache[fragment]
+
+        result = None
+        for i, lower_name in enumerate(self._lower_names):
+            if fragment in lower_name:
+                result = self.bones[i]['name']
+                break
+        self._lookup_cache[fragment] = result
+        return result
+
+    def bone_conflicts(self, structural_only=False):
+        """返回冲突列表；structural_only 时只返回父骨骼不同的冲突"""
+        if not structural_only:
+            return list(self.conflicts)
+        return [c for c in self.conflicts if c[1].get('parent') != c[2].get('parent')]
+
+    # ==================== 插槽 ====================
+
+    def has_slot(self, name):
+        return name in self.slot_index
+
+    def get_slot(self, name):
+        index = self.slot_index.get(name)
+        return self.slots[index] if index is not None else None
+
+    def writable_slot(self, name):
+        """返回可修改的插槽，与模板共享时先复制"""
+        index = self.slot_index.get(name)
+        if index is None:
+            return None
+        slot = self.slots[index]
+        if id(slot) in self.shared_ids:
+            slot = self.slots[index] = dict(slot)
+        return slot
+
+    def writable_skin_slot(self, skin, slot_name):
+        """返回皮肤中插槽的附件字典（不存在时创建），与模板共享时先复制"""
+        attachments = skin.get(slot_name)
+        if attachments is None:
+            attachments = skin[slot_name] = {}
+        elif id(attachments) in self.shared_ids:
+            attachments = skin[slot_name] = dict(attachments)
+        return attachments
+
+    def add_slot(self, slot):
+        """追加插槽，已存在时跳过。返回是否追加"""
+        name = slot['name']
+        if name in self.slot_index:
+            return False
+        self.slot_index[name] = len(self.slots)
+        self.slots.append(slot)
+        return True
+
+    # ==================== 顺序检查 ====================
+
+    def check_bone_order(self):
+        """检查父骨骼是否都在子骨骼之前
+
+        返回 (顺序错误列表, 缺失父骨骼列表)，元素为 (骨骼名, 父骨骼名)
+        """
+        misordered = []
+        missing = []
+        seen = set()
+        for bone in self.bones:
+            parent = bone.get('parent')
+            if parent is not None and parent not in seen:
+                if parent in self.bone_index:
+                    misordered.append((bone['name'], parent))
+                else:
+                    missing.append((bone['name'], parent))
+            seen.add(bone['name'])
+        return misordered, missing
+
+    def sort_bones(self, skins=()):
+        """稳定地重排骨骼，保证父骨骼在前（顺序已正确的骨骼保持原位置）
+
+        skins 为皮肤字典 {插槽: {附件: 数据}} 的列表，其中带权重网格的骨骼序号随之改写
+        """
+        old_positions = {id(bone): i for i, bone in enumerate(self.bones)}
+        ordered = []
+        placed = set()
+        waiting = {}
+
+        def place(bone):
+            stack = [bone]
+            while stack:
+                current = stack.pop()
+                placed.add(current['name'])
+                ordered.append(current)
+                # 等待该父骨骼的子骨骼紧随其后
+                stack.extend(reversed(waiting.pop(current['name'], [])))
+
+        for bone in self.bones:
+            parent = bone.get('parent')
+            if parent is None or parent in placed or parent not in self.bone_index:
+                place(bone)
+            else:
+                waiting.setdefault(parent, []).append(bone)
+
+        # 循环引用的骨骼无法排序，追加到末尾
+        for bone in self.bones:
+            if bone['name'] not in placed:
+                placed.add(bone['name'])
+                ordered.append(bone)
+
+        index_map = [0] * len(ordered)
+        for i, bone in enumerate(ordered):
+            index_map[old_positions[id(bone)]] = i
+        if any(i != new_index for i, new_index in enumerate(index_map)):
+            for skin in skins:
+                self.remap_weighted_bones(skin, index_map)
+
+        self.bones[:] = ordered
+        self.bone_index = {}
+        self._lower_names = []
+        for i, bone in enumerate(self.bones):
+            self.bone_index.setdefault(bone['name'], i)
+            self._lower_names.append(bone['name'].lower())
+        self._lookup_cache.clear()
+        return self.bones
+
+    def remap_weighted_bones(self, skin, index_map):
+        """按 index_map（旧序号→新序号）改写皮肤中带权重网格的骨骼序号，返回改写的附件数
+
+        附件可能与模板或服装缓存共享，改写时替换为新的附件字典而不修改原对象
+        """
+        remapped = 0
+        for slot_name, attachments in list(skin.items()):
+            if not isinstance(attachments, dict):
+                continue
+            changed = {}
+            for attach_name, data in attachments.items():
+                if isinstance(data, dict) and is_weighted_mesh(data):
+                    changed[attach_name] = dict(data, vertices=remap_weighted_vertices(data['vertices'], index_map))
+            if changed:
+                self.writable_skin_slot(skin, slot_name).update(changed)
+                remapped += len(changed)
+        return remapped
+
+
+if __name__ == "__main__":
+    data = {'bones': [{'name': 'root'}, {'name': 'arm', 'parent': 'body'}, {'name': 'body', 'parent': 'root'}]}
+    model = SkeletonModel(data)
+    print(f"顺序检查: {model.check_bone_order()}")
+    model.sort_bones()
+    print(f"排序后: {[b['name'] for b in data['bones']]}")
+
+    # 带权重网格的骨骼序号随排序改写（顶点绑定在 hand 上）
+    data = {'bones': [{'name': 'root'}, {'name': 'hand', 'parent': 'arm'}, {'name': 'arm', 'parent': 'root'}]}
+    mesh = {'type': 'mesh', 'uvs': [0, 0], 'vertices': [1, 1, 0.0, 0.0, 1.0]}
+    skin = {'glove': {'glove': mesh}}
+    model = SkeletonModel(data)
+    model.sort_bones([skin])
+    bound = data['bones'][skin['glove']['glove']['vertices'][1]]['name']
+    assert bound == 'hand', bound
+    assert mesh['vertices'][1] == 1, "原附件不应被修改"
+    print(f"权重骨骼: {bound}")
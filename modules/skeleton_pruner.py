@@ -0,0 +1,330 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+骨架清理模块 - 删除合成结果中未被引用的骨骼、插槽、附件和图片
+"""
+
+import json
+from pathlib import Path
+
+from animation_merger import TIMELINE_DEPTH, copy_containers
+
+# 需要图片的附件类型（region 为默认类型）
+IMAGE_ATTACHMENT_TYPES = ('region', 'mesh', 'linkedmesh', 'skinnedmesh')
+
+CONSTRAINT_GROUPS = ('ik', 'transform', 'path', 'physics')
+
+
+def is_weighted_mesh(attach_data):
+    """带权重的 mesh：vertices 长度与 uvs 不同"""
+    if attach_data.get('type') not in ('mesh', 'skinnedmesh'):
+        return False
+    return len(attach_data.get('vertices', [])) != len(attach_data.get('uvs', []))
+
+
+def iter_weighted_bones(vertices):
+    """遍历带权重顶点数据中的骨骼索引"""
+    i = 0
+    while i < len(vertices):
+        bone_count = int(vertices[i])
+        i += 1
+        for _ in range(bone_count):
+            yield int(vertices[i])
+            i += 4
+
+
+def remap_weighted_vertices(vertices, index_map):
+    """按新骨骼索引重写带权重顶点数据（返回新列表）"""
+    result = list(vertices)
+    i = 0
+    while i < len(result):
+        bone_count = int(result[i])
+        i += 1
+        for _ in range(bone_count):
+            result[i] = index_map[int(result[i])]
+            i += 4
+    return result
+
+
+def iter_skins(spine_data):
+    """遍历皮肤 (皮肤名, {插槽: {附件: 数据}})，兼容 3.x 字典格式和 4.x 列表格式"""
+    skins = spine_data.get('skins', {})
+    if isinstance(skins, dict):
+        for skin_name, skin in skins.items():
+            yield skin_name, skin
+    else:
+        for skin in skins:
+            yield skin.get('name', 'default'), skin.get('attachments', {})
+
+
+def attachment_image_name(attach_name, attach_data):
+    """附件对应的图片名（不含扩展名）"""
+    return attach_data.get('path') or attach_data.get('name') or attach_name
+
+
+def find_broken_references(spine_data):
+    """检查动画中引用的骨骼、插槽、附件、约束是否都存在，返回问题描述列表"""
+    bone_names = {b['name'] for b in spine_data.get('bones', [])}
+    slot_names = {s['name'] for s in spine_data.get('slots', [])}
+    constraint_names = {
+        group: {c['name'] for c in spine_data.get(group, []) if isinstance(c, dict)}
+        for group in CONSTRAINT_GROUPS
+    }
+    skins = dict(iter_skins(spine_data))
+    attachment_names = {}
+    for skin in skins.values():
+        for slot_name, slot_attachments in skin.items():
+            attachment_names.setdefault(slot_name, set()).update(slot_attachments)
+
+    problems = []
+    for anim_name, anim_data in spine_data.get('animations', {}).items():
+        for bone_name in anim_data.get('bones', {}):
+            if bone_name not in bone_names:
+                problems.append(f"{anim_name}: 骨骼 {bone_name} 不存在")
+
+        for slot_name, timelines in anim_data.get('slots', {}).items():
+            if slot_name not in slot_names:
+                problems.append(f"{anim_name}: 插槽 {slot_name} 不存在")
+                continue
+            for key in timelines.get('attachment', []):
+                name = key.get('name')
+                if name is not None and name not in attachment_names.get(slot_name, ()):
+                    problems.append(f"{anim_name}: 插槽 {slot_name} 的附件 {name} 不存在")
+
+        for group in CONSTRAINT_GROUPS:
+            timelines = anim_data.get(group)
+            if isinstance(timelines, dict):
+                for name in timelines:
+                    if name and name not in constraint_names[group]:
+                        problems.append(f"{anim_name}: 约束 {group}/{name} 不存在")
+
+        for group in ('deform', 'attachments'):
+            for skin_name, by_slot in anim_data.get(group, {}).items():
+                for slot_name, by_attachment in by_slot.items():
+                    for attach_name in by_attachment:
+                        if attach_name not in skins.get(skin_name, {}).get(slot_name, {}):
+                            problems.append(f"{anim_name}: {group} {skin_name}/{slot_name}/{attach_name} 不存在")
+
+        for key in anim_data.get('drawOrder', anim_data.get('draworder', [])):
+            for offset in key.get('offsets', []):
+                if offset.get('slot') not in slot_names:
+                    problems.append(f"{anim_name}: drawOrder 插槽 {offset.get('slot')} 不存在")
+
+    return problems
+
+
+class SkeletonPruner:
+    """删除未引用数据的优化处理
+
+    保留规则：
+      - 附件：插槽初始附件、动画 attachment / deform 时间轴引用的附件，以及它们依赖的 linkedmesh 父网格
+      - 插槽：拥有保留附件，或被动画、裁剪附件、路径约束引用
+      - 骨骼：被保留的插槽、带权重网格、约束、动画引用，及其所有父骨骼
+    存在 drawOrder 时间轴时不删除插槽（偏移量依赖插槽索引）。
+    动画时间轴不删除，原本就引用了不存在对象的时间轴只在报告中列出。
+    """
+
+    def _structural_copy(self, spine_data):
+        """复制会被修改的容器层，叶子数据共享（不修改原始数据和缓存）"""
+        result = dict(spine_data)
+        result['bones'] = list(spine_data.get('bones', []))
+        result['slots'] = list(spine_data.get('slots', []))
+        skins = spine_data.get('skins', {})
+        if isinstance(skins, dict):
+            result['skins'] = {name: {slot: dict(atts) for slot, atts in skin.items()}
+                               for name, skin in skins.items()}
+        else:
+            result['skins'] = [dict(skin, attachments={slot: dict(atts) for slot, atts in skin.get('attachments', {}).items()})
+                               for skin in skins]
+        if 'animations' in spine_data:
+            result['animations'] = {
+                name: {group: copy_containers(data, TIMELINE_DEPTH.get(group, 0))
+                       for group, data in anim.items()}
+                for name, anim in spine_data['animations'].items()
+            }
+        return result
+
+    def _counts(self, spine_data):
+        return {
+            'bones': len(spine_data.get('bones', [])),
+            'slots': len(spine_data.get('slots', [])),
+            'attachments': sum(len(atts) for _, skin in iter_skins(spine_data) for atts in skin.values()),
+        }
+
+    def prune(self, spine_data, output_dir=None, images=None):
+        """清理 spine_data，返回 (清理后的数据, 报告)
+
+        output_dir + images: 输出目录和本次复制的图片文件名，未被引用的图片会被删除。
+        校验失败时返回原始数据，报告中 applied 为 False。
+        """
+        before_problems = set(find_broken_references(spine_data))
+        data = self._structural_copy(spine_data)
+        animations = data.get('animations', {})
+        slots_by_name = {s['name']: s for s in data['slots']}
+
+        # ---------- 附件 ----------
+        used_attachments = {}
+        for slot in data['slots']:
+            if slot.get('attachment'):
+                used_attachments.setdefault(slot['name'], set()).add(slot['attachment'])
+        has_draw_order = False
+        referenced_slots = set()
+        for anim in animations.values():
+            for slot_name, timelines in anim.get('slots', {}).items():
+                referenced_slots.add(slot_name)
+                for key in timelines.get('attachment', []):
+                    if key.get('name'):
+                        used_attachments.setdefault(slot_name, set()).add(key['name'])
+            for group in ('deform', 'attachments'):
+                for by_slot in anim.get(group, {}).values():
+                    for slot_name, by_attachment in by_slot.items():
+                        referenced_slots.add(slot_name)
+                        used_attachments.setdefault(slot_name, set()).update(by_attachment)
+            if anim.get('drawOrder') or anim.get('draworder'):
+                has_draw_order = True
+
+        # linkedmesh 依赖父网格
+        for _, skin in iter_skins(data):
+            for slot_name, slot_attachments in skin.items():
+                for attach_name in list(used_attachments.get(slot_name, ())):
+                    attach_data = slot_attachments.get(attach_name)
+                    if attach_data and attach_data.get('type') == 'linkedmesh' and attach_data.get('parent'):
+                        used_attachments[slot_name].add(attach_data['parent'])
+
+        for _, skin in iter_skins(data):
+            for slot_name in list(skin):
+                used = used_attachments.get(slot_name, set())
+                skin[slot_name] = {k: v for k, v in skin[slot_name].items() if k in used}
+                if not skin[slot_name]:
+                    del skin[slot_name]
+
+        # ---------- 插槽 ----------
+        for _, skin in iter_skins(data):
+            for slot_attachments in skin.values():
+                for attach_data in slot_attachments.values():
+                    if attach_data.get('type') == 'clipping' and attach_data.get('end'):
+                        referenced_slots.add(attach_data['end'])
+        for constraint in data.get('path', []):
+            referenced_slots.add(constraint.get('target'))
+
+        if not has_draw_order:
+            skinned_slots = {slot_name for _, skin in iter_skins(data) for slot_name in skin}
+            data['slots'] = [s for s in data['slots']
+                             if s['name'] in skinned_slots or s['name'] in referenced_slots]
+            slots_by_name = {s['name']: s for s in data['slots']}
+
+        # ---------- 骨骼 ----------
+        old_bones = data['bones']
+        bones_by_name = {b['name']: b for b in old_bones}
+        used_bones = set()
+        if old_bones:
+            used_bones.add(old_bones[0]['name'])
+        for slot in slots_by_name.values():
+            used_bones.add(slot.get('bone', 'root'))
+        for _, skin in iter_skins(data):
+            for slot_attachments in skin.values():
+                for attach_data in slot_attachments.values():
+                    if is_weighted_mesh(attach_data):
+                        for index in iter_weighted_bones(attach_data['vertices']):
+                            if 0 <= index < len(old_bones):
+                                used_bones.add(old_bones[index]['name'])
+        for anim in animations.values():
+            used_bones.update(anim.get('bones', {}))
+        for group in CONSTRAINT_GROUPS:
+            for constraint in data.get(group, []):
+                used_bones.update(constraint.get('bones', []))
+                if group != 'path' and constraint.get('target'):
+                    used_bones.add(constraint['target'])
+                if constraint.get('bone'):
+                    used_bones.add(constraint['bone'])
+
+        # 保留父骨骼链
+        for name in list(used_bones):
+            bone = bones_by_name.get(name)
+            while bone is not None and bone.get('parent') and bone['parent'] not in used_bones:
+                used_bones.add(bone['parent'])
+                bone = bones_by_name.get(bone['parent'])
+        data['bones'] = [b for b in old_bones if b['name'] in used_bones]
+
+        # 带权重网格的骨骼索引重映射
+        if len(data['bones']) != len(old_bones):
+            new_index = {b['name']: i for i, b in enumerate(data['bones'])}
+            index_map = {i: new_index[b['name']] for i, b in enumerate(old_bones) if b['name'] in new_index}
+            for _, skin in iter_skins(data):
+                for slot_attachments in skin.values():
+                    for attach_name, attach_data in slot_attachments.items():
+                        if is_weighted_mesh(attach_data):
+                            slot_attachments[attach_name] = dict(
+                                attach_data,
+                                vertices=remap_weighted_vertices(attach_data['vertices'], index_map))
+
+        # ---------- 校验 ----------
+        after_problems = [p for p in find_broken_references(data) if p not in before_problems]
+        before_counts = self._counts(spine_data)
+        report = {
+            'applied': not after_problems,
+            'problems': after_problems,
+            'before': before_counts,
+            'after': self._counts(data),
+            'broken_references': sorted(before_problems),
+            'draw_order_kept_slots': has_draw_order,
+            'removed_images': 0,
+            'removed_image_bytes': 0,
+        }
+        if after_problems:
+            report['after'] = before_counts
+            return spine_data, report
+
+        before_size = len(json.dumps(spine_data, ensure_ascii=False, separators=(',', ':')).encode('utf-8'))
+        after_size = len(json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8'))
+        report['json_bytes_before'] = before_size
+        report['json_bytes_after'] = after_size
+
+        # ---------- 图片 ----------
+        if output_dir is not None and images:
+            used_images = set()
+            for _, skin in iter_skins(data):
+                for slot_attachments in skin.values():
+                    for attach_name, attach_data in slot_attachments.items():
+                        if attach_data.get('type', 'region') in IMAGE_ATTACHMENT_TYPES:
+                            image = attachment_image_name(attach_name, attach_data)
+                            used_images.add(image)
+                            used_images.add(Path(image).name)
+            for img_name in images:
+                img_path = Path(output_dir) / img_name
+                if Path(img_name).stem in used_images or not img_path.exists():
+                    continue
+                report['removed_image_bytes'] += img_path.stat().st_size
+                img_path.unlink()
+                report['removed_images'] += 1
+
+        return data, report
+
+
+def format_report(report):
+    """生成可读的清理报告"""
+    if not report['applied']:
+        return "清理未应用，校验发现问题:\n" + "\n".join(report['problems'])
+    before, after = report['before'], report['after']
+    lines = [f"{key}: {before[key]} -> {after[key]}" for key in before]
+    lines.append(f"JSON: {report['json_bytes_before']} -> {report['json_bytes_after']} 字节")
+    if report['broken_references']:
+        lines.append(f"动画引用问题（未删除）: {len(report['broken_references'])} 条")
+    lines.append(f"图片: 删除 {report['removed_images']} 张 ({report['removed_image_bytes']} 字节)")
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) < 2:
+        print("用法: python skeleton_pruner.py <输入.json> [输出.json]")
+        sys.exit(1)
+
+    with open(sys.argv[1], 'r', encoding='utf-8') as f:
+        spine_data = json.load(f)
+    pruned, report = SkeletonPruner().prune(spine_data)
+    print(format_report(report))
+    if len(sys.argv) > 2 and report['applied']:
+        with open(sys.argv[2], 'w', encoding='utf-8') as f:
+            json.dump(pruned, f, indent=2, ensure_ascii=False)
@@ -0,0 +1,294 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+骨架校验模块 - 在 Spine 导入前检查合成结果的结构问题
+
+所有检查先建立 骨骼 / 插槽 / 附件 / 图片 的索引，整体为线性时间：
+  - 骨骼：重名、父骨骼不存在、父骨骼排在子骨骼之后
+  - 插槽：重名、骨骼不存在、挂在根骨骼上（find_bone_by_slot_name 匹配失败时的回退，警告）、
+          初始附件不在皮肤中
+  - 附件：皮肤引用的插槽不存在、图片未复制到输出目录、linkedmesh 父网格不存在、
+          网格 uvs / vertices / triangles / hull 长度不一致、权重引用的骨骼序号越界、权重和不为 1（警告）
+  - 约束引用的骨骼不存在，动画引用的骨骼、插槽、附件、约束不存在
+报告为可直接写入 JSON 的字典：
+    {"version": 1, "skeleton": 名称, "valid": 无错误, "errors": 数量, "warnings": 数量,
+     "counts": {...}, "issues": [{"severity": "error"/"warning", "code": ..., "path": ..., "message": ...}],
+     "truncated": 超出 max_issues 未列出的数量}
+"""
+
+import json
+from pathlib import Path
+
+from skeleton_pruner import (IMAGE_ATTACHMENT_TYPES, CONSTRAINT_GROUPS, iter_skins, attachment_image_name,
+                             find_broken_references)
+from build_manifest import MANIFEST_FILE, load_manifest
+
+REPORT_VERSION = 1
+
+# 报告中最多列出的问题数（批量校验时避免单个损坏文件产生超大报告）
+MAX_ISSUES = 1000
+
+# 权重和允许的误差
+WEIGHT_TOLERANCE = 0.01
+
+
+class _Report:
+    def __init__(self, max_issues):
+        self.issues = []
+        self.errors = 0
+        self.warnings = 0
+        self.max_issues = max_issues
+
+    def add(self, severity, code, path, message):
+        if severity == 'error':
+            self.errors += 1
+        else:
+            self.warnings += 1
+        if len(self.issues) < self.max_issues:
+            self.issues.append({'severity': severity, 'code': code, 'path': path, 'message': message})
+
+    def error(self, code, path, message):
+        self.add('error', code, path, message)
+
+    def warning(self, code, path, message):
+        self.add('warning', code, path, message)
+
+
+def _check_bones(bones, report):
+    """返回 {骨骼名: 序号}"""
+    index = {}
+    for i, bone in enumerate(bones):
+        name = bone.get('name')
+        path = f"bones/{name}"
+        if name in index:
+            report.error('duplicate_bone', path, f"骨骼 {name} 重复")
+            continue
+        index[name] = i
+    root_name = bones[0].get('name') if bones else None
+    for i, bone in enumerate(bones):
+        name = bone.get('name')
+        parent = bone.get('parent')
+        if parent is None:
+            if i != 0:
+                report.error('bone_parent_missing', f"bones/{name}", f"骨骼 {name} 没有父骨骼（只有第一个骨骼可以是根骨骼）")
+        elif parent not in index:
+            report.error('bone_parent_missing', f"bones/{name}", f"骨骼 {name} 的父骨骼 {parent} 不存在")
+        elif index[parent] > i:
+            report.error('bone_order', f"bones/{name}", f"骨骼 {name} 排在父骨骼 {parent} 之前")
+    return index, root_name
+
+
+def _check_slots(slots, bone_index, root_name, skin_slots, report):
+    """返回 {插槽名: 插槽}"""
+    by_name = {}
+    for slot in slots:
+        name = slot.get('name')
+        path = f"slots/{name}"
+        if name in by_name:
+            report.error('duplicate_slot', path, f"插槽 {name} 重复")
+            continue
+        by_name[name] = slot
+        bone = slot.get('bone')
+        if bone not in bone_index:
+            report.error('slot_bone_missing', path, f"插槽 {name} 的骨骼 {bone} 不存在")
+        elif bone == root_name and skin_slots.get(name):
+            report.warning('slot_on_root', path, f"插槽 {name} 挂在根骨骼上（可能是骨骼匹配失败的回退）")
+        attachment = slot.get('attachment')
+        if attachment and attachment not in skin_slots.get(name, ()):
+            report.error('slot_attachment_missing', path, f"插槽 {name} 的初始附件 {attachment} 不在任何皮肤中")
+    return by_name
+
+
+def _check_mesh(data, bone_count, path, report):
+    uvs = data.get('uvs', [])
+    vertices = data.get('vertices', [])
+    triangles = data.get('triangles', [])
+    if len(uvs) % 2:
+        report.error('mesh_uvs', path, f"uvs 长度 {len(uvs)} 不是偶数")
+        return
+    vertex_count = len(uvs) // 2
+
+    if len(vertices) != len(uvs):
+        # 带权重：每个顶点 [骨骼数, (骨骼序号, x, y, 权重) * 骨骼数]
+        i = 0
+        parsed = 0
+        bad_bones = 0
+        bad_weights = 0
+        while i < len(vertices) and parsed < vertex_count:
+            bone_total = int(vertices[i])
+            end = i + 1 + bone_total * 4
+            if bone_total <= 0 or end > len(vertices):
+                break
+            weight_sum = 0
+            for j in range(i + 1, end, 4):
+                if not 0 <= int(vertices[j]) < bone_count:
+                    bad_bones += 1
+                weight_sum += vertices[j + 3]
+            if abs(weight_sum - 1) > WEIGHT_TOLERANCE:
+                bad_weights += 1
+            i = end
+            parsed += 1
+        if parsed != vertex_count or i != len(vertices):
+            report.error('mesh_vertices', path,
+                         f"vertices 与 uvs 不一致：uvs 有 {vertex_count} 个顶点，vertices 长度 {len(vertices)}")
+        if bad_bones:
+            report.error('mesh_weight_bone', path, f"{bad_bones} 个权重引用的骨骼序号超出骨骼数 {bone_count}")
+        if bad_weights:
+            report.warning('mesh_weights', path, f"{bad_weights} 个顶点的权重和不为 1")
+
+    if len(triangles) % 3:
+        report.error('mesh_triangles', path, f"triangles 长度 {len(triangles)} 不是 3 的倍数")
+    elif triangles and (max(triangles) >= vertex_count or min(triangles) < 0):
+        report.error('mesh_triangles', path, f"triangles 引用的顶点超出顶点数 {vertex_count}")
+    if data.get('hull', 0) > vertex_count:
+        report.error('mesh_hull', path, f"hull {data.get('hull')} 超出顶点数 {vertex_count}")
+
+
+def _has_image(image, image_names):
+    return f"{image}.png" in image_names or f"{Path(image).name}.png" in image_names
+
+
+def _check_skins(spine_data, slots_by_name, bone_count, image_names, report):
+    counted = 0
+    skins = dict(iter_skins(spine_data))
+    for skin_name, skin in skins.items():
+        for slot_name, attachments in skin.items():
+            if slot_name not in slots_by_name:
+                report.error('skin_slot_missing', f"skins/{skin_name}/{slot_name}",
+                             f"皮肤 {skin_name} 引用的插槽 {slot_name} 不存在")
+            if not isinstance(attachments, dict):
+                continue
+            for attach_name, data in attachments.items():
+                counted += 1
+                if not isinstance(data, dict):
+                    continue
+                path = f"skins/{skin_name}/{slot_name}/{attach_name}"
+                attach_type = data.get('type', 'region')
+                if attach_type in ('mesh', 'skinnedmesh', 'weightedmesh'):
+                    _check_mesh(data, bone_count, path, report)
+                elif attach_type == 'linkedmesh':
+                    parent_skin = skins.get(data.get('skin') or 'default', {})
+                    if data.get('parent') not in parent_skin.get(slot_name, {}):
+                        report.error('linkedmesh_parent_missing', path, f"linkedmesh 的父网格 {data.get('parent')} 不存在")
+                if image_names is not None and attach_type in IMAGE_ATTACHMENT_TYPES:
+                    image = attachment_image_name(attach_name, data)
+                    if not _has_image(image, image_names):
+                        report.error('image_missing', path, f"图片 {image}.png 未复制到输出目录")
+    return counted
+
+
+def _check_constraints(spine_data, bone_index, report):
+    for group in CONSTRAINT_GROUPS:
+        for constraint in spine_data.get(group, []):
+            if not isinstance(constraint, dict):
+                continue
+            path = f"{group}/{constraint.get('name')}"
+            names = list(constraint.get('bones', []))
+            if constraint.get('bone'):
+                names.append(constraint['bone'])
+            # 路径约束的 target 是插槽
+            if group != 'path' and constraint.get('target'):
+                names.append(constraint['target'])
+            for bone in names:
+                if bone not in bone_index:
+                    report.error('constraint_bone_missing', path, f"约束引用的骨骼 {bone} 不存在")
+
+
+def validate(spine_data, image_names=None, name=None, max_issues=MAX_ISSUES):
+    """校验合成后的骨架数据，image_names 为输出目录中的图片文件名（为 None 时不检查图片），返回报告"""
+    report = _Report(max_issues)
+    bones = spine_data.get('bones', [])
+    slots = spine_data.get('slots', [])
+    if image_names is not None:
+        image_names = set(image_names)
+
+    # 每个插槽在所有皮肤中的附件名
+    skin_slots = {}
+    for _, skin in iter_skins(spine_data):
+        for slot_name, attachments in skin.items():
+            if isinstance(attachments, dict):
+                skin_slots.setdefault(slot_name, set()).update(attachments)
+
+    bone_index, root_name = _check_bones(bones, report)
+    slots_by_name = _check_slots(slots, bone_index, root_name, skin_slots, report)
+    attachments = _check_skins(spine_data, slots_by_name, len(bones), image_names, report)
+    _check_constraints(spine_data, bone_index, report)
+    for problem in find_broken_references(spine_data):
+        anim_name = problem.split(':', 1)[0]
+        report.error('animation_reference', f"animations/{anim_name}", problem)
+
+    return {
+        'version': REPORT_VERSION,
+        'skeleton': name,
+        'valid': report.errors == 0,
+        'errors': report.errors,
+        'warnings': report.warnings,
+        'counts': {'bones': len(bones), 'slots': len(slots), 'attachments': attachments,
+                   'animations': len(spine_data.get('animations', {}))},
+        'issues': report.issues,
+        'truncated': report.errors + report.warnings - len(report.issues),
+    }
+
+
+def validate_output(path, max_issues=MAX_ISSUES):
+    """校验合成输出目录（或单个骨架 JSON，图片在同一目录），返回报告"""
+    path = Path(path)
+    if path.is_dir():
+        output_dir = path
+        json_name = f"{path.name}.json"
+        if (path / MANIFEST_FILE).exists():
+            json_name = load_manifest(path).get('skeleton', json_name)
+        json_path = path / json_name
+    else:
+        output_dir = path.parent
+        json_path = path
+    with open(json_path, 'r', encoding='utf-8') as f:
+        spine_data = json.load(f)
+    image_names = {p.relative_to(output_dir).as_posix() for p in output_dir.rglob('*.png')}
+    return validate(spine_data, image_names, str(json_path), max_issues)
+
+
+def format_report(report, limit=20):
+    """生成可读的校验报告（最多列出 limit 个问题）"""
+    lines = [f"校验 {report['skeleton'] or '骨架'}: {report['errors']} 个错误, {report['warnings']} 个警告"]
+    for issue in report['issues'][:limit]:
+        tag = 'ERROR' if issue['severity'] == 'error' else 'WARN'
+        lines.append(f"  [{tag}] {issue['code']} {issue['path']}: {issue['message']}")
+    hidden = report['errors'] + report['warnings'] - min(limit, len(report['issues']))
+    if hidden > 0:
+        lines.append(f"  ... 另有 {hidden} 个问题")
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    import argparse
+    import sys
+
+    parser = argparse.ArgumentParser(description="校验合成输出的骨架结构")
+    parser.add_argument('paths', nargs='+', help="合成输出目录或骨架 JSON")
+    parser.add_argument('--jsonl', help="把每个报告作为一行 JSON 写入该文件（- 为标准输出）")
+    parser.add_argument('--quiet', action='store_true', help="只输出汇总")
+    args = parser.parse_args()
+
+    out = None
+    if args.jsonl:
+        out = sys.stdout if args.jsonl == '-' else open(args.jsonl, 'w', encoding='utf-8')
+    invalid = 0
+    for path in args.paths:
+        try:
+            report = validate_output(path)
+        except (OSError, ValueError) as e:
+            report = {'version': REPORT_VERSION, 'skeleton': path, 'valid': False, 'errors': 1, 'warnings': 0,
+                      'counts': {}, 'issues': [{'severity': 'error', 'code': 'unreadable', 'path': '',
+                                                'message': str(e)}], 'truncated': 0}
+        if not report['valid']:
+            invalid += 1
+        if out is not None:
+            out.write(json.dumps(report, ensure_ascii=False) + "\n")
+        if not args.quiet and out is not sys.stdout:
+            print(format_report(report))
+    if out is not None and out is not sys.stdout:
+        out.close()
+    if out is not sys.stdout:
+        print(f"共 {len(args.paths)} 个, 有错误 {invalid} 个")
+    sys.exit(1 if invalid else 0)
@@ -5,13 +5,38 @@ Spine JSON 合成模块
 """
 
 import json
-import shutil
 from pathlib import Path
 from collections import OrderedDict
 
+from outfit_cache import role_fingerprint
+from skeleton_model import SkeletonModel
+from animation_merger import AnimationMerger
+from skeleton_pruner import SkeletonPruner, format_report
+from json_quantizer import JsonQuantizer
+from instrumentation import span, count, traced
+from asset_storage import storage_for
+from lazy_json import LazyObject
+from build_cache import build_key
+from role_template import RoleTemplateCache
+from build_manifest import MANIFEST_FILE, with_content_hash, build_manifest, write_manifest
+from incremental_build import CompositionStore
+from skeleton_validator import validate, format_report as format_validation_report
+
 class SpineBuilder:
-    def __init__(self, db):
+    def __init__(self, db, outfit_cache=None, build_cache=None, role_templates=None, image_optimizer=None):
         self.db = db
+        # 已解析的角色模板（按路径和修改时间缓存）
+        self.role_templates = role_templates if role_templates is not None else RoleTemplateCache()
+        # 增量合成时每个输出目录上次合成的状态
+        self.compositions = CompositionStore()
+        # 图片优化（需要 Pillow，首次使用时创建默认实例）
+        self.image_optimizer = image_optimizer
+        # 预编译服装缓存（传入 CompiledOutfitCache 实例启用磁盘缓存）
+        self.outfit_cache = outfit_cache
+        # 合成结果缓存（传入 BuildResultCache 实例时相同输入直接复用输出）
+        self.build_cache = build_cache
+        # 动画合并器（缓存已解析的动作文件）
+        self.animation_merger = AnimationMerger()
         
     def convert_skinnedmesh_to_mesh(self, attach_data, slot_name=''):
         """将 skinnedmesh 转换为 mesh，保留骨骼权重"""
@@ -69,8 +94,18 @@ class SpineBuilder:
         
         return result
 
+    def _match_bone(self, value, bones):
+        """查找名称包含 value 的第一个骨骼，bones 可以是列表或 SkeletonModel"""
+        if isinstance(bones, SkeletonModel):
+            return bones.find_bone_containing(value)
+        value = value.lower()
+        for bone in bones:
+            if value in bone['name'].lower():
+                return bone['name']
+        return None
+
     def find_bone_by_slot_name(self, slot_name, bones):
-        """根据插槽名称找到对应的骨骼"""
+        """根据插槽名称找到对应的骨骼（bones 可以是骨骼列表或 SkeletonModel）"""
         # 移除前缀
         base_name = slot_name
         for prefix in ['BaseBody_', 'Pants_', 'Shoes_', 'Tops_']:
@@ -123,9 +158,9 @@ class SpineBuilder:
                     value = value + '_right'
                 
                 # 在骨骼列表中查找
-                for bone in bones:
-                    if value.lower() in bone['name'].lower():
-                        return bone['name']
+                bone_name = self._match_bone(value, bones)
+                if bone_name:
+                    return bone_name
         
         # 如果没有精确匹配，再尝试模糊匹配
         for key, value in special_mappings.items():
@@ -137,28 +172,43 @@ class SpineBuilder:
                     value = value + '_right'
                 
                 # 在骨骼列表中查找
-                for bone in bones:
-                    if value.lower() in bone['name'].lower():
-                        return bone['name']
+                bone_name = self._match_bone(value, bones)
+                if bone_name:
+                    return bone_name
         
         return 'root'
 
-    def merge_action_to_role(self, role_data, action_path):
+    def merge_action_to_role(self, role_data, action_path, model=None, conflict_policy='replace'):
         """将 action.json 合并到 role.json - 参考 merge_all_dress.py 简化版"""
-        with open(action_path, 'r', encoding='utf-8') as f:
-            action_data = json.load(f)
+        action_data = self.animation_merger.load_action(action_path)
+        self._merge_action_data(role_data, action_data, model, conflict_policy)
+        return role_data
+
+    @traced('build.merge_actions')
+    def merge_actions(self, role_data, action_paths, model=None, conflict_policy='replace', prune=True):
+        """合并多个动作文件，按时间轴处理冲突，并清理引用不存在骨骼/插槽的时间轴"""
+        if model is None:
+            model = SkeletonModel(role_data)
+        
+        conflicts = []
+        for action_path in action_paths:
+            action_data = self.animation_merger.load_action(action_path)
+            conflicts.extend(self._merge_action_data(role_data, action_data, model, conflict_policy))
+        
+        pruned = self.animation_merger.prune_animations(role_data) if prune else {}
+        return {'conflicts': conflicts, 'pruned': pruned}
+
+    def _merge_action_data(self, role_data, action_data, model, conflict_policy):
+        """合并单个已解析的动作文件，返回冲突的时间轴列表"""
+        if model is None:
+            model = SkeletonModel(role_data)
         
         # 合并骨骼（不重复）
-        existing_bone_names = {b['name'] for b in role_data.get('bones', [])}
-        for bone in action_data.get('bones', []):
-            if bone['name'] not in existing_bone_names:
-                role_data['bones'].append(bone)
+        model.add_bones(action_data.get('bones', []))
         
         # 合并插槽（不重复）
-        existing_slot_names = {s['name'] for s in role_data.get('slots', [])}
         for slot in action_data.get('slots', []):
-            if slot['name'] not in existing_slot_names:
-                role_data['slots'].append(slot)
+            model.add_slot(slot)
         
         # 合并 skins
         skins = role_data.setdefault('skins', {}).setdefault('default', {})
@@ -166,29 +216,194 @@ class SpineBuilder:
         
         for slot_name, slot_data in action_skins.items():
             if isinstance(slot_data, dict):
-                if slot_name not in skins:
-                    skins[slot_name] = {}
+                slot_skin = model.writable_skin_slot(skins, slot_name)
                 for attach_name, attach_data in slot_data.items():
                     if isinstance(attach_data, dict):
                         converted = self.convert_skinnedmesh_to_mesh(attach_data, slot_name)
-                        skins[slot_name][attach_name] = converted
-        
-        # 合并动画 - 直接复制（参考 merge_all_dress.py）
-        if 'animations' not in role_data:
-            role_data['animations'] = {}
-        for anim_name, anim_data in action_data.get('animations', {}).items():
-            role_data['animations'][anim_name] = anim_data
+                        slot_skin[attach_name] = converted
         
-        return role_data
+        # 合并动画 - 按时间轴合并
+        return self.animation_merger.merge_animations(role_data, action_data, conflict_policy)
 
-    def build_character(self, role_path, selected_items, output_dir, include_animation=False, animation_path=None):
-        """构建角色"""
-        output_dir = Path(output_dir)
-        output_dir.mkdir(parents=True, exist_ok=True)
+    def filter_basebody_attachments(self, attachments):
+        """BaseBody 特殊处理 - 严格过滤手部变体
+
+        attachments 可以是 dict 或惰性文档的 LazyObject，后者只解析保留下来的插槽
+        """
+        filtered_attachments = {}
+        for slot_name in attachments:
+            # 严格匹配：只保留纯 Hand_Left 和 Hand_Right
+            if slot_name == 'Hand_Left' or slot_name == 'Hand_Right':
+                # 进一步过滤附件，只保留纯 Hand_Left/Hand_Right
+                if isinstance(attachments, LazyObject):
+                    slot_attachments = attachments.child(slot_name) or {}
+                else:
+                    slot_attachments = attachments[slot_name]
+                filtered_slot_attach = {}
+                for attach_name in slot_attachments:
+                    # 严格匹配附件名
+                    if attach_name == 'Hand_Left' or attach_name == 'Hand_Right':
+                        filtered_slot_attach[attach_name] = slot_attachments[attach_name]
+                if filtered_slot_attach:
+                    filtered_attachments[slot_name] = filtered_slot_attach
+            elif slot_name.startswith('Hand_') and slot_name not in ['Hand_Left', 'Hand_Right']:
+                # 跳过所有其他 Hand_ 开头的插槽（如 Hand_Right_Front4, Hand_Left4 等）
+                continue
+            else:
+                # 其他插槽正常保留（包括 arm, body 等）
+                filtered_attachments[slot_name] = attachments[slot_name]
+        return filtered_attachments
+
+    @traced('build.compile_outfit')
+    def compile_outfit(self, folder_path, clothing_type, role_bones):
+        """编译单套服装：过滤、转换附件、解析插槽骨骼、收集图片列表"""
+        storage, md5_hash = storage_for(folder_path)
+        if not storage.exists(md5_hash, "dress.json"):
+            return None
+        
+        # 惰性文档：BaseBody 只解析过滤后保留的插槽，其他类型整体解析 attachments
+        with span('json.parse', file='dress.json'), storage.open_document(md5_hash, "dress.json") as dress_doc:
+            dress_bones = dress_doc.get('bones', [])
+            if clothing_type == "BaseBody":
+                attachments = self.filter_basebody_attachments(dress_doc.child('attachments') or {})
+            else:
+                attachments = dress_doc.get('attachments', {})
+        
+        # 插槽骨骼按 角色骨骼 + 本服装骨骼 解析
+        lookup_bones = SkeletonModel({'bones': list(role_bones)})
+        lookup_bones.add_bones(dress_bones)
+        
+        converted_attachments = {}
+        slot_bones = {}
+        for slot_name, slot_attachments in attachments.items():
+            slot_bones[slot_name] = self.find_bone_by_slot_name(slot_name, lookup_bones)
+            converted_attachments[slot_name] = {
+                attach_name: self.convert_skinnedmesh_to_mesh(attach_data, slot_name)
+                for attach_name, attach_data in slot_attachments.items()
+            }
+        
+        images = []
+        for img_file in storage.list_files(md5_hash, "*.png"):
+            # BaseBody 特殊处理：过滤 Hand_ 开头的变体图片（只保留 Hand_Left/Right）
+            if clothing_type == "BaseBody":
+                img_name = Path(img_file).stem
+                if img_name.startswith('Hand_') and img_name not in ['Hand_Left', 'Hand_Right']:
+                    continue
+            images.append(img_file)
         
-        # 加载 role.json
-        with open(role_path, 'r', encoding='utf-8') as f:
-            role_data = json.load(f)
+        return {
+            'bones': dress_bones,
+            'attachments': converted_attachments,
+            'slot_bones': slot_bones,
+            'images': images
+        }
+
+    def get_compiled_outfit(self, md5_hash, folder_path, clothing_type, role_bones, fingerprint=None):
+        """获取编译后的服装，优先使用缓存（结果只读，不要原地修改）"""
+        if self.outfit_cache is None:
+            return self.compile_outfit(folder_path, clothing_type, role_bones)
+        
+        if fingerprint is None:
+            fingerprint = role_fingerprint(role_bones)
+        # 服装类型影响过滤规则，一并计入指纹
+        key = f"{fingerprint}_{clothing_type}"
+        compiled = self.outfit_cache.load(md5_hash, key, folder_path)
+        if compiled is not None:
+            return compiled
+        
+        compiled = self.compile_outfit(folder_path, clothing_type, role_bones)
+        if compiled is None:
+            return None
+        return self.outfit_cache.store(md5_hash, key, folder_path, compiled)
+
+    def merge_order(self, selected_items):
+        """合并顺序：按服装类型排序（与合成页下拉框顺序一致），同类型保持传入顺序"""
+        return dict(sorted(selected_items.items(), key=lambda item: item[1]['type']))
+
+    def canonical_skins(self, skins, slots):
+        """皮肤中的插槽按插槽顺序（绘制顺序）、附件按名称排列，输出与合并时的字典顺序无关"""
+        order = {slot['name']: i for i, slot in enumerate(slots)}
+        result = {}
+        for skin_name, skin in skins.items():
+            if not isinstance(skin, dict):
+                result[skin_name] = skin
+                continue
+            slot_names = sorted(skin, key=lambda name: (order.get(name, len(order)), name))
+            result[skin_name] = {name: {attach: skin[name][attach] for attach in sorted(skin[name])}
+                                 for name in slot_names}
+        return result
+
+    def get_image_optimizer(self):
+        if self.image_optimizer is None:
+            from image_optimizer import ImageOptimizer
+            self.image_optimizer = ImageOptimizer()
+        return self.image_optimizer
+
+    def resolve_action_files(self, include_animation, animation_path=None, animation_paths=None):
+        """去重并过滤不存在的动作文件，返回按合并顺序排列的路径列表"""
+        action_files = []
+        if include_animation:
+            for path in list(animation_paths or []) + ([animation_path] if animation_path else []):
+                if not path or Path(path) in action_files:
+                    continue
+                storage, folder_md5 = storage_for(Path(path).parent)
+                if storage.exists(folder_md5, Path(path).name):
+                    action_files.append(Path(path))
+        return action_files
+
+    @traced('build.build_character')
+    def build_character(self, role_path, selected_items, output_dir, include_animation=False, animation_path=None,
+                        animation_paths=None, animation_conflict='replace', prune_timelines=True,
+                        prune_unused=False, quantize=None, optimize_images=None, force=False, incremental=False):
+        """构建角色
+
+        animation_path 为单个动作文件（兼容旧接口），animation_paths 可传入多个动作文件，
+        animation_conflict 为时间轴冲突策略（见 animation_merger.CONFLICT_POLICIES），
+        prune_unused 为 True 时删除未引用的骨骼、插槽、附件和图片，
+        quantize 为 True 或配置字典时量化浮点精度并紧凑输出（见 json_quantizer.default_options），
+        optimize_images 为 True 或配置字典时压缩/裁剪/缩小输出图片（见 image_optimizer.default_options），
+        启用合成结果缓存时相同输入直接复用上次的输出（结果中 cached 为 True），force 为 True 时强制重新合成。
+        相同输入的输出逐字节相同：skeleton.hash 为内容哈希，输出目录中的 manifest.json 列出各文件的哈希。
+        incremental 为 True 时沿用该输出目录上次合成的状态，只复制变化的图片、只重新序列化变化的插槽
+        （见 incremental_build，输出与完整合成相同；结果中 incremental 为复用情况）
+        """
+        selected_items = self.merge_order(selected_items)
+        action_files = self.resolve_action_files(include_animation, animation_path, animation_paths)
+        options = {
+            'animation_conflict': animation_conflict,
+            'prune_timelines': prune_timelines,
+            'prune_unused': prune_unused,
+            'quantize': quantize,
+            'optimize_images': optimize_images,
+        }
+        composition = self.compositions.get(Path(output_dir)) if incremental else None
+        if self.build_cache is None:
+            result, _ = self._build(role_path, selected_items, output_dir, action_files, options, composition)
+            return result
+
+        with span('build_cache.key'):
+            role_images = [(img_name, storage.stat(folder, img_name))
+                           for _, storage, folder, img_name in self.role_image_sources(role_path)]
+            key = build_key(role_path, selected_items, action_files, options, role_images)
+        if not force:
+            result = self.build_cache.restore(key, output_dir)
+            if result is not None:
+                result['cached'] = True
+                return result
+
+        result, image_files = self._build(role_path, selected_items, output_dir, action_files, options, composition)
+        self.build_cache.store(key, output_dir, result, image_files)
+        result['cached'] = False
+        return result
+
+    def _merge_outfits(self, role_path, selected_items, composition=None, copy_animations=False):
+        """把选中的服装合并到角色模板的写时复制副本
+
+        返回 (角色数据, SkeletonModel, 图片来源列表 [(来源, 存储, 文件夹 MD5, 图片名)])
+        """
+        # 加载 role.json（模板只解析一次，每次合成使用写时复制的副本）
+        template = self.role_templates.get(role_path)
+        role_data = template.instantiate(copy_animations=copy_animations)
         
         # 确保基本结构
         if 'skins' not in role_data:
@@ -197,110 +412,167 @@ class SpineBuilder:
             role_data['skins']['default'] = {}
         
         skins = role_data['skins']['default']
-        bones = role_data.get('bones', [])
-        slots = role_data.get('slots', [])
-        slot_map = {s['name']: s for s in slots}
+        model = SkeletonModel(role_data, template.shared_ids)
         
-        total_images = 0
+        # 要复制的图片 [(来源, 存储, 文件夹 MD5, 图片名)]，按复制顺序（同名图片后者覆盖前者）
+        image_sources = []
+        # 编译结果只依赖角色自身骨骼，合并前先固定下来
+        role_bones = list(model.bones)
+        fingerprint = template.fingerprint
         
         # 合并选中的服装
         for md5_hash, item_data in selected_items.items():
             clothing_type = item_data['type']
             folder_path = Path(item_data['path'])
-            dress_path = folder_path / "dress.json"
             
-            if not dress_path.exists():
+            if composition is not None:
+                compiled = composition.outfit(
+                    md5_hash, folder_path, clothing_type, fingerprint,
+                    lambda: self.get_compiled_outfit(md5_hash, folder_path, clothing_type, role_bones, fingerprint))
+            else:
+                compiled = self.get_compiled_outfit(md5_hash, folder_path, clothing_type, role_bones, fingerprint)
+            if compiled is None:
                 continue
             
-            with open(dress_path, 'r', encoding='utf-8') as f:
-                dress_data = json.load(f)
-            
             # 合并骨骼
-            existing_bones = {b['name'] for b in role_data.get('bones', [])}
-            for bone in dress_data.get('bones', []):
-                if bone['name'] not in existing_bones:
-                    role_data['bones'].append(bone)
-                    existing_bones.add(bone['name'])
-                    bones = role_data['bones']
-            
-            # 处理附件
-            attachments = dress_data.get('attachments', {})
-            
-            # BaseBody 特殊处理 - 严格过滤手部变体
-            if clothing_type == "BaseBody":
-                original_count = len(attachments)
-                filtered_attachments = {}
-                for slot_name, slot_attachments in attachments.items():
-                    # 严格匹配：只保留纯 Hand_Left 和 Hand_Right
-                    if slot_name == 'Hand_Left' or slot_name == 'Hand_Right':
-                        # 进一步过滤附件，只保留纯 Hand_Left/Hand_Right
-                        filtered_slot_attach = {}
-                        for attach_name, attach_data in slot_attachments.items():
-                            # 严格匹配附件名
-                            if attach_name == 'Hand_Left' or attach_name == 'Hand_Right':
-                                filtered_slot_attach[attach_name] = attach_data
-                        if filtered_slot_attach:
-                            filtered_attachments[slot_name] = filtered_slot_attach
-                    elif slot_name.startswith('Hand_') and slot_name not in ['Hand_Left', 'Hand_Right']:
-                        # 跳过所有其他 Hand_ 开头的插槽（如 Hand_Right_Front4, Hand_Left4 等）
-                        continue
-                    else:
-                        # 其他插槽正常保留（包括 arm, body 等）
-                        filtered_attachments[slot_name] = slot_attachments
-                attachments = filtered_attachments
+            model.add_bones(compiled['bones'])
             
-            for slot_name, slot_attachments in attachments.items():
+            for slot_name, slot_attachments in compiled['attachments'].items():
                 # 确保插槽存在
-                if slot_name not in slot_map:
-                    correct_bone = self.find_bone_by_slot_name(slot_name, bones)
-                    new_slot = {
+                slot = model.writable_slot(slot_name)
+                if slot is None:
+                    slot = {
                         'name': slot_name,
-                        'bone': correct_bone,
+                        'bone': compiled['slot_bones'][slot_name],
                         'attachment': list(slot_attachments.keys())[0] if slot_attachments else None
                     }
-                    role_data['slots'].append(new_slot)
-                    slot_map[slot_name] = new_slot
+                    model.add_slot(slot)
                 else:
-                    slot = slot_map[slot_name]
                     if slot.get('bone') == 'root':
-                        correct_bone = self.find_bone_by_slot_name(slot_name, bones)
-                        slot['bone'] = correct_bone
+                        slot['bone'] = compiled['slot_bones'][slot_name]
                 
-                # 添加附件
-                if slot_name not in skins:
-                    skins[slot_name] = {}
-                
-                for attach_name, attach_data in slot_attachments.items():
-                    converted = self.convert_skinnedmesh_to_mesh(attach_data, slot_name)
-                    skins[slot_name][attach_name] = converted
-                    
-                    if slot_name in slot_map:
-                        slot_map[slot_name]['attachment'] = attach_name
+                # 添加附件（已预先转换）
+                slot_skin = model.writable_skin_slot(skins, slot_name)
+                for attach_name, converted in slot_attachments.items():
+                    slot_skin[attach_name] = converted
+                    slot['attachment'] = attach_name
             
-            # 复制图片
-            for img_file in folder_path.glob("*.png"):
-                # BaseBody 特殊处理：过滤 Hand_ 开头的变体图片（只保留 Hand_Left/Right）
-                if clothing_type == "BaseBody":
-                    img_name = img_file.stem
-                    # 跳过 Hand_ 开头但不是 Hand_Left/Right 的图片
-                    if img_name.startswith('Hand_') and img_name not in ['Hand_Left', 'Hand_Right']:
-                        continue
-                
-                dest = output_dir / img_file.name
-                shutil.copy2(img_file, dest)
-                total_images += 1
+            # 图片（合并动画后统一复制）
+            storage, folder_md5 = storage_for(folder_path)
+            for img_name in compiled['images']:
+                image_sources.append((md5_hash, storage, folder_md5, img_name))
+        
+        return role_data, model, image_sources
+
+    def role_image_sources(self, role_path):
+        """角色自带附件的图片 [(来源, 存储, 文件夹, 图片名)]（只含 role.json 所在目录中存在的图片）"""
+        template = self.role_templates.get(role_path)
+        storage, folder = storage_for(Path(role_path).resolve().parent)
+        return [('role', storage, folder, img_name) for img_name in template.image_names
+                if storage.exists(folder, img_name)]
+
+    def compose_setup(self, role_path, selected_items):
+        """只合并服装（不合并动画、不写文件），返回 (角色数据, {图片名: (存储, 文件夹 MD5)})，供预览渲染
+
+        角色数据与模板共享未修改的部分，只读；骨骼已按父骨骼在前排列（与合成输出一致）
+        """
+        role_data, model, image_sources = self._merge_outfits(role_path, self.merge_order(selected_items))
+        if model.check_bone_order()[0]:
+            model.sort_bones(role_data['skins'].values())
+        # 角色自带的图片在前，服装中的同名图片覆盖
+        image_sources = self.role_image_sources(role_path) + image_sources
+        images = {img_name: (storage, folder_md5) for _, storage, folder_md5, img_name in image_sources}
+        return role_data, images
+
+    def _build(self, role_path, selected_items, output_dir, action_files, options, composition=None):
+        """实际合成，返回 (结果, 写入输出目录的图片和清单文件名列表)
+
+        composition 为增量合成状态（incremental_build.Composition），为 None 时完整合成
+        """
+        animation_conflict = options['animation_conflict']
+        prune_timelines = options['prune_timelines']
+        prune_unused = options['prune_unused']
+        quantize = options['quantize']
+        optimize_images = options.get('optimize_images')
+        output_dir = Path(output_dir)
+        output_dir.mkdir(parents=True, exist_ok=True)
+        
+        role_data, model, image_sources = self._merge_outfits(role_path, selected_items, composition,
+                                                              copy_animations=bool(action_files))
+        # 角色自带的图片与服装图片一起复制到输出目录（服装中的同名图片覆盖）
+        image_sources = self.role_image_sources(role_path) + image_sources
+        skins = role_data['skins']['default']
         
         # 合并动画
-        if include_animation and animation_path and Path(animation_path).exists():
-            role_data = self.merge_action_to_role(role_data, animation_path)
-            # 复制动画图片
-            anim_dir = Path(animation_path).parent
-            for img_file in anim_dir.glob("*.png"):
-                dest = output_dir / img_file.name
-                shutil.copy2(img_file, dest)
-                total_images += 1
-        
-        # 更新 skeleton 信息
+        animation_report = {'conflicts': [], 'pruned': {}}
+        if action_files:
+            animation_report = self.merge_actions(role_data, action_files, model,
+                                                  animation_conflict, prune_timelines)
+            for conflict in animation_report['conflicts']:
+                print(f"[WARN] 动画时间轴冲突 ({animation_conflict}): {conflict}")
+            # 动画图片
+            copied_dirs = set()
+            for action_file in action_files:
+                anim_dir = action_file.parent
+                if anim_dir in copied_dirs:
+                    continue
+                copied_dirs.add(anim_dir)
+                storage, folder_md5 = storage_for(anim_dir)
+                for img_name in storage.list_files(folder_md5, "*.png"):
+                    image_sources.append((str(anim_dir), storage, folder_md5, img_name))
+        
+        # 复制图片（增量合成时只复制变化的图片；启用图片优化时由优化阶段写入）
+        image_infos = {}
+        image_report = None
+        if optimize_images:
+            optimizer_options = optimize_images if isinstance(optimize_images, dict) else None
+            final_images = {img_name: (storage, folder_md5) for _, storage, folder_md5, img_name in image_sources}
+            if composition is not None:
+                composition.retain(selected_items)
+                composition.release_images(final_images, output_dir)
+            image_infos, image_report = self.get_image_optimizer().run(
+                [(storage, folder_md5, img_name) for img_name, (storage, folder_md5) in final_images.items()],
+                output_dir, optimizer_options, role_data['skins'])
+            from image_optimizer import format_report as format_image_report
+            print(format_image_report(image_report))
+        elif composition is not None:
+            composition.retain(selected_items)
+            composition.sync_images(image_sources, output_dir)
+        else:
+            for _, storage, folder_md5, img_name in image_sources:
+                with span('file.copy'):
+                    storage.copy_to(folder_md5, img_name, output_dir / img_name)
+                count('file.copy')
+        copied_images = [img_name for _, _, _, img_name in image_sources]
+        total_images = len(image_sources)
+        
+        # 检查骨骼顺序（Spine 要求父骨骼在前）
+        misordered, missing_parents = model.check_bone_order()
+        if misordered:
+            print(f"[WARN] {len(misordered)} 个骨骼在父骨骼之前，已重新排序")
+            model.sort_bones(role_data['skins'].values())
+        for bone_name, parent in missing_parents:
+            print(f"[WARN] 骨骼 {bone_name} 的父骨骼 {parent} 不存在")
+        structural_conflicts = model.bone_conflicts(structural_only=True)
+        for bone_name, existing, incoming in structural_conflicts:
+            print(f"[WARN] 骨骼定义冲突: {bone_name} 父骨骼 {existing.get('parent')} / {incoming.get('parent')}，保留先合并的定义")
+        
+        # 清理未引用的数据（可选）
+        prune_report = None
+        if prune_unused:
+            role_data, prune_report = SkeletonPruner().prune(role_data, output_dir, copied_images)
+            print(format_report(prune_report))
+            if isinstance(role_data.get('skins'), dict):
+                skins = role_data['skins'].get('default', {})
+        
+        # 固定皮肤的输出顺序
+        if isinstance(role_data.get('skins'), dict):
+            role_data['skins'] = self.canonical_skins(role_data['skins'], role_data.get('slots', []))
+            if image_infos:
+                self.image_optimizer.apply_crops(role_data['skins'], image_infos)
+            skins = role_data['skins'].get('default', {})
+        
+        # 更新 skeleton 信息（hash 在序列化时填入）
         if 'skeleton' not in role_data:
             role_data['skeleton'] = {}
         role_data['skeleton']['spine'] = "4.2.0"
@@ -327,16 +599,55 @@ class SpineBuilder:
         
         # 保存 JSON
         output_json = output_dir / f"{output_dir.name}.json"
+        
+        # 结构校验（Spine 导入时才会暴露的问题在这里提前报告）
+        with span('build.validate'):
+            validation = validate(ordered_data, copied_images, output_json.name)
+        if validation['errors'] or validation['warnings']:
+            print(format_validation_report(validation))
+        dropped_keys = 0
+        with span('json.serialize'):
+            if quantize:
+                quantizer = JsonQuantizer(quantize if isinstance(quantize, dict) else None)
+                text = quantizer.dumps(quantizer.quantize(ordered_data))
+                dropped_keys = quantizer.dropped_keys
+            elif composition is not None:
+                text = composition.dumps(ordered_data)
+            else:
+                text = json.dumps(ordered_data, indent=2, ensure_ascii=False)
+            text, skeleton_hash = with_content_hash(text)
+        # 输出可能是合成缓存的硬链接，先删除再写入以免改动缓存内容
+        if output_json.exists():
+            output_json.unlink()
         with open(output_json, 'w', encoding='utf-8') as f:
-            json.dump(ordered_data, f, indent=2, ensure_ascii=False)
+            f.write(text)
         
-        return {
+        # 输出文件清单（清理未引用数据时删除的图片不列入）
+        copied_images = sorted(set(copied_images))
+        with span('build.manifest'):
+            manifest = build_manifest(output_dir, output_json.name, skeleton_hash, copied_images,
+                                      composition.file_hashes if composition is not None else None)
+            manifest_path = write_manifest(output_dir, manifest)
+        
+        result = {
             'json_path': str(output_json),
             'total_images': total_images,
             'bones_count': bones_count,
             'slots_count': slots_count,
-            'attachments_count': attachments_count
+            'attachments_count': attachments_count,
+            'bone_conflicts': len(model.conflicts),
+            'bones_reordered': len(misordered),
+            'animation_conflicts': len(animation_report['conflicts']),
+            'pruned_timelines': sum(animation_report['pruned'].values()),
+            'prune_report': prune_report,
+            'dropped_keys': dropped_keys,
+            'image_optimization': image_report,
+            'skeleton_hash': skeleton_hash,
+            'manifest_path': str(manifest_path),
+            'validation': validation,
+            'incremental': dict(composition.last_stats) if composition is not None else None
         }
+        return result, copied_images + [MANIFEST_FILE]
 
 if __name__ == "__main__":
     from database import ClothingDatabase